@@ -7,18 +7,155 @@ from sklearn.metrics import silhouette_score
 from scipy import ndimage
 from scipy.signal import argrelextrema
 from datetime import datetime, timedelta
-from database.db_operations import get_dataset_by_id
+from database.db_operations import (
+    get_dataset_by_id,
+    get_dataset_file,
+    dataset_file_opener,
+    dataset_parquet_opener,
+    read_dataset_frame
+)
 from database.database import get_db
-from io import BytesIO, StringIO
+from database.hashing import content_hash
+from Datasetfilter.matrix_cache import build_numeric_matrix, get_matrix, matrix_key
+from Datasetfilter.reservoir_sample import STREAM_CHUNK_ROWS, STREAM_SAMPLE_ROWS, iter_numeric_chunks, reservoir_sample
+
+# Row counts up to which each silhouette estimator is picked by the "auto" backend;
+# the exact score needs O(n^2) time and memory
+SILHOUETTE_EXACT_MAX_ROWS = 10_000
+SILHOUETTE_SAMPLED_MAX_ROWS = 200_000
+
+def exact_silhouette(X, labels, random_state=0):
+    """Exact mean silhouette coefficient over all rows."""
+    return {"estimator": "exact", "score": float(silhouette_score(X, labels)), "n_rows": len(X)}
+
+def sampled_silhouette(X, labels, random_state=0, sample_size=5000, n_repeats=5):
+    """Mean silhouette of label-stratified samples with a 95% confidence interval across repeats.
+
+    Each repeat keeps every label's share of the rows (at least two rows per label),
+    and the same seed is used for every candidate so that candidates are compared on
+    the same samples.
+    """
+    rng = np.random.default_rng(random_state)
+    unique_labels, counts = np.unique(labels, return_counts=True)
+    fraction = min(1.0, sample_size / len(X))
+    per_label = {
+        label: min(count, max(2, int(round(count * fraction))))
+        for label, count in zip(unique_labels, counts)
+    }
+    label_rows = {label: np.flatnonzero(labels == label) for label in unique_labels}
+
+    scores = np.empty(n_repeats)
+    for i in range(n_repeats):
+        rows = np.concatenate([
+            rng.choice(label_rows[label], size=per_label[label], replace=False)
+            for label in unique_labels
+        ])
+        scores[i] = silhouette_score(X[rows], labels[rows])
+
+    mean = float(scores.mean())
+    half_width = float(1.96 * scores.std(ddof=1) / np.sqrt(n_repeats)) if n_repeats > 1 else float("nan")
+    return {
+        "estimator": "sampled",
+        "score": mean,
+        "ci_low": mean - half_width,
+        "ci_high": mean + half_width,
+        "sample_size": int(sum(per_label.values())),
+        "n_repeats": n_repeats,
+        "n_rows": len(X),
+    }
+
+def simplified_silhouette(X, labels, random_state=0):
+    """O(n) simplified silhouette using distances to label centroids instead of to every row.
+
+    The confidence interval reflects the spread of the per-row values; the estimator
+    itself is biased with respect to the exact silhouette.
+    """
+    unique_labels, own = np.unique(labels, return_inverse=True)
+    # Centroids and distances without any (n_rows, n_labels, n_features) temporary:
+    # ||x - c||^2 = ||x||^2 - 2 x.c + ||c||^2, with only (n_rows, n_labels) arrays
+    membership = np.zeros((len(X), len(unique_labels)))
+    membership[np.arange(len(X)), own] = 1
+    centroids = (membership.T @ X) / membership.sum(axis=0)[:, None]
+    squared = np.einsum("ij,ij->i", X, X)[:, None] - 2 * (X @ centroids.T) + np.einsum("ij,ij->i", centroids, centroids)
+    # Distances from every row to every centroid, shape (n_rows, n_labels)
+    distances = np.sqrt(np.maximum(squared, 0))
+    a = distances[np.arange(len(X)), own]
+    distances[np.arange(len(X)), own] = np.inf
+    b = distances.min(axis=1)
+    denominator = np.maximum(a, b)
+    values = np.divide(b - a, denominator, out=np.zeros_like(a), where=denominator > 0)
+
+    mean = float(values.mean())
+    half_width = float(1.96 * values.std(ddof=1) / np.sqrt(len(values))) if len(values) > 1 else float("nan")
+    return {
+        "estimator": "simplified",
+        "score": mean,
+        "ci_low": mean - half_width,
+        "ci_high": mean + half_width,
+        "n_rows": len(X),
+    }
+
+SILHOUETTE_BACKENDS = {
+    "exact": exact_silhouette,
+    "sampled": sampled_silhouette,
+    "simplified": simplified_silhouette,
+}
+
+def choose_silhouette_backend(n_rows):
+    """Pick the silhouette estimator for a row count."""
+    if n_rows <= SILHOUETTE_EXACT_MAX_ROWS:
+        return "exact"
+    if n_rows <= SILHOUETTE_SAMPLED_MAX_ROWS:
+        return "sampled"
+    return "simplified"
 
 class DetermineDatasetAccuracy:
-    def __init__(self, dataset_id):
-        self.dataset_id = dataset_id
+    def __init__(self, dataset_id, single_fit=True, silhouette_backend="auto",
+                 streaming=False, sample_size=STREAM_SAMPLE_ROWS, stratify_by=None):
+        self._configure(dataset_id, single_fit, silhouette_backend, streaming, sample_size, stratify_by)
         self.load_dataset()
         self.preprocess_dataset()
 
+    @classmethod
+    def from_dataframe(cls, data, dataset_name="in-memory", single_fit=True, silhouette_backend="auto"):
+        """Analyze an in-memory DataFrame without going through the database."""
+        accuracy = cls.__new__(cls)
+        accuracy._configure(None, single_fit, silhouette_backend)
+        accuracy.dataset_name = dataset_name
+        accuracy.matrix = build_numeric_matrix(data)
+        accuracy.preprocess_dataset()
+        return accuracy
+
+    def _configure(self, dataset_id, single_fit, silhouette_backend,
+                   streaming=False, sample_size=STREAM_SAMPLE_ROWS, stratify_by=None):
+        self.dataset_id = dataset_id
+        self.content_hash = None
+        # "auto", a key of SILHOUETTE_BACKENDS or a callable(X, labels, random_state) -> dict
+        self.silhouette_backend = silhouette_backend
+        self.silhouette_result = None
+        # With single_fit the IsolationForest is fitted once and every candidate
+        # contamination is derived by thresholding its scores
+        self.single_fit = single_fit
+        self._X_scaled = None
+        self._anomaly_scores = None
+        self._model = None
+        # With streaming a CSV is read in chunks into a reservoir sample of sample_size
+        # rows, optionally stratified by the stratify_by column, and the contamination
+        # search runs on that sample with bounded memory
+        self.streaming = streaming
+        self.sample_size = sample_size
+        self.stratify_by = stratify_by
+        self.rows_seen = None
+        self._open_source = None
+        self._source_format = "csv"
+
     def load_dataset(self):
-        """Load the dataset from the database and convert to DataFrame."""
+        """Load the dataset's cleaned numeric matrix, parsing the stored file only on a cache miss.
+
+        In streaming mode the Parquet copy (or a CSV original) is sampled instead;
+        Excel originals without a Parquet copy cannot be read in chunks and are
+        loaded whole.
+        """
         db = next(get_db())  # Get database session
         try:
             dataset = get_dataset_by_id(db, self.dataset_id)  # Pass db session to get_dataset_by_id
@@ -26,41 +163,113 @@ class DetermineDatasetAccuracy:
                 raise ValueError(f"Dataset with ID {self.dataset_id} not found")
                 
             self.dataset_name = dataset.name
-            
-            # Convert binary data to DataFrame
-            try:
+            self.content_hash = dataset.content_hash or content_hash(get_dataset_file(dataset))
+
+            if self.streaming:
+                parquet_opener = dataset_parquet_opener(dataset)
+                if parquet_opener is not None:
+                    self.load_sample(parquet_opener, "parquet")
+                    return
                 if dataset.file_name.lower().endswith('.csv'):
-                    self.data = pd.read_csv(StringIO(dataset.file_data.decode('utf-8')))
-                else:  # Excel file
-                    self.data = pd.read_excel(BytesIO(dataset.file_data))
-            except Exception as e:
-                raise ValueError(f"Error reading dataset: {str(e)}")
+                    self.load_sample(dataset_file_opener(dataset), "csv")
+                    return
+
+            def read_dataset():
+                try:
+                    # Only the numeric columns are read from the Parquet copy
+                    return read_dataset_frame(dataset, numeric_only=True)
+                except Exception as e:
+                    raise ValueError(f"Error reading dataset: {str(e)}")
+
+            key = matrix_key("dataset", dataset.id, self.content_hash)
+            self.matrix = get_matrix(key, read_dataset)
         finally:
             db.close()
 
+    def load_sample(self, open_source, fmt="csv"):
+        """Build the matrix from a reservoir sample of a CSV or Parquet file read chunk by chunk.
+
+        open_source returns a new readable file (or the file's bytes) for each pass.
+        """
+        try:
+            sample, self.rows_seen = reservoir_sample(open_source(), self.sample_size, self.stratify_by, fmt=fmt)
+        except Exception as e:
+            raise ValueError(f"Error reading dataset: {str(e)}")
+        self.matrix = build_numeric_matrix(sample)
+        # Kept to score every row in a second pass
+        self._open_source = open_source
+        self._source_format = fmt
+
+    @property
+    def sampled(self):
+        """Whether the contamination was computed on a sample of the rows rather than all of them."""
+        return self.rows_seen is not None and self.rows_seen > self.sample_size
+
     def preprocess_dataset(self):
         """Prepare the dataset for contamination analysis."""
-        # Keep only numeric columns for analysis
-        self.features = self.data.select_dtypes(include=[np.number]).columns.tolist()
-        
-        if not self.features:
-            raise ValueError("No numeric columns found in the dataset")
-        
-        # Remove rows with missing values in numeric columns
-        self.data = self.data.dropna(subset=self.features)
-        
-        if len(self.data) == 0:
-            raise ValueError("No valid data rows after preprocessing")
+        # The cached matrix already holds only numeric columns without missing values
+        self.features = self.matrix.columns
+        self.data = self.matrix.frame()
+
+    def scaled_features(self):
+        """Standard-scale the numeric features once and share the matrix between phases."""
+        if self._X_scaled is None:
+            self._X_scaled = self.matrix.scaled()
+        return self._X_scaled
+
+    def anomaly_scores(self):
+        """Fit the IsolationForest once and cache its anomaly scores (lower is more abnormal).
+
+        The contamination parameter does not influence the trees, only the offset
+        subtracted in decision_function, so a single fit serves every candidate value.
+        """
+        if self._anomaly_scores is None:
+            self._model = IsolationForest(random_state=42, n_estimators=100)
+            self._model.fit(self.scaled_features())
+            self._anomaly_scores = self._model.score_samples(self.scaled_features())
+        return self._anomaly_scores
+
+    def iter_row_scores(self, contamination, chunksize=STREAM_CHUNK_ROWS):
+        """Score every row of a streamed dataset against the forest fitted on the sample.
+
+        Yields one DataFrame per chunk with the row's position in the file, its
+        anomaly score and whether it is an outlier at the given contamination, using
+        the score threshold of the sample. Rows with missing values are skipped.
+        """
+        if self._open_source is None:
+            raise ValueError("Per-row scores need a dataset loaded in streaming mode")
+        threshold = np.percentile(self.anomaly_scores(), 100.0 * contamination)
+        keep_columns = [self.stratify_by] if self.stratify_by else None
+        for positions, numeric, _ in iter_numeric_chunks(
+                self._open_source(), chunksize, keep_columns, self._source_format):
+            X = (numeric.to_numpy(dtype=np.float64) - self.matrix.mean) / self.matrix.scale
+            scores = self._model.score_samples(X)
+            yield pd.DataFrame({"row": positions, "score": scores, "outlier": scores < threshold})
+
+    def labels_for_contamination(self, contamination):
+        """Derive the IsolationForest labels for a contamination value from the cached scores.
+
+        Matches IsolationForest(contamination=contamination).fit_predict: rows scoring
+        below the contamination quantile are outliers (-1), the rest inliers (1).
+        """
+        scores = self.anomaly_scores()
+        threshold = np.percentile(scores, 100.0 * contamination)
+        return np.where(scores < threshold, -1, 1)
 
     def find_contamination_elbow(self):
         """Find optimal contamination using the elbow method on anomaly scores."""
-        X = self.data[self.features].copy()
-        scaler = StandardScaler()
-        X_scaled = scaler.fit_transform(X)
+        if self.single_fit:
+            # decision_function only shifts these scores by a constant, which
+            # does not move the elbow of the sorted curve
+            scores = self.anomaly_scores()
+        else:
+            X = self.data[self.features].copy()
+            scaler = StandardScaler()
+            X_scaled = scaler.fit_transform(X)
 
-        model = IsolationForest(contamination=0.1, random_state=42, n_estimators=100)
-        model.fit(X_scaled)
-        scores = model.decision_function(X_scaled)
+            model = IsolationForest(contamination=0.1, random_state=42, n_estimators=100)
+            model.fit(X_scaled)
+            scores = model.decision_function(X_scaled)
 
         sorted_scores = np.sort(scores)
         smoothed_scores = ndimage.gaussian_filter1d(sorted_scores, sigma=5)
@@ -77,25 +286,41 @@ class DetermineDatasetAccuracy:
     
     def find_optimal_contamination_silhouette(self, contamination_range=np.arange(0.01, 0.2, 0.01)):
         """Find optimal contamination using silhouette score."""
-        X = self.data[self.features].copy()
-        scaler = StandardScaler()
-        X_scaled = scaler.fit_transform(X)
+        if self.single_fit:
+            X_scaled = self.scaled_features()
+        else:
+            X = self.data[self.features].copy()
+            scaler = StandardScaler()
+            X_scaled = scaler.fit_transform(X)
         best_score = -1
         best_contamination = 0.05  # Default
 
         for contamination in contamination_range:
-            model = IsolationForest(contamination=contamination, random_state=42, n_estimators=100)
-            labels = model.fit_predict(X_scaled)
+            if self.single_fit:
+                labels = self.labels_for_contamination(contamination)
+            else:
+                model = IsolationForest(contamination=contamination, random_state=42, n_estimators=100)
+                labels = model.fit_predict(X_scaled)
 
             if len(np.unique(labels)) < 2:
                 continue
 
-            score = silhouette_score(X_scaled, labels)
-            if score > best_score:
-                best_score = score
+            result = self.silhouette(X_scaled, labels)
+            if result["score"] > best_score:
+                best_score = result["score"]
                 best_contamination = contamination
+                self.silhouette_result = dict(result, contamination=float(contamination))
 
         return best_contamination
+
+    def silhouette(self, X, labels):
+        """Evaluate the silhouette with the configured backend; the result names the estimator used."""
+        backend = self.silhouette_backend
+        if backend == "auto":
+            backend = choose_silhouette_backend(len(X))
+        if callable(backend):
+            return backend(X, labels, random_state=42)
+        return SILHOUETTE_BACKENDS[backend](X, labels, random_state=42)
     
     def find_contamination(self):
         """Combine elbow method and silhouette score for robust optimization."""
@@ -0,0 +1,122 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import numpy as np
+import pandas as pd
+from typing import Callable, List, Optional
+
+# On-disk cache of cleaned numeric matrices, one directory per key:
+#   values.npy  raw numeric values (rows with missing values dropped), opened memory-mapped
+#   meta.json   column names and standard-scaler parameters
+CACHE_DIR = os.environ.get(
+    "NSQAS_MATRIX_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "matrices")
+)
+CACHE_MAX_BYTES = int(os.environ.get("NSQAS_MATRIX_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+
+_evict_lock = threading.Lock()
+
+class CachedMatrix:
+    """Cleaned numeric matrix of a dataset plus the parameters to standard-scale it."""
+
+    def __init__(self, values: np.ndarray, columns: List[str], mean: np.ndarray, scale: np.ndarray):
+        self.values = values
+        self.columns = columns
+        self.mean = mean
+        self.scale = scale
+
+    def frame(self) -> pd.DataFrame:
+        """DataFrame view over the (memory-mapped) values without copying them."""
+        return pd.DataFrame(self.values, columns=self.columns, copy=False)
+
+    def scaled(self) -> np.ndarray:
+        """Standard-scaled values, equivalent to StandardScaler().fit_transform(values)."""
+        return (self.values - self.mean) / self.scale
+
+def matrix_key(kind: str, source_id: int, content_hash: str) -> str:
+    """Cache key of a source (e.g. "dataset", "training") by id and content hash."""
+    return f"{kind}-{source_id}-{content_hash}"
+
+def build_numeric_matrix(df: pd.DataFrame) -> CachedMatrix:
+    """Keep the numeric columns, drop rows with missing values and compute scaler parameters."""
+    columns = df.select_dtypes(include=[np.number]).columns.tolist()
+    if not columns:
+        raise ValueError("No numeric columns found in the dataset")
+    values = np.ascontiguousarray(df[columns].dropna().to_numpy(dtype=np.float64))
+    if len(values) == 0:
+        raise ValueError("No valid data rows after preprocessing")
+    mean = values.mean(axis=0)
+    scale = values.std(axis=0)
+    scale[scale == 0] = 1.0  # Same handling of constant columns as StandardScaler
+    return CachedMatrix(values, [str(column) for column in columns], mean, scale)
+
+def _entry_dir(key: str) -> str:
+    return os.path.join(CACHE_DIR, key)
+
+def load_matrix(key: str) -> Optional[CachedMatrix]:
+    """Open a cached matrix memory-mapped, or return None on a miss."""
+    entry = _entry_dir(key)
+    meta_path = os.path.join(entry, "meta.json")
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        values = np.load(os.path.join(entry, "values.npy"), mmap_mode="r")
+    except (FileNotFoundError, ValueError):
+        return None
+    os.utime(meta_path)  # Mark as recently used for LRU eviction
+    return CachedMatrix(values, meta["columns"], np.asarray(meta["mean"]), np.asarray(meta["scale"]))
+
+def store_matrix(key: str, matrix: CachedMatrix):
+    """Write a matrix to the cache atomically and evict least recently used entries."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=f".{key}-", dir=CACHE_DIR)
+    try:
+        np.save(os.path.join(tmp_dir, "values.npy"), matrix.values)
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+            json.dump({
+                "columns": matrix.columns,
+                "mean": matrix.mean.tolist(),
+                "scale": matrix.scale.tolist(),
+                "rows": int(matrix.values.shape[0]),
+            }, f)
+        os.replace(tmp_dir, _entry_dir(key))
+    except OSError:
+        # Another process stored the same key first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    evict(CACHE_MAX_BYTES)
+
+def get_matrix(key: str, loader: Callable[[], pd.DataFrame]) -> CachedMatrix:
+    """Get the cleaned matrix for a key, building it from loader() on a miss."""
+    matrix = load_matrix(key)
+    if matrix is not None:
+        return matrix
+    built = build_numeric_matrix(loader())
+    store_matrix(key, built)
+    matrix = load_matrix(key)
+    # A matrix larger than the whole cache budget is evicted right away
+    return matrix if matrix is not None else built
+
+def _entry_size(entry: str) -> int:
+    return sum(entry_file.stat().st_size for entry_file in os.scandir(entry) if entry_file.is_file())
+
+def evict(max_bytes: int = CACHE_MAX_BYTES):
+    """Delete least recently used entries until the cache fits in max_bytes."""
+    with _evict_lock:
+        entries = []
+        for entry in os.scandir(CACHE_DIR) if os.path.isdir(CACHE_DIR) else []:
+            if not entry.is_dir() or entry.name.startswith("."):
+                continue
+            try:
+                last_used = os.stat(os.path.join(entry.path, "meta.json")).st_mtime
+                entries.append((last_used, _entry_size(entry.path), entry.path))
+            except FileNotFoundError:
+                continue
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            # Already opened memory maps stay valid after the files are unlinked
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
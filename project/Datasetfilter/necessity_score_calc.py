@@ -1,74 +1,131 @@
 from sklearn.model_selection import train_test_split
-from sklearn.metrics import mean_squared_error
 from xgboost import XGBRegressor
-import shap
 import pandas as pd
 import streamlit as st
-from database.db_operations import get_ai_model_by_id, create_necessity_score, get_necessity_scores, get_all_datasets, get_user_by_email
+from database.db_operations import (
+    get_ai_model_by_id,
+    get_training_data,
+    read_training_frame,
+    get_contribution_cache,
+    get_surrogate_booster,
+    create_contribution_cache,
+    get_visible_dataset_ids
+)
+from database.hashing import content_hash, key_hash
 from database.database import get_db
-from io import StringIO
+from pages.session_user import get_current_user
+from Datasetfilter.scoring_engine import get_scoring_engine
+from Datasetfilter.shap_budget import (
+    ShapBudget,
+    summarize_background,
+    sample_rows,
+    tree_shap_values,
+    relative_contribution,
+    bootstrap_contribution_error
+)
+from typing import Optional
+from dataclasses import asdict
+
+# Hyperparameters of the XGBoost surrogate explained with SHAP
+SURROGATE_PARAMS = {"n_estimators": 100, "max_depth": 4}
 
 class NecessityScoreCalculator:
-    def __init__(self, model_id: int):
+    def __init__(self, model_id: int, budget: Optional[ShapBudget] = None):
         self.model_id = model_id
-        db = next(get_db())
-        self.data = pd.read_csv(StringIO(get_ai_model_by_id(db, self.model_id).training_data_set.decode('utf-8')))
+        self.budget = budget if budget is not None else ShapBudget()
+        self.necessity_errors = None
         self.get_feature_contribution()
 
     def get_feature_contribution(self):
-        
         db = next(get_db())
-        model = get_ai_model_by_id(db, self.model_id)
-        self.features = [feature for feature in model.training_data_set_metadata['columns'] if feature != model.target_field]
-        x= self.data[self.features]
-        y= self.data[model.target_field]
+        try:
+            model = get_ai_model_by_id(db, self.model_id)
+            self.target_field = model.target_field
+            self.features = [feature for feature in model.training_data_set_metadata['columns'] if feature != model.target_field]
 
-        current_user = get_user_by_email(db, str(st.user.email))
+            # contributions are keyed by content, so identical training data uploaded by
+            # any user is only explained once and a new upload gets a new key
+            self.training_data_hash = model.training_data_digest or content_hash(get_training_data(model))
+            self.surrogate_key = key_hash(self.training_data_hash, self.target_field, SURROGATE_PARAMS)
+            self.cache_key = key_hash(self.surrogate_key, asdict(self.budget))
 
-        # check if for the model id, feature is already in the necessity_scores table
-        necessity_scores = get_necessity_scores(db, current_user.id, self.model_id)
-        # print(f"[Inside get_feature_contribution] necessity_scores: {[score.feature_name for score in necessity_scores]}")
-        if necessity_scores:
-            scores = [score.score for score in necessity_scores]
-            self.necessity_scores = pd.DataFrame(scores, index=self.features)
-            return
+            cached = get_contribution_cache(db, self.cache_key)
+            if cached is not None:
+                self._set_contributions(cached.contributions, cached.contribution_errors)
+                return
 
-        x_train, x_test, y_train, y_test= train_test_split(x, y, test_size=0.2, random_state=0)
+            # the surrogate trains on the raw training data: XGBoost handles missing
+            # values itself, so no row or feature is dropped
+            data = read_training_frame(model)
+            missing = [column for column in self.features + [self.target_field] if column not in data.columns]
+            if missing:
+                raise ValueError(f"Training data is missing the columns {missing}")
+            x = data[self.features]
+            y = data[self.target_field]
+            x_train, x_test, y_train, y_test= train_test_split(x, y, test_size=0.2, random_state=0)
 
-        model = XGBRegressor(n_estimators=100, max_depth=4)
-        model.fit(x_train, y_train)
+            booster = get_surrogate_booster(db, self.surrogate_key)
+            if booster is not None:
+                surrogate = XGBRegressor(**SURROGATE_PARAMS)
+                surrogate.load_model(bytearray(booster))
+            else:
+                surrogate = XGBRegressor(**SURROGATE_PARAMS)
+                surrogate.fit(x_train, y_train)
+                booster = bytes(surrogate.get_booster().save_raw(raw_format="ubj"))
 
-        explainer = shap.Explainer(model, x_train)
-        shap_values = explainer(x_test)
-        shap_df= pd.DataFrame(shap_values.values, columns=x_test.columns)
+            # explain a capped sample against a summarized background with TreeSHAP
+            background = summarize_background(x_train, y_train, self.budget)
+            x_explain = sample_rows(x_test, self.budget.max_explain, self.budget.random_state)
+            shap_values = tree_shap_values(surrogate, background, x_explain)
 
-        mean_contribution= shap_df.abs().mean()
-        relative_contribution= mean_contribution/mean_contribution.sum()
-        self.necessity_scores= pd.DataFrame(relative_contribution, index=self.features)
+            contributions = relative_contribution(shap_values, x_explain.columns).to_dict()
+            errors = None
+            if self.budget.bootstrap_rounds:
+                errors = bootstrap_contribution_error(
+                    shap_values, x_explain.columns, self.budget.bootstrap_rounds, self.budget.random_state).to_dict()
+            self._set_contributions(contributions, errors)
 
-        for feature, score in zip(self.features, self.necessity_scores):
-            create_necessity_score(db, current_user.id, self.model_id, feature, score)
+            create_contribution_cache(
+                db,
+                cache_key=self.cache_key,
+                surrogate_key=self.surrogate_key,
+                training_data_hash=self.training_data_hash,
+                target_field=self.target_field,
+                surrogate_params=SURROGATE_PARAMS,
+                contributions={feature: float(score) for feature, score in contributions.items()},
+                contribution_errors={feature: float(error) for feature, error in errors.items()} if errors else None,
+                surrogate_booster=booster
+            )
+        finally:
+            db.close()
 
-    def get_necessity_scores(self):
-        #get the feature from datasets table
-        # get only those features which are equal to self.features
-        # return the features which are equal to self.features  
+    def _set_contributions(self, contributions: dict, errors: Optional[dict] = None):
+        self.necessity_scores = pd.DataFrame(
+            [contributions.get(feature, 0.0) for feature in self.features], index=self.features)
+        if errors:
+            self.necessity_errors = pd.Series([errors.get(feature, 0.0) for feature in self.features], index=self.features)
+
+    def load_surrogate(self) -> Optional[XGBRegressor]:
+        """Load the fitted surrogate stored with the cached contributions, if any."""
         db = next(get_db())
-        datasets = get_all_datasets(db)
-        current_user = get_user_by_email(db, str(st.user.email))
-        necessity_scores = []
-        for dataset in datasets:
-            if dataset.is_public or dataset.owner_id == current_user.id:
-                dataset_df = pd.read_csv(StringIO(dataset.file_data.decode('utf-8')))
-                dataset_score = []
-                score_lst = []
-                score = 0
-                for feature in self.features:
-                    if feature in dataset_df.columns:
-                        # st.write(NecessityScoreCalculator(self.model_id).necessity_scores.loc[feature])
-                        score += NecessityScoreCalculator(self.model_id).necessity_scores.loc[feature][0]
-                # print(f"hello score: {score}")
-                necessity_scores.append((score, dataset.id))
+        try:
+            booster = get_surrogate_booster(db, self.surrogate_key)
+        finally:
+            db.close()
+        if booster is None:
+            return None
+        surrogate = XGBRegressor(**SURROGATE_PARAMS)
+        surrogate.load_model(bytearray(booster))
+        return surrogate
 
-        # print(f"necessity_scores: {necessity_scores}")
-        return necessity_scores
+    def get_necessity_scores(self, top_k: Optional[int] = None):
+        # score every dataset visible to the user in one sparse product over the
+        # column index, using the necessity vector computed once for this model
+        db = next(get_db())
+        try:
+            current_user = get_current_user(db)
+            engine = get_scoring_engine(db)
+            visible_ids = get_visible_dataset_ids(db, current_user.id)
+            return engine.score(self.necessity_scores[0], allowed_ids=visible_ids, top_k=top_k)
+        finally:
+            db.close()
@@ -0,0 +1,189 @@
+import numpy as np
+import pandas as pd
+from io import BytesIO
+from typing import IO, Iterator, List, Optional, Tuple, Union
+from database.columnar import iter_parquet_batches, numeric_columns as parquet_numeric_columns
+
+# Rows parsed per chunk when streaming a CSV
+STREAM_CHUNK_ROWS = 50_000
+# Rows kept in the reservoir sample used to fit the contamination search
+STREAM_SAMPLE_ROWS = 100_000
+# A stratification column with more distinct values than this stops being used
+MAX_STRATA = 100
+
+def _open(source: Union[str, bytes, IO]) -> IO:
+    return BytesIO(source) if isinstance(source, (bytes, bytearray, memoryview)) else source
+
+def _read_chunks(source, chunksize: int, fmt: str, keep_columns: Optional[List[str]]) -> Iterator[pd.DataFrame]:
+    if fmt == "parquet":
+        source = _open(source)
+        # Only the numeric and kept columns are decoded
+        columns = parquet_numeric_columns(source)
+        columns += [column for column in keep_columns or [] if column not in columns]
+        if hasattr(source, "seek"):
+            source.seek(0)
+        return iter_parquet_batches(source, chunksize, columns)
+    return pd.read_csv(_open(source), chunksize=chunksize)
+
+def iter_numeric_chunks(
+    source: Union[str, bytes, IO],
+    chunksize: int = STREAM_CHUNK_ROWS,
+    keep_columns: Optional[List[str]] = None,
+    fmt: str = "csv"
+) -> Iterator[Tuple[np.ndarray, pd.DataFrame, pd.DataFrame]]:
+    """Read a CSV or Parquet file in chunks and yield (row positions, numeric frame, kept frame) per chunk.
+
+    The numeric columns are the ones inferred as numeric in the first chunk;
+    later chunks are coerced to them, and rows with missing values are dropped.
+    keep_columns (e.g. a stratification column) are returned alongside untouched.
+    Only one chunk is held in memory at a time.
+    """
+    numeric_columns = None
+    offset = 0
+    for chunk in _read_chunks(source, chunksize, fmt, keep_columns):
+        if numeric_columns is None:
+            numeric_columns = [
+                column for column in chunk.select_dtypes(include=[np.number]).columns
+                if column not in (keep_columns or [])
+            ]
+            if not numeric_columns:
+                raise ValueError("No numeric columns found in the dataset")
+        numeric = chunk[numeric_columns].apply(pd.to_numeric, errors="coerce")
+        complete = numeric.notna().all(axis=1).to_numpy()
+        positions = np.arange(offset, offset + len(chunk))[complete]
+        offset += len(chunk)
+        kept = chunk.loc[complete, keep_columns] if keep_columns else chunk.iloc[:0]
+        yield positions, numeric[complete], kept
+
+class ReservoirSampler:
+    """Fixed-size uniform sample of a stream of rows.
+
+    Every row gets a random key and the rows with the smallest keys are kept
+    (the "random sort" reservoir), so the result is a uniform sample of the
+    whole stream whatever the chunk sizes. With stratification one reservoir
+    is kept per stratum and the final sample is allocated proportionally to
+    the stratum sizes seen, with at least one row per stratum.
+
+    The strata together hold at most twice `size` rows (plus a chunk): past
+    that every stratum is cut down to its current proportional quota. A
+    stratum whose share grows after a cut may end up slightly under its
+    final quota.
+    """
+
+    def __init__(self, size: int = STREAM_SAMPLE_ROWS, random_state: int = 0):
+        self.size = size
+        self.rng = np.random.default_rng(random_state)
+        self.columns = None
+        # stratum -> (keys, values, positions)
+        self._reservoirs = {}
+        self._counts = {}
+        self.merged = False
+
+    def add(self, positions: np.ndarray, values: np.ndarray, strata: Optional[np.ndarray] = None):
+        """Offer a chunk of rows to the sample."""
+        if strata is None or self.merged:
+            self._add(None, positions, values)
+            return
+        for stratum in pd.unique(strata):
+            mask = strata == stratum
+            self._add(stratum, positions[mask], values[mask])
+        if self.retained > 2 * self.size:
+            self._trim_to_quotas()
+
+    def _add(self, stratum, positions, values):
+        self._counts[stratum] = self._counts.get(stratum, 0) + len(positions)
+        keys = self.rng.random(len(positions))
+        if stratum in self._reservoirs:
+            old_keys, old_values, old_positions = self._reservoirs[stratum]
+            keys = np.concatenate([old_keys, keys])
+            values = np.concatenate([old_values, values])
+            positions = np.concatenate([old_positions, positions])
+        if len(keys) > self.size:
+            keep = np.argpartition(keys, self.size)[:self.size]
+            keys, values, positions = keys[keep], values[keep], positions[keep]
+        self._reservoirs[stratum] = (keys, values, positions)
+
+    def _quota(self, stratum, total: int) -> int:
+        return max(1, int(round(self.size * self._counts[stratum] / total)))
+
+    def _trim_to_quotas(self):
+        """Keep only the smallest keys of every stratum, up to its proportional share of `size`."""
+        total = self.rows_seen
+        for stratum, (keys, values, positions) in self._reservoirs.items():
+            quota = self._quota(stratum, total)
+            if len(keys) > quota:
+                keep = np.argpartition(keys, quota)[:quota]
+                self._reservoirs[stratum] = (keys[keep], values[keep], positions[keep])
+
+    def merge_strata(self):
+        """Fall back to a single uniform reservoir for the rest of the stream.
+
+        Every stratum reservoir holds that stratum's smallest keys, so their union
+        holds the smallest keys overall and the merged reservoir stays uniform.
+        """
+        reservoirs = list(self._reservoirs.values())
+        self._reservoirs = {}
+        self._counts = {None: self.rows_seen}
+        keys, values, positions = (np.concatenate(parts) for parts in zip(*reservoirs))
+        if len(keys) > self.size:
+            keep = np.argpartition(keys, self.size)[:self.size]
+            keys, values, positions = keys[keep], values[keep], positions[keep]
+        self._reservoirs[None] = (keys, values, positions)
+        self.merged = True
+
+    @property
+    def rows_seen(self) -> int:
+        return sum(self._counts.values())
+
+    @property
+    def retained(self) -> int:
+        """Rows currently held across all reservoirs."""
+        return sum(len(keys) for keys, _, _ in self._reservoirs.values())
+
+    @property
+    def strata(self) -> int:
+        return len(self._reservoirs)
+
+    def sample(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the sampled (values, positions), ordered by position in the stream."""
+        if not self._reservoirs:
+            raise ValueError("No valid data rows after preprocessing")
+        total = self.rows_seen
+        parts = []
+        for stratum, (keys, values, positions) in self._reservoirs.items():
+            if len(self._reservoirs) == 1:
+                quota = len(keys)
+            else:
+                quota = min(len(keys), self._quota(stratum, total))
+            keep = np.argsort(keys)[:quota]
+            parts.append((values[keep], positions[keep]))
+        values = np.concatenate([part[0] for part in parts])
+        positions = np.concatenate([part[1] for part in parts])
+        order = np.argsort(positions)
+        return values[order], positions[order]
+
+def reservoir_sample(
+    source: Union[str, bytes, IO],
+    size: int = STREAM_SAMPLE_ROWS,
+    stratify_by: Optional[str] = None,
+    chunksize: int = STREAM_CHUNK_ROWS,
+    random_state: int = 0,
+    fmt: str = "csv"
+) -> Tuple[pd.DataFrame, int]:
+    """Stream a CSV or Parquet file once and return a reservoir sample of its numeric columns and the rows seen.
+
+    stratify_by names a column (numeric or not) whose values are sampled
+    proportionally; it is dropped from the returned features. Once it shows
+    more than MAX_STRATA distinct values the sample becomes a plain uniform one.
+    """
+    sampler = ReservoirSampler(size, random_state)
+    keep_columns = [stratify_by] if stratify_by else None
+    for positions, numeric, kept in iter_numeric_chunks(source, chunksize, keep_columns, fmt):
+        sampler.columns = [str(column) for column in numeric.columns]
+        strata = kept[stratify_by].astype(str).to_numpy() if stratify_by else None
+        sampler.add(positions, numeric.to_numpy(dtype=np.float64), strata)
+        if not sampler.merged and sampler.strata > MAX_STRATA:
+            # Too many distinct values to be a stratification hint
+            sampler.merge_strata()
+    values, _ = sampler.sample()
+    return pd.DataFrame(values, columns=sampler.columns), sampler.rows_seen
@@ -0,0 +1,98 @@
+import threading
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sqlalchemy.orm import Session
+from typing import Optional, List, Tuple, Iterable
+from database.db_operations import iter_dataset_columns, get_dataset_columns_signature
+
+def normalize_feature_name(name) -> str:
+    """Normalize a column name so that e.g. ' Petal Width ' and 'petal width' match."""
+    return " ".join(str(name).strip().lower().split())
+
+class DatasetScoringEngine:
+    """Score every dataset against a model in one sparse matrix-vector product.
+
+    The engine keeps a datasets x features incidence matrix built from the
+    dataset_columns index: entry (i, j) is 1 when dataset i has a column whose
+    normalized name is feature j. A dataset's score is the sum of the model's
+    necessity scores over the features it contains.
+    """
+
+    def __init__(self, dataset_ids: np.ndarray, feature_index: dict, matrix: sparse.csr_matrix, signature=None):
+        self.dataset_ids = dataset_ids
+        self.feature_index = feature_index
+        self.matrix = matrix
+        self.signature = signature
+
+    @classmethod
+    def from_pairs(cls, pairs: Iterable[Tuple[int, str]], signature=None) -> "DatasetScoringEngine":
+        """Build the incidence matrix from (dataset_id, feature_name) pairs."""
+        feature_index = {}
+        row_ids, col_ids = [], []
+        for dataset_id, feature_name in pairs:
+            row_ids.append(dataset_id)
+            col_ids.append(feature_index.setdefault(normalize_feature_name(feature_name), len(feature_index)))
+
+        dataset_ids, rows = np.unique(np.asarray(row_ids, dtype=np.int64), return_inverse=True)
+        matrix = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, np.asarray(col_ids, dtype=np.int64))),
+            shape=(len(dataset_ids), len(feature_index))
+        )
+        # Columns that collapse to the same normalized name must only count once
+        matrix.sum_duplicates()
+        matrix.data[:] = 1
+        return cls(dataset_ids, feature_index, matrix, signature)
+
+    @classmethod
+    def from_db(cls, db: Session) -> "DatasetScoringEngine":
+        """Build the engine from the dataset_columns index."""
+        signature = get_dataset_columns_signature(db)
+        return cls.from_pairs(iter_dataset_columns(db), signature)
+
+    def necessity_vector(self, necessity_scores: pd.Series) -> np.ndarray:
+        """Project a model's per-feature necessity scores onto the engine's feature space."""
+        vector = np.zeros(len(self.feature_index), dtype=np.float64)
+        for feature, score in necessity_scores.items():
+            column = self.feature_index.get(normalize_feature_name(feature))
+            if column is not None:
+                vector[column] += score
+        return vector
+
+    def score(
+        self,
+        necessity_scores: pd.Series,
+        allowed_ids: Optional[Iterable[int]] = None,
+        top_k: Optional[int] = None
+    ) -> List[Tuple[float, int]]:
+        """Score all datasets and return (score, dataset_id) pairs, best first.
+
+        Datasets sharing no feature with the model are left out. When allowed_ids
+        is given only those datasets are considered.
+        """
+        if not len(self.dataset_ids):
+            return []
+        scores = self.matrix @ self.necessity_vector(necessity_scores)
+
+        candidates = scores > 0
+        if allowed_ids is not None:
+            candidates &= np.isin(self.dataset_ids, np.fromiter(allowed_ids, dtype=np.int64))
+        candidate_idx = np.flatnonzero(candidates)
+
+        if top_k is not None and top_k < len(candidate_idx):
+            candidate_idx = candidate_idx[np.argpartition(-scores[candidate_idx], top_k - 1)[:top_k]]
+        candidate_idx = candidate_idx[np.argsort(-scores[candidate_idx], kind="stable")]
+
+        return [(float(scores[i]), int(self.dataset_ids[i])) for i in candidate_idx]
+
+_engine: Optional[DatasetScoringEngine] = None
+_engine_lock = threading.Lock()
+
+def get_scoring_engine(db: Session) -> DatasetScoringEngine:
+    """Get the process-wide engine, rebuilding it only when the column index has changed."""
+    global _engine
+    signature = get_dataset_columns_signature(db)
+    with _engine_lock:
+        if _engine is None or _engine.signature != signature:
+            _engine = DatasetScoringEngine.from_db(db)
+        return _engine
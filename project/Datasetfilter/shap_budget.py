@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import shap
+from dataclasses import dataclass
+from typing import Optional
+from sklearn.cluster import MiniBatchKMeans
+
+@dataclass
+class ShapBudget:
+    """Compute budget for explaining the surrogate model with TreeSHAP.
+
+    max_background: rows kept in the background set the explainer integrates over (None = all)
+    background_method: "kmeans" to summarize the training rows by cluster centers,
+        "stratified" to sample them proportionally across target quantiles
+    max_explain: rows of the test split that are explained (None = all)
+    bootstrap_rounds: resamples used to estimate the standard error of the
+        relative contributions (0 disables the estimate)
+    """
+    max_background: Optional[int] = 100
+    background_method: str = "kmeans"
+    max_explain: Optional[int] = 2000
+    bootstrap_rounds: int = 0
+    random_state: int = 0
+
+    @classmethod
+    def unlimited(cls) -> "ShapBudget":
+        """Budget equivalent to explaining the full test split against the full training split."""
+        return cls(max_background=None, max_explain=None)
+
+def sample_rows(x: pd.DataFrame, max_rows: Optional[int], random_state: int = 0) -> pd.DataFrame:
+    """Uniformly sample at most max_rows rows."""
+    if max_rows is None or len(x) <= max_rows:
+        return x
+    return x.sample(n=max_rows, random_state=random_state)
+
+def stratified_sample(x: pd.DataFrame, y: pd.Series, max_rows: int, random_state: int = 0, bins: int = 10) -> pd.DataFrame:
+    """Sample at most max_rows rows, keeping the share of each target quantile bin."""
+    if len(x) <= max_rows:
+        return x
+    if pd.api.types.is_numeric_dtype(y) and y.nunique() > bins:
+        strata = pd.qcut(y, q=bins, labels=False, duplicates="drop")
+    else:
+        strata = y.astype("category").cat.codes
+    fraction = max_rows / len(x)
+    sampled = (
+        x.groupby(strata.values, group_keys=False)
+        .apply(lambda group: group.sample(n=max(1, round(len(group) * fraction)), random_state=random_state))
+    )
+    return sampled.iloc[:max_rows]
+
+def summarize_background(x: pd.DataFrame, y: pd.Series, budget: ShapBudget) -> pd.DataFrame:
+    """Reduce the training rows to a background set of at most budget.max_background rows."""
+    if budget.max_background is None or len(x) <= budget.max_background:
+        return x
+    if budget.background_method == "kmeans" and not x.isnull().values.any():
+        kmeans = MiniBatchKMeans(n_clusters=budget.max_background, random_state=budget.random_state, n_init=3)
+        kmeans.fit(x.to_numpy(dtype=np.float64))
+        return pd.DataFrame(kmeans.cluster_centers_, columns=x.columns)
+    # k-means cannot handle missing values, fall back to a stratified sample
+    return stratified_sample(x, y, budget.max_background, budget.random_state)
+
+def tree_shap_values(model, background: pd.DataFrame, x_explain: pd.DataFrame) -> np.ndarray:
+    """Explain a fitted tree ensemble with interventional TreeSHAP."""
+    explainer = shap.TreeExplainer(model, data=background, feature_perturbation="interventional")
+    return explainer.shap_values(x_explain, check_additivity=False)
+
+def relative_contribution(shap_values: np.ndarray, features) -> pd.Series:
+    """Share of the mean absolute SHAP value attributed to each feature."""
+    mean_contribution = np.abs(shap_values).mean(axis=0)
+    return pd.Series(mean_contribution / mean_contribution.sum(), index=features)
+
+def bootstrap_contribution_error(shap_values: np.ndarray, features, rounds: int, random_state: int = 0) -> pd.Series:
+    """Bootstrap standard error of the relative contributions over the explained rows."""
+    rng = np.random.default_rng(random_state)
+    abs_values = np.abs(shap_values)
+    samples = np.empty((rounds, abs_values.shape[1]))
+    for i in range(rounds):
+        mean_contribution = abs_values[rng.integers(0, len(abs_values), len(abs_values))].mean(axis=0)
+        samples[i] = mean_contribution / mean_contribution.sum()
+    return pd.Series(samples.std(axis=0, ddof=1 if rounds > 1 else 0), index=features)
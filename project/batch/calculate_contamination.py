@@ -1,8 +1,5 @@
-import pandas as pd
-import numpy as np
-from io import BytesIO, StringIO
 from sqlalchemy.orm import Session
-from sqlalchemy import select, create_engine
+from sqlalchemy import update
 import sys
 import os
 
@@ -11,15 +8,22 @@ project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 if project_root not in sys.path:
     sys.path.append(project_root)
 
-from database.database import get_db
-from database.models import Dataset
-from typing import Optional
+from database.database import get_read_db, get_write_db
+from database.models import Dataset, Job
+from database.db_operations import get_contamination_result, record_contamination
+from database.job_queue import (
+    CONTAMINATION_JOB,
+    enqueue_contamination,
+    enqueue_pending_contamination,
+    get_job_counts
+)
 import logging
 from Datasetfilter.determine_accuracy import DetermineDatasetAccuracy
-import threading
-import time
+from batch.job_worker import JobHandler, run_workers
+import argparse
+from functools import partial
 from datetime import datetime
-import json
+from threadpoolctl import threadpool_limits
 
 # Set up logging
 log_dir = "logs"
@@ -35,126 +39,119 @@ logging.basicConfig(
     ]
 )
 
-# Global variables for tracking progress
-PROCESS_STATUS = {
-    "is_running": False,
-    "total_datasets": 0,
-    "processed_datasets": 0,
-    "failed_datasets": 0,
-    "start_time": None,
-    "end_time": None,
-    "current_dataset": None,
-    "errors": []
-}
-
-def save_status():
-    """Save the current process status to a file."""
-    status_file = os.path.join(log_dir, "contamination_process_status.json")
-    with open(status_file, 'w') as f:
-        # Create a copy of the status dict with datetime objects converted to strings
-        status_copy = PROCESS_STATUS.copy()
-        if status_copy["start_time"]:
-            status_copy["start_time"] = status_copy["start_time"].isoformat()
-        if status_copy["end_time"]:
-            status_copy["end_time"] = status_copy["end_time"].isoformat()
-        json.dump(status_copy, f, indent=4)
-
-def process_datasets():
-    """Process all datasets that don't have contamination values."""
-    global PROCESS_STATUS
-    
-    if PROCESS_STATUS["is_running"]:
-        logging.warning("Process is already running")
-        return
-    
-    PROCESS_STATUS["is_running"] = True
-    PROCESS_STATUS["start_time"] = datetime.now()
-    PROCESS_STATUS["errors"] = []
-    save_status()
-    
-    db = next(get_db())
+def compute_contamination(dataset_id: int, blas_threads: int = 1, sample_size: int = None):
+    """Compute the contamination of one dataset.
+
+    BLAS/OpenMP pools are capped to blas_threads so that N worker processes do not
+    oversubscribe the cores with N x cores native threads. With sample_size the
+    dataset is streamed into a reservoir sample of that many rows; the last
+    value returned tells whether the dataset had more rows than that.
+    """
+    with threadpool_limits(limits=blas_threads):
+        if sample_size:
+            accuracy_determiner = DetermineDatasetAccuracy(dataset_id, streaming=True, sample_size=sample_size)
+        else:
+            accuracy_determiner = DetermineDatasetAccuracy(dataset_id)
+        contamination = accuracy_determiner.find_contamination()
+    silhouette_result = accuracy_determiner.silhouette_result or {}
+    return (dataset_id, contamination, silhouette_result.get('estimator', 'none'),
+            accuracy_determiner.content_hash, accuracy_determiner.sampled)
+
+def run_contamination_job(db: Session, job: Job, blas_threads: int = 1, sample_size: int = None) -> dict:
+    """Job handler: compute a dataset's contamination, or take it from the memo of its content."""
+    dataset_id = job.payload["dataset_id"]
+    dataset_hash = db.query(Dataset.content_hash).filter(Dataset.id == dataset_id).scalar()
+    memo = get_contamination_result(db, dataset_hash) if dataset_hash else None
+    if memo is not None:
+        return {"dataset_id": dataset_id, "content_hash": dataset_hash, "contamination": memo.contamination,
+                "silhouette_estimator": memo.silhouette_estimator, "memoized": True, "sampled": False}
+
+    _, contamination, estimator, computed_hash, sampled = compute_contamination(dataset_id, blas_threads, sample_size)
+    if contamination is None:
+        raise ValueError(f"Could not calculate contamination for dataset {dataset_id}")
+    return {"dataset_id": dataset_id, "content_hash": computed_hash, "contamination": float(contamination),
+            "silhouette_estimator": estimator, "memoized": False, "sampled": sampled}
+
+def apply_contamination_job(db: Session, job: Job, result: dict):
+    """Stage a contamination result in the worker's session.
+
+    The result is applied to every dataset with the same bytes, which
+    enqueue_pending_contamination left to this job. A result computed on a sample
+    of the rows is not memoized, so that it is not reused as the exact value.
+    """
+    dataset_id = result["dataset_id"]
+    # Uploaded before content hashes were stored
+    db.execute(update(Dataset).where(Dataset.id == dataset_id, Dataset.content_hash.is_(None)).values(
+        content_hash=result["content_hash"]))
+    result["datasets_updated"] = record_contamination(
+        db, result["content_hash"], result["contamination"], result["silhouette_estimator"],
+        memoize=not result["sampled"])
+
+def contamination_handlers(blas_threads: int = 1, sample_size: int = None) -> dict:
+    return {CONTAMINATION_JOB: JobHandler(
+        partial(run_contamination_job, blas_threads=blas_threads, sample_size=sample_size),
+        apply_contamination_job
+    )}
+
+def get_process_status():
+    """Get the number of contamination jobs per status."""
+    db = next(get_read_db())
     try:
-        # Get all datasets without contamination values
-        datasets = db.execute(
-            select(Dataset).where(Dataset.contamination.is_(None))
-        ).scalars().all()
-        
-        PROCESS_STATUS["total_datasets"] = len(datasets)
-        logging.info(f"Found {len(datasets)} datasets to process")
-        save_status()
-        
-        for dataset in datasets:
-            try:
-                PROCESS_STATUS["current_dataset"] = f"Dataset {dataset.id}: {dataset.name}"
-                save_status()
-                
-                # Create DetermineDatasetAccuracy instance for this dataset
-                accuracy_determiner = DetermineDatasetAccuracy(dataset.id)
-                
-                # Calculate contamination using the existing class
-                contamination = accuracy_determiner.find_contamination()
-                
-                if contamination is not None:
-                    # Update dataset with contamination value
-                    dataset.contamination = contamination
-                    db.commit()
-                    logging.info(f"Updated contamination value for dataset {dataset.id}: {contamination}")
-                    PROCESS_STATUS["processed_datasets"] += 1
-                else:
-                    logging.warning(f"Could not calculate contamination for dataset {dataset.id}")
-                    PROCESS_STATUS["failed_datasets"] += 1
-                    PROCESS_STATUS["errors"].append(f"Dataset {dataset.id}: Could not calculate contamination")
-                
-            except Exception as e:
-                error_msg = f"Error processing dataset {dataset.id}: {str(e)}"
-                logging.error(error_msg)
-                PROCESS_STATUS["failed_datasets"] += 1
-                PROCESS_STATUS["errors"].append(error_msg)
-                db.rollback()
-                continue
-            
-            save_status()
-                
-    except Exception as e:
-        error_msg = f"Error in batch process: {str(e)}"
-        logging.error(error_msg)
-        PROCESS_STATUS["errors"].append(error_msg)
+        return get_job_counts(db, CONTAMINATION_JOB)
     finally:
-        PROCESS_STATUS["is_running"] = False
-        PROCESS_STATUS["end_time"] = datetime.now()
-        PROCESS_STATUS["current_dataset"] = None
-        save_status()
         db.close()
 
-def start_background_process():
-    """Start the contamination calculation process in the background."""
-    thread = threading.Thread(target=process_datasets)
-    thread.daemon = False  # Make it a non-daemon thread so it continues after main thread exits
-    thread.start()
-    return "Process started in background"
+def process_datasets(workers: int = 1, blas_threads: int = 1, exit_when_idle: bool = True, sample_size: int = None,
+                     commit_every: int = 1):
+    """Enqueue all datasets without contamination values and work the queue."""
+    db = next(get_write_db())
+    try:
+        pending = enqueue_pending_contamination(db)
+        logging.info(f"Found {pending} datasets to process")
+    finally:
+        db.close()
 
-def get_process_status():
-    """Get the current status of the contamination calculation process."""
-    return PROCESS_STATUS
+    run_workers(contamination_handlers(blas_threads, sample_size), processes=workers,
+                exit_when_idle=exit_when_idle, commit_every=commit_every)
+    return get_process_status()
 
 if __name__ == "__main__":
-    print("Starting contamination calculation process in background...")
-    start_background_process()
-    print("Process is running in the background. You can check the logs directory for progress.")
-    print("To check status, look for contamination_process_status.json in the logs directory.")
-    
-    # Keep the main thread alive briefly to show initial status
-    time.sleep(2)
-    if PROCESS_STATUS["total_datasets"] > 0:
-        processed = PROCESS_STATUS["processed_datasets"]
-        failed = PROCESS_STATUS["failed_datasets"]
-        total = PROCESS_STATUS["total_datasets"]
-        print(f"Found {total} datasets to process")
-        if processed + failed > 0:
-            progress = (processed + failed) / total * 100
-            print(f"Current progress: {progress:.1f}% ({processed + failed}/{total} datasets)")
-    
-    print("\nProcess will continue running in the background.")
-    # Don't exit, let the background thread complete
-    while PROCESS_STATUS["is_running"]:
-        time.sleep(1) 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Calculate contamination values through the jobs queue.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of worker processes consuming the queue")
+    parser.add_argument("--blas-threads", type=int, default=1,
+                        help="BLAS/OpenMP threads per worker process")
+    parser.add_argument("--sample-size", type=int,
+                        help="stream CSV datasets into a reservoir sample of this many rows")
+    parser.add_argument("--commit-every", type=int, default=20,
+                        help="results each worker commits together; a crash loses at most this many")
+    parser.add_argument("--dataset_id", type=int,
+                        help="only enqueue this dataset instead of every dataset without a value")
+    parser.add_argument("--enqueue-only", action="store_true",
+                        help="enqueue the jobs and exit without working them")
+    parser.add_argument("--forever", action="store_true",
+                        help="keep polling for new jobs instead of exiting when the queue is empty")
+    args = parser.parse_args()
+
+    if args.dataset_id is not None:
+        db = next(get_write_db())
+        try:
+            job = enqueue_contamination(db, args.dataset_id)
+            print(f"Dataset {args.dataset_id}: job {job.id} is {job.status}")
+        finally:
+            db.close()
+        if args.enqueue_only:
+            sys.exit(0)
+        run_workers(contamination_handlers(args.blas_threads, args.sample_size), processes=args.workers,
+                    exit_when_idle=not args.forever, commit_every=args.commit_every)
+    elif args.enqueue_only:
+        db = next(get_write_db())
+        try:
+            print(f"{enqueue_pending_contamination(db)} datasets queued for contamination calculation")
+        finally:
+            db.close()
+    else:
+        process_datasets(args.workers, args.blas_threads, exit_when_idle=not args.forever,
+                         sample_size=args.sample_size, commit_every=args.commit_every)
+
+    print(f"Contamination jobs per status: {get_process_status()}")
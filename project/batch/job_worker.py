@@ -0,0 +1,189 @@
+import sys
+import os
+
+# Add project root to Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+import logging
+import multiprocessing
+import socket
+import threading
+import time
+import traceback
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+from sqlalchemy.orm import Session
+from database.database import get_db, get_write_db, dispose_engines
+from database.job_queue import (
+    DEFAULT_LEASE_SECONDS,
+    lease_job,
+    heartbeat_job,
+    complete_jobs,
+    fail_job
+)
+from database.models import Job
+
+class JobHandler(NamedTuple):
+    """How to run one kind of job.
+
+    run computes a job's JSON-serializable result and must not write; apply stages
+    the writes of a result in the session, and may add to the result. Applied
+    writes are committed together with the completions of the worker's batch.
+    """
+    run: Callable[[Session, Job], dict]
+    apply: Optional[Callable[[Session, Job, dict], None]] = None
+
+class _Leases:
+    """Background heartbeats for every job a worker holds, until its batch is committed."""
+
+    def __init__(self, worker_id: str, lease_seconds: int):
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.job_ids = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="job-heartbeat", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+
+    def add(self, job_id: int):
+        with self._lock:
+            self.job_ids.add(job_id)
+
+    def discard(self, job_ids):
+        with self._lock:
+            self.job_ids.difference_update(job_ids)
+
+    def _loop(self):
+        db = next(get_write_db())
+        try:
+            while not self._stop.wait(self.lease_seconds / 3):
+                with self._lock:
+                    job_ids = list(self.job_ids)
+                for job_id in job_ids:
+                    if not heartbeat_job(db, job_id, self.worker_id, self.lease_seconds):
+                        logging.warning(f"Worker {self.worker_id} lost the lease of job {job_id}")
+                        self.discard([job_id])
+        finally:
+            db.close()
+
+def _fail(db: Session, job: Job, worker_id: str, error: Exception) -> str:
+    details = "".join(traceback.format_exception(error, limit=5))
+    status = fail_job(db, job.id, worker_id, f"{error}\n{details}")
+    logging.error(f"Job {job.id} ({job.kind}) failed on attempt {job.attempts}: {error} -> {status}")
+    return status or 'lost'
+
+def commit_batch(db: Session, batch: List[Tuple[Job, dict]], handlers: Dict[str, JobHandler], worker_id: str) -> int:
+    """Apply the results of a batch of jobs and commit them with the jobs' completions.
+
+    A result that fails to apply fails its job only. Returns the number of jobs completed.
+    """
+    results = {}
+    failed = []
+    for job, result in batch:
+        apply = handlers[job.kind].apply
+        try:
+            if apply is not None:
+                with db.begin_nested():
+                    apply(db, job, result)
+        except Exception as e:
+            failed.append((job, e))
+            continue
+        results[job.id] = result
+    completed = 0
+    if results:
+        if complete_jobs(db, worker_id, results):
+            completed = len(results)
+            for job_id, result in results.items():
+                logging.info(f"Job {job_id} succeeded: {result}")
+        else:
+            logging.warning(f"A lease of the batch {sorted(results)} was lost; results discarded")
+    for job, error in failed:
+        _fail(db, job, worker_id, error)
+    return completed
+
+def run_worker(
+    handlers: Dict[str, JobHandler],
+    worker_id: str = None,
+    lease_seconds: int = DEFAULT_LEASE_SECONDS,
+    poll_interval: float = 5.0,
+    exit_when_idle: bool = False,
+    commit_every: int = 1
+):
+    """Lease and run jobs of the handled kinds until the queue is empty (exit_when_idle) or forever.
+
+    Jobs are leased one at a time, so that workers share the queue evenly, and their
+    results are committed commit_every jobs at a time, or when the queue runs dry.
+    The leases of a batch are kept alive until it is committed; a crash loses at
+    most the batch, whose jobs run again once their leases expire.
+    """
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    db = next(get_db())
+    batch = []
+
+    def commit():
+        commit_batch(db, batch, handlers, worker_id)
+        leases.discard([job.id for job, _ in batch])
+        batch.clear()
+        db.expunge_all()
+
+    try:
+        with _Leases(worker_id, lease_seconds) as leases:
+            while True:
+                job = lease_job(db, worker_id, kinds=list(handlers), lease_seconds=lease_seconds)
+                if job is None:
+                    if batch:
+                        commit()
+                    if exit_when_idle:
+                        return
+                    time.sleep(poll_interval)
+                    continue
+                leases.add(job.id)
+                try:
+                    batch.append((job, handlers[job.kind].run(db, job)))
+                except Exception as e:
+                    _fail(db, job, worker_id, e)
+                    leases.discard([job.id])
+                db.rollback()  # End the read transaction of the run
+                if len(batch) >= commit_every:
+                    commit()
+    finally:
+        db.close()
+
+def _worker_process(handlers, lease_seconds, poll_interval, exit_when_idle, commit_every):
+    # Connections inherited from the parent must not be shared with it
+    dispose_engines(close=False)
+    run_worker(handlers, lease_seconds=lease_seconds, poll_interval=poll_interval,
+               exit_when_idle=exit_when_idle, commit_every=commit_every)
+
+def run_workers(
+    handlers: Dict[str, JobHandler],
+    processes: int = 1,
+    lease_seconds: int = DEFAULT_LEASE_SECONDS,
+    poll_interval: float = 5.0,
+    exit_when_idle: bool = False,
+    commit_every: int = 1
+):
+    """Run workers in `processes` separate processes and wait for them to exit."""
+    if processes <= 1:
+        run_worker(handlers, lease_seconds=lease_seconds, poll_interval=poll_interval,
+                   exit_when_idle=exit_when_idle, commit_every=commit_every)
+        return
+    workers = [
+        multiprocessing.Process(
+            target=_worker_process,
+            args=(handlers, lease_seconds, poll_interval, exit_when_idle, commit_every)
+        )
+        for _ in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
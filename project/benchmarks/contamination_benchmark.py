@@ -0,0 +1,219 @@
+"""Benchmark of the contamination search on synthetic datasets.
+
+Every case runs in a fresh process so that its peak RSS is measured in
+isolation. Results are written to a JSON file and compared with a stored
+baseline to catch performance regressions and drift of the chosen
+contamination:
+
+    python benchmarks/contamination_benchmark.py --suite quick
+    python benchmarks/contamination_benchmark.py --suite full --update-baseline
+"""
+import sys
+import os
+
+# Add project root to Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import platform
+import time
+import tracemalloc
+from datetime import datetime, UTC
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+try:
+    import psutil
+except ImportError:  # Optional, measures the peak working set on Windows
+    psutil = None
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, "contamination_baseline.json")
+DEFAULT_OUTPUT = os.path.join(BENCHMARK_DIR, "results", "contamination_results.json")
+
+METHODS = ["elbow", "silhouette", "find_contamination"]
+
+SUITES = {
+    "quick": {"rows": [1_000, 10_000], "columns": [5, 50], "outlier_ratios": [0.05]},
+    "full": {"rows": [1_000, 10_000, 100_000, 1_000_000], "columns": [5, 50, 500], "outlier_ratios": [0.01, 0.05, 0.15]},
+}
+
+def make_dataset(rows: int, columns: int, outlier_ratio: float, seed: int = 0) -> pd.DataFrame:
+    """Gaussian inliers around a few cluster centers plus uniformly scattered outliers."""
+    rng = np.random.default_rng(seed)
+    n_outliers = int(round(rows * outlier_ratio))
+    n_inliers = rows - n_outliers
+    centers = rng.normal(scale=3.0, size=(3, columns))
+    inliers = centers[rng.integers(0, len(centers), n_inliers)] + rng.normal(size=(n_inliers, columns))
+    outliers = rng.uniform(-10.0, 10.0, size=(n_outliers, columns))
+    values = np.vstack([inliers, outliers])
+    rng.shuffle(values)
+    return pd.DataFrame(values, columns=[f"f{i}" for i in range(columns)])
+
+def memory_measure() -> str:
+    """How peak memory is measured on this platform."""
+    if resource is not None:
+        return "rusage"
+    return "psutil" if psutil is not None else "tracemalloc"
+
+def peak_memory_mb() -> float:
+    """Peak memory of this process so far, in MB (traced allocations only without rusage or psutil)."""
+    if resource is not None:
+        # ru_maxrss is in KiB on Linux and in bytes on macOS
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 ** 2 if sys.platform == "darwin" else 1024)
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / 1024 ** 2
+    return tracemalloc.get_traced_memory()[1] / 1024 ** 2
+
+def case_id(method: str, rows: int, columns: int, outlier_ratio: float) -> str:
+    return f"{method}-r{rows}-c{columns}-o{outlier_ratio}"
+
+def _run_case(method, rows, columns, outlier_ratio, queue):
+    # Imported in the child so that the parent's memory does not count towards the peak
+    from Datasetfilter.determine_accuracy import DetermineDatasetAccuracy
+
+    if memory_measure() == "tracemalloc":
+        tracemalloc.start()
+    data = make_dataset(rows, columns, outlier_ratio)
+    rss_before = peak_memory_mb()
+    start = time.perf_counter()
+    accuracy = DetermineDatasetAccuracy.from_dataframe(data, dataset_name="benchmark")
+    del data
+    if method == "elbow":
+        contamination = accuracy.find_contamination_elbow()
+    elif method == "silhouette":
+        contamination = accuracy.find_optimal_contamination_silhouette()
+    else:
+        contamination = accuracy.find_contamination()
+    wall_time = time.perf_counter() - start
+    rss_peak = peak_memory_mb()
+    queue.put({
+        "wall_time_s": wall_time,
+        "peak_rss_mb": rss_peak,
+        "peak_rss_increase_mb": rss_peak - rss_before,
+        "memory_measure": memory_measure(),
+        "contamination": float(contamination),
+        "silhouette_estimator": (accuracy.silhouette_result or {}).get("estimator"),
+    })
+
+def run_case(method: str, rows: int, columns: int, outlier_ratio: float, timeout: float) -> dict:
+    """Run one case in a fresh process and collect its measurements."""
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_run_case, args=(method, rows, columns, outlier_ratio, queue))
+    process.start()
+    process.join(timeout)
+    if process.is_alive():
+        process.kill()
+        process.join()
+        return {"error": f"timed out after {timeout}s"}
+    if queue.empty():
+        return {"error": f"exited with code {process.exitcode}"}
+    return queue.get()
+
+def run_suite(suite: dict, methods, max_cells: int, timeout: float) -> dict:
+    results = {}
+    for rows, columns, outlier_ratio in itertools.product(suite["rows"], suite["columns"], suite["outlier_ratios"]):
+        if rows * columns > max_cells:
+            continue
+        for method in methods:
+            key = case_id(method, rows, columns, outlier_ratio)
+            result = run_case(method, rows, columns, outlier_ratio, timeout)
+            result.update({"method": method, "rows": rows, "columns": columns, "outlier_ratio": outlier_ratio})
+            if "contamination" in result:
+                result["contamination_error"] = abs(result["contamination"] - outlier_ratio)
+            results[key] = result
+            summary = result.get("error") or (
+                f"{result['wall_time_s']:.2f}s, peak {result['peak_rss_mb']:.0f} MB, "
+                f"contamination {result['contamination']:.4f}"
+            )
+            print(f"{key}: {summary}", flush=True)
+    return results
+
+def compare(results: dict, baseline: dict, time_tolerance: float, min_time_delta: float, contamination_tolerance: float):
+    """List regressions of results against the baseline cases."""
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None or "error" in base:
+            continue
+        if "error" in result:
+            regressions.append(f"{key}: {result['error']}")
+            continue
+        slower = result["wall_time_s"] - base["wall_time_s"]
+        if slower > min_time_delta and result["wall_time_s"] > base["wall_time_s"] * (1 + time_tolerance):
+            regressions.append(f"{key}: wall time {base['wall_time_s']:.2f}s -> {result['wall_time_s']:.2f}s")
+        same_measure = result.get("memory_measure", "rusage") == base.get("memory_measure", "rusage")
+        if same_measure and result["peak_rss_increase_mb"] > base["peak_rss_increase_mb"] * (1 + time_tolerance) + 50:
+            regressions.append(
+                f"{key}: peak RSS increase {base['peak_rss_increase_mb']:.0f} MB -> {result['peak_rss_increase_mb']:.0f} MB")
+        if abs(result["contamination"] - base["contamination"]) > contamination_tolerance:
+            regressions.append(f"{key}: contamination {base['contamination']:.4f} -> {result['contamination']:.4f}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the contamination search on synthetic data.")
+    parser.add_argument("--suite", choices=sorted(SUITES), default="quick")
+    parser.add_argument("--methods", nargs="+", choices=METHODS, default=METHODS)
+    parser.add_argument("--max-cells", type=int, default=100_000_000,
+                        help="skip shapes with more rows x columns than this")
+    parser.add_argument("--timeout", type=float, default=3600, help="seconds allowed per case")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--time-tolerance", type=float, default=0.25, help="allowed relative slowdown")
+    parser.add_argument("--min-time-delta", type=float, default=0.5, help="slowdowns below this many seconds are noise")
+    parser.add_argument("--contamination-tolerance", type=float, default=0.01)
+    args = parser.parse_args()
+
+    results = run_suite(SUITES[args.suite], args.methods, args.max_cells, args.timeout)
+    report = {
+        "created_at": datetime.now(UTC).isoformat(),
+        "suite": args.suite,
+        "host": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "cases": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=4)
+    print(f"Results written to {args.output}")
+
+    if args.update_baseline:
+        baseline = {"cases": {}}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline["cases"].update(results)
+        baseline.update({"created_at": report["created_at"], "host": report["host"]})
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=4)
+        print(f"Baseline updated in {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline found; run with --update-baseline to create one.")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(
+        results, baseline["cases"], args.time_tolerance, args.min_time_delta, args.contamination_tolerance)
+    if regressions:
+        print("Regressions against the baseline:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print("No regressions against the baseline.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,435 @@
+"""Content-addressed store for uploaded files.
+
+Files are stored once per sha256 digest, either on local disk or in an
+S3-compatible bucket (a local MinIO works as well), and rows only keep the
+digest and size. The blobs table counts the rows referencing each digest;
+releasing the last reference lets collect_garbage delete the file.
+
+Configuration (environment variables):
+    NSQAS_BLOB_BACKEND       "local" (default) or "s3"
+    NSQAS_BLOB_DIR           root directory of the local backend
+    NSQAS_S3_BUCKET          bucket of the s3 backend
+    NSQAS_S3_PREFIX          key prefix inside the bucket (default "blobs/")
+    NSQAS_S3_ENDPOINT_URL    endpoint of an S3-compatible server, e.g. http://localhost:9000
+"""
+import hashlib
+import io
+import os
+import re
+import shutil
+import tempfile
+import threading
+from contextlib import closing
+from datetime import datetime, timedelta, UTC
+from io import BytesIO
+from typing import BinaryIO, Iterator, NamedTuple, Optional, Tuple, Union
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from . import models
+
+try:
+    import boto3
+except ImportError:  # Only needed by the s3 backend
+    boto3 = None
+
+CHUNK_SIZE = 1024 * 1024
+# Unreferenced blobs are kept this long so that a concurrent upload of the same
+# content can claim them again before the file is deleted
+GC_GRACE_SECONDS = 3600
+DIGEST_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+class StoredBlob(NamedTuple):
+    """Content already written to the store, not referenced by any row yet."""
+    digest: str
+    size: int
+
+class BlobWriter:
+    """Incremental writer hashing the content as it is written.
+
+    Use as a context manager and call commit() to store the content; leaving
+    the block without committing discards it. Writers are writable file
+    objects, so serializers such as pyarrow can write into them directly.
+    """
+
+    def __init__(self):
+        self._sha = hashlib.sha256()
+        self.size = 0
+        self.result = None
+
+    @property
+    def closed(self) -> bool:
+        return self.result is not None
+
+    def writable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.size
+
+    def flush(self):
+        pass
+
+    def write(self, chunk: bytes) -> int:
+        self._sha.update(chunk)
+        self.size += len(chunk)
+        self._write(chunk)
+        return len(chunk)
+
+    def commit(self) -> StoredBlob:
+        self.result = StoredBlob(self._sha.hexdigest(), self.size)
+        self._commit(self.result.digest)
+        return self.result
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._close()
+
+class _LocalBlobWriter(BlobWriter):
+    def __init__(self, store: "LocalBlobStore"):
+        super().__init__()
+        self.store = store
+        os.makedirs(store.root, exist_ok=True)
+        fd, self.tmp_path = tempfile.mkstemp(prefix=".upload-", dir=store.root)
+        self._file = os.fdopen(fd, "wb")
+
+    def _write(self, chunk: bytes):
+        self._file.write(chunk)
+
+    def _commit(self, digest: str):
+        self._file.close()
+        os.makedirs(os.path.dirname(self.store.path(digest)), exist_ok=True)
+        # Identical content is stored once; replacing is atomic either way
+        os.replace(self.tmp_path, self.store.path(digest))
+
+    def _close(self):
+        self._file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+class _S3BlobWriter(BlobWriter):
+    # The key depends on the content, so the content is spooled to a temporary
+    # file while hashing and only uploaded if the object does not exist yet
+    def __init__(self, store: "S3BlobStore"):
+        super().__init__()
+        self.store = store
+        self._spool = tempfile.TemporaryFile()
+
+    def _write(self, chunk: bytes):
+        self._spool.write(chunk)
+
+    def _commit(self, digest: str):
+        if not self.store.exists(digest):
+            self._spool.seek(0)
+            self.store.client.upload_fileobj(self._spool, self.store.bucket, self.store.key(digest))
+
+    def _close(self):
+        self._spool.close()
+
+class _RangedBlobReader(io.RawIOBase):
+    """Seekable reader fetching only the byte ranges that are read."""
+
+    def __init__(self, store: "S3BlobStore", digest: str):
+        self.store = store
+        self.digest = digest
+        self.size = store.size(digest)
+        self.position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.position, io.SEEK_END: self.size}[whence]
+        self.position = max(base + offset, 0)
+        return self.position
+
+    def readinto(self, buffer) -> int:
+        end = min(self.position + len(buffer), self.size)
+        if end <= self.position:
+            return 0
+        with closing(self.store.open_range(self.digest, self.position, end)) as f:
+            data = f.read()
+        buffer[:len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+class LocalBlobStore:
+    """Blobs as files under root/ab/cd/<digest>."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def exists(self, digest: str) -> bool:
+        return os.path.exists(self.path(digest))
+
+    def writer(self) -> BlobWriter:
+        return _LocalBlobWriter(self)
+
+    def open(self, digest: str) -> BinaryIO:
+        return open(self.path(digest), "rb")
+
+    def open_range(self, digest: str, start: int, end: int) -> BinaryIO:
+        f = open(self.path(digest), "rb")
+        f.seek(start)
+        return f
+
+    def delete(self, digest: str):
+        try:
+            os.remove(self.path(digest))
+        except FileNotFoundError:
+            pass
+
+    def list(self) -> Iterator[Tuple[str, int, datetime]]:
+        """(digest, size, modified) of every stored blob."""
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                if DIGEST_PATTERN.fullmatch(name):
+                    stat = os.stat(os.path.join(directory, name))
+                    yield name, stat.st_size, datetime.fromtimestamp(stat.st_mtime, UTC)
+
+class S3BlobStore:
+    """Blobs as objects <prefix><digest> in an S3-compatible bucket."""
+
+    def __init__(self, bucket: str, prefix: str = "blobs/", endpoint_url: Optional[str] = None):
+        if boto3 is None:
+            raise ImportError("The s3 blob backend requires boto3 (pip install boto3)")
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = boto3.client("s3", endpoint_url=endpoint_url)
+
+    def key(self, digest: str) -> str:
+        return f"{self.prefix}{digest}"
+
+    def exists(self, digest: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.key(digest))
+            return True
+        except self.client.exceptions.ClientError:
+            return False
+
+    def size(self, digest: str) -> int:
+        return self.client.head_object(Bucket=self.bucket, Key=self.key(digest))["ContentLength"]
+
+    def writer(self) -> BlobWriter:
+        return _S3BlobWriter(self)
+
+    def open(self, digest: str) -> BinaryIO:
+        return self.client.get_object(Bucket=self.bucket, Key=self.key(digest))["Body"]
+
+    def open_range(self, digest: str, start: int, end: int) -> BinaryIO:
+        return self.client.get_object(
+            Bucket=self.bucket, Key=self.key(digest), Range=f"bytes={start}-{end - 1}")["Body"]
+
+    def delete(self, digest: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self.key(digest))
+
+    def list(self) -> Iterator[Tuple[str, int, datetime]]:
+        """(digest, size, modified) of every stored blob."""
+        for page in self.client.get_paginator("list_objects_v2").paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for item in page.get("Contents", []):
+                digest = item["Key"][len(self.prefix):]
+                if DIGEST_PATTERN.fullmatch(digest):
+                    yield digest, item["Size"], item["LastModified"]
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_blob_store():
+    """Get the configured blob store."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            if os.environ.get("NSQAS_BLOB_BACKEND", "local") == "s3":
+                _store = S3BlobStore(
+                    os.environ["NSQAS_S3_BUCKET"],
+                    os.environ.get("NSQAS_S3_PREFIX", "blobs/"),
+                    os.environ.get("NSQAS_S3_ENDPOINT_URL")
+                )
+            else:
+                _store = LocalBlobStore(os.environ.get(
+                    "NSQAS_BLOB_DIR",
+                    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "blobs")
+                ))
+        return _store
+
+def open_blob(digest: str) -> BinaryIO:
+    """Open a stored blob for streaming reads."""
+    return get_blob_store().open(digest)
+
+def blob_random_access(digest: str) -> Union[str, BinaryIO]:
+    """A seekable source for readers that jump around a file, such as Parquet readers.
+
+    Local blobs are returned as their path so they can be memory-mapped; remote
+    blobs are downloaded into memory.
+    """
+    store = get_blob_store()
+    if isinstance(store, LocalBlobStore):
+        return store.path(digest)
+    return BytesIO(read_blob(digest))
+
+def blob_ranged_access(digest: str) -> Union[str, BinaryIO]:
+    """A seekable source that only fetches the parts actually read, e.g. a Parquet footer and a few row groups.
+
+    Local blobs are returned as their path; remote blobs are read with ranged
+    requests instead of being downloaded whole.
+    """
+    store = get_blob_store()
+    if isinstance(store, LocalBlobStore):
+        return store.path(digest)
+    return io.BufferedReader(_RangedBlobReader(store, digest), buffer_size=CHUNK_SIZE)
+
+def iter_blob(digest: str, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Yield a stored blob in chunks."""
+    with closing(open_blob(digest)) as f:
+        yield from iter(lambda: f.read(chunk_size), b"")
+
+def iter_blob_range(digest: str, start: int, end: int, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Yield bytes start to end (exclusive) of a stored blob in chunks."""
+    remaining = end - start
+    if remaining <= 0:
+        return
+    with closing(get_blob_store().open_range(digest, start, end)) as f:
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                return
+            remaining -= len(chunk)
+            yield chunk
+
+def read_blob(digest: str) -> bytes:
+    """Read a whole stored blob into memory."""
+    with closing(open_blob(digest)) as f:
+        return f.read()
+
+def write_blob(source: BinaryIO) -> StoredBlob:
+    """Stream a file into the store without referencing it."""
+    with get_blob_store().writer() as writer:
+        for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+            writer.write(chunk)
+        return writer.commit()
+
+def register_blob(db: Session, blob: StoredBlob):
+    """Track content written without a reference yet, so collect_garbage removes it if it is never claimed."""
+    if db.get(models.Blob, blob.digest) is None:
+        try:
+            with db.begin_nested():
+                db.add(models.Blob(digest=blob.digest, size=blob.size, ref_count=0, released_at=datetime.now(UTC)))
+        except IntegrityError:
+            pass
+
+def store_blob(db: Session, data: Union[bytes, BinaryIO, StoredBlob]) -> Tuple[str, int]:
+    """Write content to the store, unless it is a StoredBlob already, and add a reference to it.
+
+    The caller commits. Returns the (digest, size) to keep on the referencing row.
+    """
+    if isinstance(data, (bytes, bytearray)):
+        data = BytesIO(data)
+    if isinstance(data, StoredBlob):
+        digest, size = data
+    else:
+        start = data.tell() if getattr(data, "seekable", None) and data.seekable() else None
+        digest, size = write_blob(data)
+    claimed = db.execute(
+        update(models.Blob)
+        .execution_options(synchronize_session=False)
+        .where(models.Blob.digest == digest)
+        .values(ref_count=models.Blob.ref_count + 1, released_at=None)
+    ).rowcount
+    if not claimed:
+        try:
+            with db.begin_nested():
+                db.add(models.Blob(digest=digest, size=size, ref_count=1))
+        except IntegrityError:
+            # Another session registered the same content first
+            db.execute(
+                update(models.Blob)
+                .execution_options(synchronize_session=False)
+                .where(models.Blob.digest == digest)
+                .values(ref_count=models.Blob.ref_count + 1, released_at=None)
+            )
+    if not get_blob_store().exists(digest):
+        # collect_garbage deleted the file between the write and the claim. The claim
+        # locks the row until the caller commits, so writing it again is safe.
+        if isinstance(data, StoredBlob) or start is None:
+            raise FileNotFoundError(f"Blob {digest} was deleted before it was referenced")
+        data.seek(start)
+        write_blob(data)
+    return digest, size
+
+def release_blob(db: Session, digest: Optional[str]):
+    """Drop a reference to a blob. The caller commits; collect_garbage deletes unreferenced files."""
+    if digest is None:
+        return
+    db.execute(
+        update(models.Blob)
+        .execution_options(synchronize_session=False)
+        .where(models.Blob.digest == digest, models.Blob.ref_count > 0)
+        .values(ref_count=models.Blob.ref_count - 1)
+    )
+    db.execute(
+        update(models.Blob)
+        .execution_options(synchronize_session=False)
+        .where(models.Blob.digest == digest, models.Blob.ref_count == 0)
+        .values(released_at=datetime.now(UTC))
+    )
+
+def collect_garbage(db: Session, grace_seconds: int = GC_GRACE_SECONDS) -> int:
+    """Delete blobs that have been unreferenced for longer than grace_seconds.
+
+    The file is deleted before the row deletion commits: until then the row stays
+    locked, so a concurrent store_blob of the same content waits for the commit,
+    then claims a new row and writes the file again.
+    """
+    cutoff = datetime.now(UTC) - timedelta(seconds=grace_seconds)
+    digests = [row[0] for row in db.query(models.Blob.digest).filter(
+        models.Blob.ref_count == 0,
+        models.Blob.released_at <= cutoff
+    ).all()]
+    deleted = 0
+    for digest in digests:
+        try:
+            # Skip blobs that were referenced again in the meantime
+            removed = db.query(models.Blob).filter(
+                models.Blob.digest == digest,
+                models.Blob.ref_count == 0
+            ).delete(synchronize_session=False)
+            if removed:
+                get_blob_store().delete(digest)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        deleted += removed
+    return deleted
+
+def track_orphaned_blobs(db: Session, grace_seconds: int = GC_GRACE_SECONDS) -> int:
+    """Register stored files without a row, so that collect_garbage deletes them later.
+
+    Such files are left behind when the transaction that should have referenced
+    them fails after write_blob. Files younger than grace_seconds may still be
+    claimed by an upload in progress and are left alone.
+    """
+    cutoff = datetime.now(UTC) - timedelta(seconds=grace_seconds)
+    tracked = 0
+    for digest, size, modified in get_blob_store().list():
+        if modified <= cutoff and db.get(models.Blob, digest) is None:
+            register_blob(db, StoredBlob(digest, size))
+            db.commit()
+            tracked += 1
+    return tracked
+
+def copy_blob_to(digest: str, destination: BinaryIO):
+    """Stream a stored blob into a writable file object."""
+    with closing(open_blob(digest)) as f:
+        shutil.copyfileobj(f, destination, CHUNK_SIZE)
@@ -0,0 +1,124 @@
+"""Parquet copies of uploaded tables.
+
+Every dataset and training data upload gets a zstd-compressed Parquet copy
+with the dtypes inferred at upload. Analytics readers load only the columns
+they need and skip row groups with predicate pushdown; the original CSV or
+Excel file is only served for downloads.
+"""
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from io import BytesIO
+from typing import BinaryIO, Iterator, List, Optional, Tuple, Union
+
+PARQUET_COMPRESSION = "zstd"
+# Row groups are the unit of predicate pushdown and of streaming reads
+PARQUET_ROW_GROUP_ROWS = 64_000
+# Row groups a preview sample is drawn from, so that its cost does not grow with the file
+PREVIEW_SAMPLE_ROW_GROUPS = 4
+
+# Filters in the pyarrow DNF format, e.g. [("age", ">", 30), ("country", "in", ["FR", "DE"])]
+Filters = Optional[List]
+
+def parse_table(file_name: str, source: Union[bytes, BinaryIO]) -> pd.DataFrame:
+    """Parse an uploaded CSV or Excel file."""
+    if isinstance(source, (bytes, bytearray)):
+        source = BytesIO(source)
+    if file_name.lower().endswith('.csv'):
+        return pd.read_csv(source)
+    return pd.read_excel(source, sheet_name=0)
+
+def to_arrow(df: pd.DataFrame) -> pa.Table:
+    """Convert a DataFrame to Arrow, storing mixed-type object columns as strings."""
+    df = df.rename(columns=str)
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        mixed = df.select_dtypes(include=["object"]).columns
+        df = df.astype({column: "string" for column in mixed})
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+def dataframe_to_parquet(df: pd.DataFrame) -> bytes:
+    """Serialize a DataFrame to compressed Parquet with column statistics."""
+    buffer = BytesIO()
+    pq.write_table(
+        to_arrow(df),
+        buffer,
+        compression=PARQUET_COMPRESSION,
+        row_group_size=PARQUET_ROW_GROUP_ROWS,
+        write_statistics=True
+    )
+    return buffer.getvalue()
+
+def numeric_columns(source: Union[str, BinaryIO]) -> List[str]:
+    """Names of the numeric columns, read from the Parquet footer only."""
+    schema = pq.read_schema(source)
+    return [
+        field.name for field in schema
+        if pa.types.is_integer(field.type) or pa.types.is_floating(field.type) or pa.types.is_decimal(field.type)
+    ]
+
+def read_parquet(source: Union[str, BinaryIO], columns: Optional[List[str]] = None, filters: Filters = None) -> pd.DataFrame:
+    """Read a Parquet copy, loading only `columns` and the row groups that can match `filters`."""
+    return pq.read_table(source, columns=columns, filters=filters).to_pandas()
+
+def iter_parquet_batches(
+    source: Union[str, BinaryIO],
+    batch_size: int,
+    columns: Optional[List[str]] = None
+) -> Iterator[pd.DataFrame]:
+    """Yield a Parquet copy in DataFrames of at most batch_size rows."""
+    parquet_file = pq.ParquetFile(source)
+    for batch in parquet_file.iter_batches(batch_size=batch_size, columns=columns):
+        yield batch.to_pandas()
+
+def filter_frame(df: pd.DataFrame, columns: Optional[List[str]] = None, filters: Filters = None) -> pd.DataFrame:
+    """Apply the same projection and filters to an already parsed DataFrame."""
+    if filters:
+        table = to_arrow(df).filter(pq.filters_to_expression(filters))
+        df = table.to_pandas()
+    if columns is not None:
+        df = df[columns]
+    return df
+
+def read_preview(
+    source: Union[str, BinaryIO],
+    head_rows: int,
+    sample_rows: int,
+    seed: int = 0
+) -> Tuple[pd.DataFrame, pd.DataFrame, int]:
+    """The first rows, a random sample of rows and the row count of a Parquet copy.
+
+    Only the footer, the first row group and up to PREVIEW_SAMPLE_ROW_GROUPS
+    other row groups are read. Row groups are drawn in proportion to their
+    size and rows uniformly within them, so the sample is spread over the
+    file without reading all of it.
+    """
+    parquet_file = pq.ParquetFile(source)
+    metadata = parquet_file.metadata
+    total_rows = metadata.num_rows
+    empty = parquet_file.schema_arrow.empty_table().to_pandas()
+
+    head = empty
+    if head_rows > 0 and metadata.num_row_groups:
+        first_batch = next(parquet_file.iter_batches(batch_size=head_rows, row_groups=[0]), None)
+        if first_batch is not None:
+            head = first_batch.to_pandas()
+
+    sample = empty
+    if sample_rows > 0 and total_rows > 0:
+        rng = np.random.default_rng(seed)
+        sizes = np.array([metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)])
+        groups = np.sort(rng.choice(
+            len(sizes), size=min(PREVIEW_SAMPLE_ROW_GROUPS, int((sizes > 0).sum())), replace=False, p=sizes / total_rows))
+        counts = rng.multinomial(min(sample_rows, int(sizes[groups].sum())), sizes[groups] / sizes[groups].sum())
+        parts = []
+        for group, count in zip(groups, counts):
+            count = min(int(count), int(sizes[group]))
+            if count:
+                rows = np.sort(rng.choice(sizes[group], size=count, replace=False))
+                parts.append(parquet_file.read_row_group(int(group)).take(rows))
+        if parts:
+            sample = pa.concat_tables(parts).to_pandas()
+    return head, sample, total_rows
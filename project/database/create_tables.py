@@ -1,15 +1,17 @@
 from project.database.database import Base, engine
 from project.database.models import User, AIModels, Dataset, Subscription
+from project.database.migrations import migrate
 
 __all__ = ['User', 'AIModels', 'Dataset', 'Subscription']
 
 def create_tables():
-    """Create all database tables."""
+    """Create all database tables and apply pending schema migrations."""
     try:
         Base.metadata.create_all(bind=engine)
+        migrate(engine)
         print("Database tables created successfully!")
     except Exception as e:
         print(f"Error creating database tables: {e}")
 
 if __name__ == "__main__":
-    create_tables() 
\ No newline at end of file
+    create_tables()
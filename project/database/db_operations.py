@@ -1,7 +1,19 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import or_, and_, func, update, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, load_only
+from cachetools import LRUCache, TTLCache
 from . import models
+from .blob_store import (
+    StoredBlob, open_blob, blob_random_access, blob_ranged_access, store_blob, release_blob, collect_garbage
+)
+from .columnar import Filters, parse_table, read_parquet, read_preview, numeric_columns, filter_frame
+from io import BytesIO
+import os
+import threading
+import pandas as pd
+from contextlib import closing
 from datetime import datetime, UTC
-from typing import Optional, BinaryIO, List
+from typing import Optional, BinaryIO, Callable, List, Dict, NamedTuple, Tuple, Iterable, Iterator, Union
 
 def create_user(
     db: Session,
@@ -25,34 +37,74 @@ def create_user(
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    invalidate_user_cache(email)
     return db_user
 
+def upsert_user(
+    db: Session,
+    username: str,
+    email: str,
+    password_hash: str,
+    first_name: Optional[str] = None,
+    last_name: Optional[str] = None
+) -> "CachedUser":
+    """Record a login: create the user if needed, else update last_login."""
+    user = get_user_by_email(db, email)
+    if user is None:
+        try:
+            return cached_user(create_user(db, username, email, password_hash, first_name, last_name))
+        except IntegrityError:
+            # Created concurrently by another session of the same user
+            db.rollback()
+            user = get_user_by_email(db, email)
+            if user is None:
+                raise
+    user.last_login = datetime.now(UTC)
+    cached = cached_user(user)
+    db.commit()
+    with _user_cache_lock:
+        _user_cache[email] = cached
+    return cached
+
 def create_ai_model(
     db: Session,
     name: str,
     owner_id: int,
     version: str,
     description: str,
-    model_data: bytes,
+    model_data: Union[bytes, BinaryIO, StoredBlob],
     model_name: str,
     model_size: int,
     is_public: bool = False,
-    training_data_set: Optional[bytes] = None,
+    training_data_set: Optional[Union[bytes, BinaryIO, StoredBlob]] = None,
     training_data_set_metadata: Optional[dict] = None,
-    target_field: Optional[str] = None
+    target_field: Optional[str] = None,
+    training_parquet: Optional[Union[bytes, StoredBlob]] = None
 ) -> models.AIModels:
-    """Create a new AI model in the database."""
+    """Create a new AI model in the database, storing its files in the blob store.
+
+    training_parquet is the Parquet copy of the training data read by analytics.
+    """
+    model_digest, model_size = store_blob(db, model_data)
+    training_data_digest, training_data_size = (
+        store_blob(db, training_data_set) if training_data_set is not None else (None, None)
+    )
+    training_parquet_digest = store_blob(db, training_parquet)[0] if training_parquet is not None else None
     db_model = models.AIModels(
         name=name,
         owner_id=owner_id,
         version=version,
         description=description,
-        model_data=model_data,
+        model_data=b"",
+        model_digest=model_digest,
         model_name=model_name,
         model_size=model_size,
         is_public=is_public,
         upload_date=datetime.now(UTC),
-        training_data_set=training_data_set,
+        training_data_set=b"",
+        training_data_digest=training_data_digest,
+        training_data_size=training_data_size,
+        training_parquet_digest=training_parquet_digest,
         training_data_set_metadata=training_data_set_metadata,
         target_field=target_field
     )
@@ -67,28 +119,40 @@ def create_dataset(
     owner_id: int,
     version: str,
     description: str,
-    file_data: bytes,
+    file_data: Union[bytes, BinaryIO, StoredBlob],
     file_name: str,
     file_type: Optional[str],
     file_size: int,
     is_public: bool = False,
-    dataset_metadata: Optional[dict] = None
+    dataset_metadata: Optional[dict] = None,
+    parquet_data: Optional[Union[bytes, StoredBlob]] = None
 ) -> models.Dataset:
-    """Create a new dataset in the database."""
+    """Create a new dataset in the database, storing its file in the blob store.
+
+    parquet_data is the Parquet copy read by analytics; the original file is kept for downloads.
+    Files already written by ingest_table are passed as StoredBlob and only referenced.
+    """
+    digest, file_size = store_blob(db, file_data)
+    parquet_digest = store_blob(db, parquet_data)[0] if parquet_data is not None else None
     db_dataset = models.Dataset(
         name=name,
         owner_id=owner_id,
         version=version,
         description=description,
-        file_data=file_data,
+        file_data=b"",
+        file_digest=digest,
+        parquet_digest=parquet_digest,
         file_name=file_name,
         file_type=file_type,
         file_size=file_size,
         is_public=is_public,
         upload_date=datetime.now(UTC),
-        dataset_metadata=dataset_metadata
+        dataset_metadata=dataset_metadata,
+        content_hash=digest
     )
     db.add(db_dataset)
+    db.flush()  # Assigns the id needed by the column index
+    reuse_content_results(db, db_dataset, column_types_from_metadata(dataset_metadata))
     db.commit()
     db.refresh(db_dataset)
     return db_dataset
@@ -112,6 +176,90 @@ def create_subscription(
     db.refresh(db_subscription)
     return db_subscription
 
+def column_types_from_metadata(dataset_metadata: Optional[dict]) -> Dict[str, Optional[str]]:
+    """Extract a column -> dtype mapping from upload metadata."""
+    if not dataset_metadata:
+        return {}
+    column_types = dataset_metadata.get('column_types') or {}
+    return {
+        str(column): column_types.get(column)
+        for column in dataset_metadata.get('columns', column_types.keys())
+    }
+
+def index_dataset_columns(
+    db: Session,
+    dataset_id: int,
+    column_types: Dict[str, Optional[str]]
+) -> None:
+    """Replace the column index entries of a dataset. The caller commits."""
+    db.query(models.DatasetColumn).filter(
+        models.DatasetColumn.dataset_id == dataset_id
+    ).delete(synchronize_session=False)
+    db.add_all([
+        models.DatasetColumn(dataset_id=dataset_id, feature_name=feature_name, dtype=dtype)
+        for feature_name, dtype in column_types.items()
+    ])
+
+def reuse_content_results(
+    db: Session,
+    dataset: models.Dataset,
+    column_types: Dict[str, Optional[str]]
+) -> None:
+    """Give a dataset the contamination and column index already computed for the same content.
+
+    Falls back to indexing `column_types` when no other dataset has this content. The caller commits.
+    """
+    memo = get_contamination_result(db, dataset.content_hash) if dataset.content_hash else None
+    if memo is not None:
+        dataset.contamination = memo.contamination
+        dataset.contamination_hash = dataset.content_hash
+    source_id = db.query(models.DatasetColumn.dataset_id).join(
+        models.Dataset, models.Dataset.id == models.DatasetColumn.dataset_id
+    ).filter(
+        models.Dataset.content_hash == dataset.content_hash,
+        models.Dataset.id != dataset.id
+    ).limit(1).scalar() if dataset.content_hash else None
+    if source_id is not None:
+        column_types = dict(db.query(models.DatasetColumn.feature_name, models.DatasetColumn.dtype).filter(
+            models.DatasetColumn.dataset_id == source_id
+        ).all())
+    index_dataset_columns(db, dataset.id, column_types)
+
+def iter_dataset_columns(db: Session, batch_size: int = 10000) -> Iterator[Tuple[int, str]]:
+    """Stream all (dataset_id, feature_name) pairs of the column index."""
+    query = db.query(
+        models.DatasetColumn.dataset_id,
+        models.DatasetColumn.feature_name
+    ).order_by(models.DatasetColumn.dataset_id)
+    for dataset_id, feature_name in query.yield_per(batch_size):
+        yield dataset_id, feature_name
+
+def get_dataset_columns_signature(db: Session) -> Tuple[int, Optional[int], Optional[datetime]]:
+    """Get a cheap (row count, max id, latest insert) signature that changes whenever the column index changes.
+
+    The ids alone do not do: SQLite reuses the rowids of deleted rows, so re-indexing
+    a dataset with as many columns as before keeps both the count and the max id.
+    """
+    return tuple(db.query(
+        func.count(models.DatasetColumn.id),
+        func.max(models.DatasetColumn.id),
+        func.max(models.DatasetColumn.created_at)
+    ).one())
+
+def get_visible_dataset_ids(db: Session, owner_id: Optional[int] = None) -> List[int]:
+    """Get the ids of public datasets and, if owner_id is given, the owner's private datasets."""
+    visibility = models.Dataset.is_public.is_(True)
+    if owner_id is not None:
+        visibility = or_(visibility, models.Dataset.owner_id == owner_id)
+    return [dataset_id for (dataset_id,) in db.query(models.Dataset.id).filter(visibility).all()]
+
+def get_unindexed_dataset_ids(db: Session) -> List[int]:
+    """Get the ids of datasets that have no column index entries yet."""
+    indexed = db.query(models.DatasetColumn.dataset_id).filter(
+        models.DatasetColumn.dataset_id == models.Dataset.id
+    ).exists()
+    return [dataset_id for (dataset_id,) in db.query(models.Dataset.id).filter(~indexed).all()]
+
 def save_file_data(file: BinaryIO) -> tuple[bytes, int]:
     """Helper function to read file data and get size."""
     file_data = file.read()
@@ -119,9 +267,194 @@ def save_file_data(file: BinaryIO) -> tuple[bytes, int]:
     return file_data, file_size
 
 # Get functions for each table
-def get_all_users(db: Session, skip: int = 0, limit: int = 100) -> List[models.User]:
+def _file_opener(digest: Optional[str], row, legacy_attribute: str) -> Callable[[], BinaryIO]:
+    if digest is not None:
+        return lambda: open_blob(digest)
+    # Not migrated to the blob store yet
+    data = getattr(row, legacy_attribute)
+    return lambda: BytesIO(data)
+
+def dataset_file_opener(dataset: models.Dataset) -> Callable[[], BinaryIO]:
+    """Get a function opening the dataset's file; it stays usable after the session is closed."""
+    return _file_opener(dataset.file_digest, dataset, 'file_data')
+
+def query_dataset_file_opener(db: Session, dataset: models.Dataset) -> Callable[[], BinaryIO]:
+    """Like dataset_file_opener, for a dataset loaded without its legacy file column.
+
+    The column is only read when the file is opened, which must happen while db is open.
+    """
+    if dataset.file_digest is not None:
+        return dataset_file_opener(dataset)
+    dataset_id = dataset.id
+    return lambda: BytesIO(db.query(models.Dataset.file_data).filter(models.Dataset.id == dataset_id).scalar())
+
+def open_dataset_file(dataset: models.Dataset) -> BinaryIO:
+    """Open the dataset's file for streaming reads."""
+    return dataset_file_opener(dataset)()
+
+def get_dataset_file(dataset: models.Dataset) -> bytes:
+    """Read the dataset's whole file."""
+    with closing(open_dataset_file(dataset)) as f:
+        return f.read()
+
+def get_model_file(model: models.AIModels) -> bytes:
+    """Read the model's whole file."""
+    with closing(_file_opener(model.model_digest, model, 'model_data')()) as f:
+        return f.read()
+
+def open_training_data(model: models.AIModels) -> BinaryIO:
+    """Open the model's training data for streaming reads."""
+    return _file_opener(model.training_data_digest, model, 'training_data_set')()
+
+def get_training_data(model: models.AIModels) -> bytes:
+    """Read the model's whole training data."""
+    with closing(open_training_data(model)) as f:
+        return f.read()
+
+def _read_frame(
+    parquet_digest: Optional[str],
+    open_original: Callable[[], BinaryIO],
+    file_name: str,
+    columns: Optional[List[str]],
+    filters: Filters,
+    numeric_only: bool
+) -> pd.DataFrame:
+    if parquet_digest is not None:
+        source = blob_random_access(parquet_digest)
+        if numeric_only:
+            numeric = numeric_columns(source)
+            columns = [column for column in numeric if columns is None or column in columns]
+            if hasattr(source, 'seek'):
+                source.seek(0)
+        return read_parquet(source, columns=columns, filters=filters)
+    # Uploaded before Parquet copies were made
+    with closing(open_original()) as f:
+        df = parse_table(file_name, f).rename(columns=str)
+    if numeric_only:
+        numeric = df.select_dtypes(include=['number']).columns
+        columns = [column for column in numeric if columns is None or column in columns]
+    return filter_frame(df, columns, filters)
+
+def read_dataset_frame(
+    dataset: models.Dataset,
+    columns: Optional[List[str]] = None,
+    filters: Filters = None,
+    numeric_only: bool = False
+) -> pd.DataFrame:
+    """Load a dataset for analysis from its Parquet copy.
+
+    Only `columns` (or only the numeric ones) are read, and row groups that cannot
+    match the pyarrow-style `filters` are skipped.
+    """
+    return _read_frame(
+        dataset.parquet_digest, dataset_file_opener(dataset), dataset.file_name, columns, filters, numeric_only)
+
+def read_training_frame(
+    model: models.AIModels,
+    columns: Optional[List[str]] = None,
+    filters: Filters = None,
+    numeric_only: bool = False
+) -> pd.DataFrame:
+    """Load a model's training data for analysis from its Parquet copy."""
+    file_name = (model.training_data_set_metadata or {}).get('filename', 'training.csv')
+    return _read_frame(
+        model.training_parquet_digest, lambda: open_training_data(model), file_name, columns, filters, numeric_only)
+
+PREVIEW_HEAD_ROWS = 20
+PREVIEW_SAMPLE_ROWS = 20
+# Previews by content, so that re-uploads and other viewers of the same content reuse them
+_preview_cache: LRUCache = LRUCache(maxsize=int(os.environ.get("NSQAS_PREVIEW_CACHE_SIZE", 256)))
+_preview_cache_lock = threading.Lock()
+
+class DatasetPreview(NamedTuple):
+    head: pd.DataFrame
+    sample: Optional[pd.DataFrame]  # None until the dataset has a Parquet copy
+    total_rows: Optional[int]
+
+def get_dataset_preview(
+    dataset: models.Dataset,
+    head_rows: int = PREVIEW_HEAD_ROWS,
+    sample_rows: int = PREVIEW_SAMPLE_ROWS,
+    open_file: Optional[Callable[[], BinaryIO]] = None
+) -> DatasetPreview:
+    """The first rows and a random sample of a dataset, cached by content hash and Parquet copy.
+
+    Read from the footer and a few row groups of the Parquet copy only. Files
+    uploaded before Parquet copies were made get the first rows of the original
+    file, opened with open_file (default: dataset_file_opener), and no sample.
+    """
+    # The preview changes once the Parquet copy is made (scripts/backfill_parquet.py)
+    content = dataset.content_hash or dataset.file_digest
+    key = (content, dataset.parquet_digest, head_rows, sample_rows)
+    cacheable = content is not None or dataset.parquet_digest is not None
+    if cacheable:
+        with _preview_cache_lock:
+            preview = _preview_cache.get(key)
+        if preview is not None:
+            return preview
+    if dataset.parquet_digest is not None:
+        source = blob_ranged_access(dataset.parquet_digest)
+        try:
+            preview = DatasetPreview(*read_preview(source, head_rows, sample_rows))
+        finally:
+            if hasattr(source, 'close'):
+                source.close()
+    else:
+        with closing((open_file or dataset_file_opener(dataset))()) as f:
+            if dataset.file_name.lower().endswith('.csv'):
+                head = pd.read_csv(f, nrows=head_rows)
+            else:
+                head = pd.read_excel(f, sheet_name=0, nrows=head_rows)
+        preview = DatasetPreview(head.rename(columns=str), None, (dataset.dataset_metadata or {}).get('rows'))
+    if cacheable:
+        with _preview_cache_lock:
+            _preview_cache[key] = preview
+    return preview
+
+def dataset_parquet_opener(dataset: models.Dataset) -> Optional[Callable]:
+    """Get a function returning a seekable source of the dataset's Parquet copy, if it has one."""
+    digest = dataset.parquet_digest
+    if digest is None:
+        return None
+    return lambda: blob_random_access(digest)
+
+def keyset_page(query, id_column, after_id: Optional[int] = None, limit: Optional[int] = None, skip: int = 0) -> List:
+    """Order a query by id and return the page of rows after the `after_id` cursor.
+
+    Pass the id of the last row of a page as after_id to get the next one; unlike
+    OFFSET, the cost does not grow with the page number. `skip` is kept for
+    callers of the older offset pagination.
+    """
+    if after_id is not None:
+        query = query.filter(id_column > after_id)
+    query = query.order_by(id_column)
+    if skip:
+        query = query.offset(skip)
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
+
+def iter_pages(fetch: Callable[..., List], *args, batch_size: int = 500, **kwargs) -> Iterator:
+    """Yield every row of a keyset-paginated listing, loading batch_size rows at a time.
+
+    fetch is one of the listing functions, e.g. iter_pages(get_all_datasets, db, owner_id=1).
+    """
+    after_id = None
+    while True:
+        page = fetch(*args, after_id=after_id, limit=batch_size, **kwargs)
+        yield from page
+        if len(page) < batch_size:
+            return
+        after_id = page[-1].id
+
+def get_all_users(
+    db: Session,
+    skip: int = 0,
+    limit: Optional[int] = 100,
+    after_id: Optional[int] = None
+) -> List[models.User]:
     """Get all users with pagination."""
-    return db.query(models.User).offset(skip).limit(limit).all()
+    return keyset_page(db.query(models.User), models.User.id, after_id, limit, skip)
 
 def get_user_by_id(db: Session, user_id: int) -> Optional[models.User]:
     """Get a specific user by ID."""
@@ -131,20 +464,66 @@ def get_user_by_email(db: Session, email: str) -> Optional[models.User]:
     """Get a specific user by email."""
     return db.query(models.User).filter(models.User.email == email).first()
 
+# Process-wide cache of users by email. Only existing users are cached, and
+# create_user invalidates the entry, so a new user is visible at once.
+USER_CACHE_TTL = float(os.environ.get("NSQAS_USER_CACHE_TTL", 300))  # seconds
+_user_cache: TTLCache = TTLCache(maxsize=4096, ttl=USER_CACHE_TTL)
+_user_cache_lock = threading.Lock()
+_user_cache_generation = 0
+
+class CachedUser(NamedTuple):
+    """Identity of a user, safe to keep across sessions and threads."""
+    id: int
+    username: str
+    email: str
+    is_admin: bool
+
+def cached_user(user: models.User) -> CachedUser:
+    return CachedUser(user.id, user.username, user.email, bool(user.is_admin))
+
+def user_cache_generation() -> int:
+    """Incremented by every invalidation, so that copies of cached users can tell they are stale."""
+    return _user_cache_generation
+
+def invalidate_user_cache(email: Optional[str] = None):
+    """Drop the cached user with this email, or every cached user."""
+    global _user_cache_generation
+    with _user_cache_lock:
+        if email is None:
+            _user_cache.clear()
+        else:
+            _user_cache.pop(email, None)
+        _user_cache_generation += 1
+
+def get_cached_user_by_email(db: Session, email: str) -> Optional[CachedUser]:
+    """Get a user by email through the process-wide TTL cache."""
+    with _user_cache_lock:
+        user = _user_cache.get(email)
+    if user is not None:
+        return user
+    row = get_user_by_email(db, email)
+    if row is None:
+        return None
+    user = cached_user(row)
+    with _user_cache_lock:
+        _user_cache[email] = user
+    return user
+
 def get_all_ai_models(
     db: Session, 
     skip: int = 0, 
-    limit: int = 100, 
+    limit: Optional[int] = 100, 
     owner_id: Optional[int] = None,
-    is_public: Optional[bool] = None
+    is_public: Optional[bool] = None,
+    after_id: Optional[int] = None
 ) -> List[models.AIModels]:
-    """Get all AI models with optional filtering."""
+    """Get AI models with optional filtering, ordered by id after the `after_id` cursor."""
     query = db.query(models.AIModels)
     if owner_id is not None:
         query = query.filter(models.AIModels.owner_id == owner_id)
     if is_public is not None:
         query = query.filter(models.AIModels.is_public == is_public)
-    return query.offset(skip).limit(limit).all()
+    return keyset_page(query, models.AIModels.id, after_id, limit, skip)
 
 def get_ai_model_by_id(db: Session, model_id: int) -> Optional[models.AIModels]:
     """Get a specific AI model by ID."""
@@ -169,17 +548,18 @@ def get_ai_model_by_id(db: Session, model_id: int) -> Optional[models.AIModels]:
 def get_all_datasets(
     db: Session, 
     skip: int = 0, 
-    limit: int = 100,
+    limit: Optional[int] = 100,
     owner_id: Optional[int] = None,
-    is_public: Optional[bool] = None
+    is_public: Optional[bool] = None,
+    after_id: Optional[int] = None
 ) -> List[models.Dataset]:
-    """Get all datasets with optional filtering."""
+    """Get datasets with optional filtering, ordered by id after the `after_id` cursor."""
     query = db.query(models.Dataset)
     if owner_id is not None:
         query = query.filter(models.Dataset.owner_id == owner_id)
     if is_public is not None:
         query = query.filter(models.Dataset.is_public == is_public)
-    return query.offset(skip).limit(limit).all()
+    return keyset_page(query, models.Dataset.id, after_id, limit, skip)
 
 def get_dataset_by_id(db: Session, dataset_id: int) -> Optional[models.Dataset]:
     """Get a specific dataset by ID."""
@@ -188,43 +568,169 @@ def get_dataset_by_id(db: Session, dataset_id: int) -> Optional[models.Dataset]:
 def get_all_subscriptions(
     db: Session, 
     skip: int = 0, 
-    limit: int = 100,
+    limit: Optional[int] = 100,
     user_id: Optional[int] = None,
-    is_active: Optional[bool] = None
+    is_active: Optional[bool] = None,
+    after_id: Optional[int] = None
 ) -> List[models.Subscription]:
-    """Get all subscriptions with optional filtering."""
+    """Get subscriptions with optional filtering, ordered by id after the `after_id` cursor."""
     query = db.query(models.Subscription)
     if user_id is not None:
         query = query.filter(models.Subscription.user_id == user_id)
     if is_active is not None:
         query = query.filter(models.Subscription.is_active == is_active)
-    return query.offset(skip).limit(limit).all()
+    return keyset_page(query, models.Subscription.id, after_id, limit, skip)
 
 def get_user_subscriptions(
     db: Session,
     user_id: int,
-    is_active: Optional[bool] = None
+    is_active: Optional[bool] = None,
+    after_id: Optional[int] = None,
+    limit: Optional[int] = None
 ) -> List[models.Subscription]:
-    """Get all subscriptions for a specific user."""
+    """Get the subscriptions of a specific user, all of them unless limit is given."""
     query = db.query(models.Subscription).filter(models.Subscription.user_id == user_id)
     if is_active is not None:
         query = query.filter(models.Subscription.is_active == is_active)
-    return query.all()
+    return keyset_page(query, models.Subscription.id, after_id, limit)
 
 def get_model_subscriptions(
     db: Session,
     model_id: int,
-    is_active: Optional[bool] = None
+    is_active: Optional[bool] = None,
+    after_id: Optional[int] = None,
+    limit: Optional[int] = None
 ) -> List[models.Subscription]:
-    """Get all subscriptions for a specific AI model."""
+    """Get the subscriptions of a specific AI model, all of them unless limit is given."""
     query = db.query(models.Subscription).filter(models.Subscription.ai_model_id == model_id)
     if is_active is not None:
         query = query.filter(models.Subscription.is_active == is_active)
-    return query.all()
+    return keyset_page(query, models.Subscription.id, after_id, limit)
+
+def get_user_datasets(
+    db: Session,
+    owner_id: int,
+    after_id: Optional[int] = None,
+    limit: Optional[int] = None
+) -> List[models.Dataset]:
+    """Get the datasets of a specific user, all of them unless limit is given."""
+    return keyset_page(
+        db.query(models.Dataset).filter(models.Dataset.owner_id == owner_id), models.Dataset.id, after_id, limit)
+
+# Columns rendered by the list pages. The other columns are deferred rather than raising:
+# a later full load of the same row in the session returns this instance from the identity map
+AI_MODEL_LIST_COLUMNS = (
+    models.AIModels.id,
+    models.AIModels.name,
+    models.AIModels.owner_id,
+    models.AIModels.version,
+    models.AIModels.description,
+    models.AIModels.is_public,
+    models.AIModels.training_data_set_metadata,
+    models.AIModels.target_field,
+    models.AIModels.created_at,
+)
+DATASET_LIST_COLUMNS = (
+    models.Dataset.id,
+    models.Dataset.name,
+    models.Dataset.owner_id,
+    models.Dataset.description,
+    models.Dataset.version,
+    models.Dataset.upload_date,
+    models.Dataset.is_public,
+    models.Dataset.file_name,
+    models.Dataset.file_size,
+    models.Dataset.contamination,
+)
+
+def get_ai_model_summaries(
+    db: Session,
+    owner_id: Optional[int] = None,
+    is_public: Optional[bool] = None,
+    after_id: Optional[int] = None,
+    limit: Optional[int] = None
+) -> List[models.AIModels]:
+    """Get AI models with only the list columns loaded, filtered in SQL, all of them unless limit is given."""
+    query = db.query(models.AIModels).options(load_only(*AI_MODEL_LIST_COLUMNS))
+    if owner_id is not None:
+        query = query.filter(models.AIModels.owner_id == owner_id)
+    if is_public is not None:
+        query = query.filter(models.AIModels.is_public == is_public)
+    return keyset_page(query, models.AIModels.id, after_id, limit)
+
+def get_dataset_summaries(
+    db: Session,
+    owner_id: Optional[int] = None,
+    is_public: Optional[bool] = None,
+    after_id: Optional[int] = None,
+    limit: Optional[int] = None
+) -> List[models.Dataset]:
+    """Get datasets with only the list columns loaded, filtered in SQL, all of them unless limit is given."""
+    query = db.query(models.Dataset).options(load_only(*DATASET_LIST_COLUMNS))
+    if owner_id is not None:
+        query = query.filter(models.Dataset.owner_id == owner_id)
+    if is_public is not None:
+        query = query.filter(models.Dataset.is_public == is_public)
+    return keyset_page(query, models.Dataset.id, after_id, limit)
+
+# Bound parameters per IN query; stays below the historical SQLite limit of 999
+IN_BATCH_SIZE = 900
+# Columns of the dataset details view and of file downloads
+DATASET_DETAIL_COLUMNS = DATASET_LIST_COLUMNS + (
+    models.Dataset.file_type,
+    models.Dataset.dataset_metadata,
+    models.Dataset.updated_at,
+    models.Dataset.file_digest,
+    models.Dataset.parquet_digest,
+    models.Dataset.content_hash,
+)
+DATASET_FILE_COLUMNS = (
+    models.Dataset.id,
+    models.Dataset.name,
+    models.Dataset.file_name,
+    models.Dataset.file_digest,
+)
+USER_LIST_COLUMNS = (
+    models.User.id,
+    models.User.username,
+    models.User.email,
+    models.User.first_name,
+    models.User.last_name,
+)
+
+def _get_by_ids(db: Session, model, ids, columns) -> Dict[int, object]:
+    """Load the rows with the given ids in one IN query per IN_BATCH_SIZE ids, keyed by id."""
+    ids = sorted({int(row_id) for row_id in ids})
+    rows = {}
+    for start in range(0, len(ids), IN_BATCH_SIZE):
+        query = db.query(model).options(load_only(*columns)).filter(
+            model.id.in_(ids[start:start + IN_BATCH_SIZE]))
+        rows.update((row.id, row) for row in query)
+    return rows
+
+def get_datasets_by_ids(
+    db: Session,
+    dataset_ids: Iterable[int],
+    columns: Tuple = DATASET_LIST_COLUMNS
+) -> Dict[int, models.Dataset]:
+    """Get datasets by id with only `columns` loaded. Missing ids are absent from the result."""
+    return _get_by_ids(db, models.Dataset, dataset_ids, columns)
+
+def get_models_by_ids(
+    db: Session,
+    model_ids: Iterable[int],
+    columns: Tuple = AI_MODEL_LIST_COLUMNS
+) -> Dict[int, models.AIModels]:
+    """Get AI models by id with only `columns` loaded. Missing ids are absent from the result."""
+    return _get_by_ids(db, models.AIModels, model_ids, columns)
 
-def get_user_datasets(db: Session, owner_id: int) -> List[models.Dataset]:
-    """Get all datasets for a specific user."""
-    return db.query(models.Dataset).filter(models.Dataset.owner_id == owner_id).all()
+def get_users_by_ids(
+    db: Session,
+    user_ids: Iterable[int],
+    columns: Tuple = USER_LIST_COLUMNS
+) -> Dict[int, models.User]:
+    """Get users by id with only `columns` loaded. Missing ids are absent from the result."""
+    return _get_by_ids(db, models.User, user_ids, columns)
 
 def update_dataset_visibility(db: Session, dataset_id: int, is_public: bool) -> Optional[models.Dataset]:
     """Update the visibility (public/private) status of a dataset."""
@@ -265,8 +771,12 @@ def delete_ai_model(db: Session, model_id: int) -> bool:
         db.begin_nested()  # Creates a savepoint
         model = db.query(models.AIModels).filter(models.AIModels.id == model_id).first()
         if model:
+            release_blob(db, model.model_digest)
+            release_blob(db, model.training_data_digest)
+            release_blob(db, model.training_parquet_digest)
             db.delete(model)
             db.commit()
+            collect_garbage(db)
             return True
         return False
     except Exception as e:
@@ -277,29 +787,40 @@ def delete_ai_model(db: Session, model_id: int) -> bool:
 def update_ai_model(
     db: Session,
     model_id: int,
-    model_data: bytes,
+    model_data: Union[bytes, BinaryIO, StoredBlob],
     model_name: str,
     model_size: int,
-    training_data_set: Optional[bytes] = None,
+    training_data_set: Optional[Union[bytes, BinaryIO, StoredBlob]] = None,
     training_data_set_metadata: Optional[dict] = None,
-    target_field: Optional[str] = None
+    target_field: Optional[str] = None,
+    training_parquet: Optional[Union[bytes, StoredBlob]] = None
 ) -> Optional[models.AIModels]:
     """Update an existing AI model in the database."""
     try:
         db.begin_nested()  # Creates a savepoint
         model = db.query(models.AIModels).filter(models.AIModels.id == model_id).with_for_update().first()
         if model:
-            model.model_data = model_data
+            release_blob(db, model.model_digest)
+            model.model_digest, model.model_size = store_blob(db, model_data)
+            model.model_data = b""
             model.model_name = model_name
-            model.model_size = model_size
+            # Contributions are cached by training data content and target, so they need no invalidation
             model.target_field = target_field
             if training_data_set is not None:
-                model.training_data_set = training_data_set
+                release_blob(db, model.training_data_digest)
+                model.training_data_digest, model.training_data_size = store_blob(db, training_data_set)
+                model.training_data_set = b""
+                # A Parquet copy of the previous training data must not outlive it
+                release_blob(db, model.training_parquet_digest)
+                model.training_parquet_digest = (
+                    store_blob(db, training_parquet)[0] if training_parquet is not None else None
+                )
             if training_data_set_metadata is not None:
                 model.training_data_set_metadata = training_data_set_metadata
             model.updated_at = datetime.now(UTC)
             db.commit()
             db.refresh(model)
+            collect_garbage(db)
             return model
         return None
     except Exception as e:
@@ -313,8 +834,14 @@ def delete_dataset(db: Session, dataset_id: int) -> bool:
         db.begin_nested()  # Creates a savepoint
         dataset = db.query(models.Dataset).filter(models.Dataset.id == dataset_id).first()
         if dataset:
+            db.query(models.DatasetColumn).filter(
+                models.DatasetColumn.dataset_id == dataset_id
+            ).delete(synchronize_session=False)
+            release_blob(db, dataset.file_digest)
+            release_blob(db, dataset.parquet_digest)
             db.delete(dataset)
             db.commit()
+            collect_garbage(db)
             return True
         return False
     except Exception as e:
@@ -325,27 +852,35 @@ def delete_dataset(db: Session, dataset_id: int) -> bool:
 def update_dataset(
     db: Session,
     dataset_id: int,
-    file_data: bytes,
+    file_data: Union[bytes, BinaryIO, StoredBlob],
     file_name: str,
     file_type: str,
     file_size: int,
     dataset_metadata: Optional[dict] = None,
-    target_field: Optional[str] = None
+    target_field: Optional[str] = None,
+    parquet_data: Optional[Union[bytes, StoredBlob]] = None
 ) -> Optional[models.Dataset]:
     """Update an existing dataset in the database."""
     try:
         db.begin_nested()  # Creates a savepoint
         dataset = db.query(models.Dataset).filter(models.Dataset.id == dataset_id).with_for_update().first()
         if dataset:
-            dataset.file_data = file_data
+            release_blob(db, dataset.file_digest)
+            dataset.file_digest, dataset.file_size = store_blob(db, file_data)
+            dataset.file_data = b""
+            release_blob(db, dataset.parquet_digest)
+            dataset.parquet_digest = store_blob(db, parquet_data)[0] if parquet_data is not None else None
+            # The contamination goes stale unless the bytes are unchanged
+            dataset.content_hash = dataset.file_digest
             dataset.file_name = file_name
             dataset.file_type = file_type
-            dataset.file_size = file_size
             if dataset_metadata is not None:
                 dataset.dataset_metadata = dataset_metadata
+                reuse_content_results(db, dataset, column_types_from_metadata(dataset_metadata))
             dataset.updated_at = datetime.now(UTC)
             db.commit()
             db.refresh(dataset)
+            collect_garbage(db)
             return dataset
         return None
     except Exception as e:
@@ -353,35 +888,145 @@ def update_dataset(
         print(f"Error updating dataset {dataset_id}: {str(e)}")
         raise 
 
-def get_necessity_scores(
-    db: Session,
-    owner_id: int,
-    model_id: int
-) -> List[models.NecessityScore]:
-    """Get all necessity scores for a specific owner and model."""
-    return db.query(models.NecessityScore).filter(
-        models.NecessityScore.owner_id == owner_id,
-        models.NecessityScore.model_id == model_id
-    ).all() 
-
-def create_necessity_score(
+def get_contribution_cache(db: Session, cache_key: str) -> Optional[models.ContributionCache]:
+    """Get cached feature contributions by cache key."""
+    return db.query(models.ContributionCache).filter(
+        models.ContributionCache.cache_key == cache_key
+    ).first()
+
+def get_surrogate_booster(db: Session, surrogate_key: str) -> Optional[bytes]:
+    """Get a fitted surrogate booster already stored for the same training data, target and hyperparameters."""
+    row = db.query(models.ContributionCache.surrogate_booster).filter(
+        models.ContributionCache.surrogate_key == surrogate_key,
+        models.ContributionCache.surrogate_booster.isnot(None)
+    ).first()
+    return row[0] if row else None
+
+def create_contribution_cache(
     db: Session,
-    owner_id: int,
-    model_id: int,
-    feature_name: str,
-    score: float
-) -> models.NecessityScore:
-    """Create a new necessity score in the database."""
-    db_score = models.NecessityScore(
-        owner_id=owner_id,
-        model_id=model_id,
-        feature_name=feature_name,
-        score=score
+    cache_key: str,
+    surrogate_key: str,
+    training_data_hash: str,
+    target_field: str,
+    surrogate_params: dict,
+    contributions: Dict[str, float],
+    contribution_errors: Optional[Dict[str, float]] = None,
+    surrogate_booster: Optional[bytes] = None
+) -> models.ContributionCache:
+    """Store computed feature contributions, or return the entry another session stored first."""
+    db_cache = models.ContributionCache(
+        cache_key=cache_key,
+        surrogate_key=surrogate_key,
+        training_data_hash=training_data_hash,
+        target_field=target_field,
+        surrogate_params=surrogate_params,
+        contributions=contributions,
+        contribution_errors=contribution_errors,
+        surrogate_booster=surrogate_booster
+    )
+    try:
+        db.add(db_cache)
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return get_contribution_cache(db, cache_key)
+    db.refresh(db_cache)
+    return db_cache
+
+def contamination_is_stale():
+    """Filter for datasets without a contamination computed from their current content.
+
+    Datasets uploaded before content hashes were stored keep their value until reset.
+    Written as (missing or stale hash) and (missing or hashed) so that the first
+    term matches the ix_datasets_pending_contamination predicate.
+    """
+    return and_(
+        or_(
+            models.Dataset.contamination.is_(None),
+            models.Dataset.contamination_hash.is_(None),
+            models.Dataset.contamination_hash != models.Dataset.content_hash
+        ),
+        or_(
+            models.Dataset.contamination.is_(None),
+            models.Dataset.content_hash.isnot(None)
+        )
     )
-    db.add(db_score)
+
+def get_contamination_result(db: Session, content_hash: str) -> Optional[models.ContaminationResult]:
+    """Get the memoized contamination of a file content."""
+    return db.query(models.ContaminationResult).filter(
+        models.ContaminationResult.content_hash == content_hash
+    ).first()
+
+def record_contamination(
+    db: Session,
+    content_hash: str,
+    contamination: float,
+    silhouette_estimator: Optional[str] = None,
+    memoize: bool = True
+) -> int:
+    """Memoize a contamination and set it on every dataset with that content. The caller commits.
+
+    Estimates, e.g. from a sample of the rows, are set with memoize=False: later
+    uploads of the content then get an exact value. Returns the number of datasets updated.
+    """
+    if memoize and get_contamination_result(db, content_hash) is None:
+        try:
+            with db.begin_nested():
+                db.add(models.ContaminationResult(
+                    content_hash=content_hash,
+                    contamination=contamination,
+                    silhouette_estimator=silhouette_estimator
+                ))
+        except IntegrityError:
+            pass  # Another worker memoized the same content first
+    return db.execute(
+        update(models.Dataset)
+        .execution_options(synchronize_session=False)
+        .where(models.Dataset.content_hash == content_hash, contamination_is_stale())
+        .values(contamination=contamination, contamination_hash=content_hash)
+    ).rowcount
+
+def apply_contamination_memo(db: Session) -> int:
+    """Fill stale contaminations from the memo wherever the content was already computed."""
+    memo = models.ContaminationResult
+    memoized = select(memo.contamination).where(
+        memo.content_hash == models.Dataset.content_hash
+    ).scalar_subquery()
+    count = db.execute(
+        update(models.Dataset)
+        .execution_options(synchronize_session=False)
+        .where(contamination_is_stale(), models.Dataset.content_hash.in_(select(memo.content_hash)))
+        .values(contamination=memoized, contamination_hash=models.Dataset.content_hash)
+    ).rowcount
     db.commit()
-    db.refresh(db_score)
-    return db_score 
+    return count
+
+class StorageSummary(NamedTuple):
+    blobs: int
+    shared_blobs: int  # Blobs referenced more than once
+    stored_bytes: int
+    referenced_bytes: int  # What the references would take without deduplication
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.referenced_bytes - self.stored_bytes
+
+def get_storage_summary(db: Session) -> StorageSummary:
+    """Sizes of the referenced blobs, with and without deduplication of identical content."""
+    blob = models.Blob
+    blobs, shared, stored, referenced = db.query(
+        func.count(blob.digest),
+        func.count(blob.digest).filter(blob.ref_count > 1),
+        func.coalesce(func.sum(blob.size), 0),
+        func.coalesce(func.sum(blob.size * blob.ref_count), 0)
+    ).filter(blob.ref_count > 0).one()
+    return StorageSummary(blobs, shared, int(stored), int(referenced))
+
+def get_unhashed_dataset_ids(db: Session) -> List[int]:
+    """Get the ids of datasets stored before content hashes were recorded."""
+    rows = db.query(models.Dataset.id).filter(models.Dataset.content_hash.is_(None)).all()
+    return [row[0] for row in rows]
 
 def create_selected_dataset(
     db: Session,
@@ -404,13 +1049,15 @@ def create_selected_dataset(
 
 def get_selected_datasets(
     db: Session,
-    model_id: Optional[int] = None
+    model_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+    limit: Optional[int] = None
 ) -> List[models.SelectedDataset]:
-    """Get all selected datasets, optionally filtered by model_id."""
+    """Get selected datasets, optionally filtered by model_id, all of them unless limit is given."""
     query = db.query(models.SelectedDataset)
     if model_id:
         query = query.filter(models.SelectedDataset.model_id == model_id)
-    return query.all()
+    return keyset_page(query, models.SelectedDataset.id, after_id, limit)
 
 def update_selected_dataset(
     db: Session,
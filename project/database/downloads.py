@@ -0,0 +1,274 @@
+"""Streaming dataset downloads over signed links.
+
+When NSQAS_DOWNLOAD_BASE_URL gives the public URL of the download server,
+pages render a link instead of handing the file to st.download_button, so
+nothing is read until the user clicks. A small HTTP server streams the file
+from the blob store in chunks, with byte ranges for resumed and parallel
+downloads (ETag and If-Range), and an optional gzip variant compressed on the
+fly. Memory use does not depend on the size of the file, except for rows whose
+file has not been moved to the blob store yet (scripts/migrate_blobs.py):
+those are read whole into memory.
+
+Without a base URL the links are disabled, since only the app's own address
+is known to reach the users' browsers, and pages fall back to
+st.download_button with the file read when the button is clicked
+(read_dataset_download).
+
+Links are signed with HMAC-SHA256 and expire. By default the server runs in a
+thread of the Streamlit process and signs with a random per-process secret;
+to run it separately (scripts/download_server.py) or behind several app
+processes, set the same NSQAS_DOWNLOAD_SECRET everywhere and
+NSQAS_DOWNLOAD_EMBEDDED=0 on the app processes.
+
+Configuration (environment variables):
+    NSQAS_DOWNLOAD_BASE_URL    public URL of the server, e.g. https://downloads.example.com
+                               (default: none, links disabled)
+    NSQAS_DOWNLOAD_SECRET      key signing the links (default: random per process)
+    NSQAS_DOWNLOAD_HOST        interface the server listens on (default 127.0.0.1)
+    NSQAS_DOWNLOAD_PORT        port the server listens on (default 8502)
+    NSQAS_DOWNLOAD_LINK_TTL    minimum validity of a link in seconds (default 3600)
+    NSQAS_DOWNLOAD_EMBEDDED    "1" (default) to start the server inside the app process
+"""
+import hashlib
+import hmac
+import logging
+import os
+import re
+import secrets
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Iterator, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qs, quote, urlencode, urlsplit
+from .blob_store import iter_blob_range
+from .database import get_read_db
+from .db_operations import DATASET_FILE_COLUMNS, get_datasets_by_ids
+from . import models
+
+DOWNLOAD_SECRET = os.environ.get("NSQAS_DOWNLOAD_SECRET", "").encode() or secrets.token_bytes(32)
+DOWNLOAD_HOST = os.environ.get("NSQAS_DOWNLOAD_HOST", "127.0.0.1")
+DOWNLOAD_PORT = int(os.environ.get("NSQAS_DOWNLOAD_PORT", 8502))
+DOWNLOAD_BASE_URL = os.environ.get("NSQAS_DOWNLOAD_BASE_URL", "").rstrip("/")
+DOWNLOAD_LINK_TTL = int(os.environ.get("NSQAS_DOWNLOAD_LINK_TTL", 3600))
+DOWNLOAD_EMBEDDED = os.environ.get("NSQAS_DOWNLOAD_EMBEDDED", "1") == "1"
+
+VARIANTS = ("raw", "gzip")
+DATASET_DOWNLOAD_COLUMNS = DATASET_FILE_COLUMNS + (models.Dataset.file_size, models.Dataset.content_hash)
+
+def _signature(dataset_id: int, variant: str, expires: int) -> str:
+    message = f"dataset:{dataset_id}:{variant}:{expires}".encode()
+    return hmac.new(DOWNLOAD_SECRET, message, hashlib.sha256).hexdigest()
+
+def download_links_enabled() -> bool:
+    """Whether the download server has a public URL that links can point to."""
+    return bool(DOWNLOAD_BASE_URL)
+
+def dataset_download_url(dataset_id: int, compressed: bool = False) -> str:
+    """Signed link to download a dataset file, valid for at least DOWNLOAD_LINK_TTL seconds.
+
+    The expiry is rounded up so that the link stays the same across reruns,
+    which lets browsers resume an interrupted download. Requires download_links_enabled().
+    """
+    if not download_links_enabled():
+        raise RuntimeError("Set NSQAS_DOWNLOAD_BASE_URL to the public URL of the download server")
+    if DOWNLOAD_EMBEDDED:
+        ensure_download_server()
+    variant = "gzip" if compressed else "raw"
+    expires = (int(time.time()) // DOWNLOAD_LINK_TTL + 2) * DOWNLOAD_LINK_TTL
+    query = urlencode({"variant": variant, "expires": expires, "signature": _signature(dataset_id, variant, expires)})
+    return f"{DOWNLOAD_BASE_URL}/datasets/{int(dataset_id)}?{query}"
+
+def verify_download(dataset_id: int, variant: str, expires: str, signature: str) -> bool:
+    """Whether a link was signed by us and has not expired."""
+    if variant not in VARIANTS or not expires.isdigit() or int(expires) < time.time():
+        return False
+    return hmac.compare_digest(_signature(dataset_id, variant, int(expires)), signature)
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """The (start, end exclusive) of a single-range Range header, or None to send the whole file.
+
+    Raises ValueError if the range cannot be satisfied. Multiple ranges are
+    answered with the whole file, which the HTTP spec allows.
+    """
+    match = re.fullmatch(r"\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*", header or "")
+    if match is None:
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last) + 1, size) if last else size
+        if last and int(last) < start:
+            return None  # Invalid ranges are ignored
+    elif last:
+        start, end = max(size - int(last), 0), size
+        if int(last) == 0:
+            raise ValueError("Empty suffix range")
+    else:
+        return None
+    if start >= size:
+        raise ValueError(f"Range starts after the end of the file ({size} bytes)")
+    return start, end
+
+class DownloadSource(NamedTuple):
+    file_name: str
+    size: int
+    etag: str
+    read: Callable[[int, int], Iterator[bytes]]  # (start, end exclusive) -> chunks
+
+def open_dataset_download(dataset_id: int) -> Optional[DownloadSource]:
+    """Where to read a dataset file from, or None if there is none."""
+    db = next(get_read_db())
+    try:
+        dataset = get_datasets_by_ids(db, [dataset_id], DATASET_DOWNLOAD_COLUMNS).get(dataset_id)
+        if dataset is None:
+            return None
+        if dataset.file_digest:
+            digest = dataset.file_digest
+            size = dataset.file_size
+            if size is None:
+                size = db.get(models.Blob, digest).size
+            return DownloadSource(dataset.file_name, size, f'"{digest}"',
+                                  lambda start, end: iter_blob_range(digest, start, end))
+        # Rows not moved to the blob store yet (scripts/migrate_blobs.py) keep the file in the
+        # row; read the column itself, the dataset above was loaded without it
+        data = db.query(models.Dataset.file_data).filter(models.Dataset.id == dataset_id).scalar()
+        if not data:
+            return None
+        etag = dataset.content_hash or hashlib.sha256(data).hexdigest()
+        return DownloadSource(dataset.file_name, len(data), f'"{etag}"',
+                              lambda start, end: iter([data[start:end]]))
+    finally:
+        db.close()
+
+def read_dataset_download(dataset_id: int) -> bytes:
+    """The whole dataset file, for st.download_button when download links are disabled."""
+    source = open_dataset_download(dataset_id)
+    if source is None:
+        raise FileNotFoundError(f"Dataset {dataset_id} has no file")
+    return b"".join(source.read(0, source.size))
+
+def gzip_chunks(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """Compress chunks into a gzip stream as they come."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+def _content_disposition(file_name: str) -> str:
+    fallback = re.sub(r'[^A-Za-z0-9._-]', '_', file_name) or "download"
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(file_name)}"
+
+class DownloadHandler(BaseHTTPRequestHandler):
+    """GET/HEAD /datasets/<id>?variant=raw|gzip&expires=...&signature=..."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def log_message(self, format, *args):
+        logging.debug(f"Download {self.address_string()}: {format % args}")
+
+    def _error(self, status: int, message: str, headers: Tuple[Tuple[str, str], ...] = ()):
+        body = message.encode()
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _serve(self, send_body: bool):
+        url = urlsplit(self.path)
+        match = re.fullmatch(r"/datasets/(\d+)", url.path)
+        if match is None:
+            return self._error(404, "Not found")
+        dataset_id = int(match.group(1))
+        params = {name: values[0] for name, values in parse_qs(url.query).items()}
+        variant = params.get("variant", "raw")
+        if not verify_download(dataset_id, variant, params.get("expires", ""), params.get("signature", "")):
+            return self._error(403, "Invalid or expired download link")
+        try:
+            source = open_dataset_download(dataset_id)
+        except Exception as e:
+            logging.error(f"Could not open dataset {dataset_id} for download: {e}")
+            return self._error(500, "Could not read the dataset")
+        if source is None:
+            return self._error(404, "Dataset file not found")
+        try:
+            if variant == "gzip":
+                self._send_gzip(source, send_body)
+            else:
+                self._send_raw(source, send_body)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client went away, e.g. to resume later with a Range request
+            self.close_connection = True
+
+    def _send_raw(self, source: DownloadSource, send_body: bool):
+        byte_range = None
+        if_range = self.headers.get("If-Range")
+        if if_range is None or if_range == source.etag:
+            try:
+                byte_range = parse_range(self.headers.get("Range"), source.size)
+            except ValueError:
+                return self._error(416, "Requested range not satisfiable",
+                                   (("Content-Range", f"bytes */{source.size}"),))
+        start, end = byte_range or (0, source.size)
+        self.send_response(206 if byte_range else 200)
+        if byte_range:
+            self.send_header("Content-Range", f"bytes {start}-{end - 1}/{source.size}")
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(end - start))
+        self.send_header("Content-Disposition", _content_disposition(source.file_name))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", source.etag)
+        self.end_headers()
+        if send_body:
+            for chunk in source.read(start, end):
+                self.wfile.write(chunk)
+
+    def _send_gzip(self, source: DownloadSource, send_body: bool):
+        # The compressed size is unknown up front: no ranges, chunked transfer
+        self.send_response(200)
+        self.send_header("Content-Type", "application/gzip")
+        self.send_header("Content-Disposition", _content_disposition(f"{source.file_name}.gz"))
+        self.send_header("Accept-Ranges", "none")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        if send_body:
+            for chunk in gzip_chunks(source.read(0, source.size)):
+                if chunk:
+                    self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+            self.wfile.write(b"0\r\n\r\n")
+
+def create_download_server(host: str = DOWNLOAD_HOST, port: int = DOWNLOAD_PORT) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), DownloadHandler)
+    server.daemon_threads = True
+    return server
+
+_server_started = False
+_server_lock = threading.Lock()
+
+def ensure_download_server():
+    """Start the download server in a background thread of this process, once."""
+    global _server_started
+    with _server_lock:
+        if _server_started:
+            return
+        _server_started = True
+        try:
+            server = create_download_server()
+        except OSError as e:
+            # Already served, e.g. by scripts/download_server.py; links then need a shared secret
+            logging.warning(f"Download server not started on {DOWNLOAD_HOST}:{DOWNLOAD_PORT}: {e}")
+            return
+        threading.Thread(target=server.serve_forever, name="download-server", daemon=True).start()
+        logging.info(f"Serving downloads on {DOWNLOAD_HOST}:{DOWNLOAD_PORT}")
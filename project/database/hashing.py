@@ -0,0 +1,16 @@
+import hashlib
+import json
+
+def content_hash(data: bytes) -> str:
+    """Get the sha256 hex digest of raw file content."""
+    return hashlib.sha256(data).hexdigest()
+
+def key_hash(*parts) -> str:
+    """Get a stable sha256 hex digest for a combination of strings and JSON-serializable values."""
+    digest = hashlib.sha256()
+    for part in parts:
+        if not isinstance(part, str):
+            part = json.dumps(part, sort_keys=True, default=str)
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
@@ -0,0 +1,257 @@
+"""Single-pass ingestion of uploaded tables.
+
+The upload is read once, in chunks. Every chunk is hashed and written to the
+blob store as it goes by, while the parser consumes the same bytes to build
+the dataset metadata incrementally and the Parquet copy row group by row
+group. Peak memory is a few chunks whatever the file size.
+
+Uploads whose bytes were already ingested, as a dataset or as a model's
+training data, are recognized by their hash before parsing: they reuse the
+stored file, its Parquet copy and its metadata.
+"""
+import hashlib
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from dataclasses import dataclass, field
+from typing import BinaryIO, Dict, Iterator, List, Optional
+from sqlalchemy.orm import Session
+from .blob_store import CHUNK_SIZE, StoredBlob, get_blob_store, register_blob
+from .columnar import PARQUET_COMPRESSION, PARQUET_ROW_GROUP_ROWS, to_arrow
+from . import models
+
+# Rows parsed per chunk
+INGEST_CHUNK_ROWS = 50_000
+
+class TeeReader:
+    """Read-only file wrapper copying every byte read to a blob writer."""
+
+    def __init__(self, source: BinaryIO, writer):
+        self.source = source
+        self.writer = writer
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.source.read(size)
+        self.writer.write(data)
+        return data
+
+    def readable(self) -> bool:
+        return True
+
+    def drain(self):
+        """Consume whatever the parser left unread so that the copy is complete."""
+        while self.read(CHUNK_SIZE):
+            pass
+
+def _unify_dtype(current: Optional[str], new: str) -> str:
+    """Dtype pandas would infer for a column whose chunks were inferred as current and new."""
+    if current is None or current == new:
+        return new
+    for dtype in (current, new):
+        if dtype in ('str', 'string'):
+            return dtype  # Text in any chunk makes the whole column text
+    current_dtype, new_dtype = np.dtype(current), np.dtype(new)
+    if current_dtype.kind in 'iuf' and new_dtype.kind in 'iuf':
+        return str(np.result_type(current_dtype, new_dtype))
+    return 'object'
+
+@dataclass
+class TableProfile:
+    """Upload metadata computed chunk by chunk."""
+    columns: List[str] = field(default_factory=list)
+    rows: int = 0
+    column_types: Dict[str, str] = field(default_factory=dict)
+    missing_values: Dict[str, int] = field(default_factory=dict)
+
+    def update(self, chunk: pd.DataFrame):
+        if not self.columns:
+            self.columns = chunk.columns.tolist()
+        self.rows += len(chunk)
+        missing = chunk.isnull().sum()
+        for column in chunk.columns:
+            dtype = str(chunk[column].dtype)
+            if chunk[column].isnull().all() and column in self.column_types:
+                dtype = self.column_types[column]  # An all-missing chunk says nothing about the type
+            self.column_types[column] = _unify_dtype(self.column_types.get(column), dtype)
+            self.missing_values[column] = self.missing_values.get(column, 0) + int(missing[column])
+
+    def metadata(self) -> dict:
+        """Metadata in the format stored on datasets and models."""
+        return {
+            "columns": self.columns,
+            "rows": self.rows,
+            "column_types": dict(self.column_types),
+            "missing_values": dict(self.missing_values),
+        }
+
+@dataclass
+class IngestedTable:
+    """Result of ingesting an upload: the stored original, its Parquet copy and metadata."""
+    file: StoredBlob
+    parquet: Optional[StoredBlob]
+    metadata: dict
+    reused: bool = False  # The content was ingested before and nothing was parsed
+
+def _unify_types(types: List[pa.DataType]) -> pa.DataType:
+    types = [t for t in types if not pa.types.is_null(t)]
+    if not types:
+        return pa.string()
+    if all(t == types[0] for t in types):
+        return types[0]
+    if all(pa.types.is_integer(t) or pa.types.is_floating(t) for t in types):
+        return pa.float64()
+    return pa.string()
+
+class _ParquetStager:
+    """Parquet copy written in two steps so that column types can differ between chunks.
+
+    Every chunk is first written to its own local file; once all chunks are seen
+    they are cast to a unified schema and streamed into the blob store.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.paths = []
+        self.schemas = []
+
+    def add(self, chunk: pd.DataFrame):
+        table = to_arrow(chunk)
+        path = os.path.join(self.directory, f"chunk-{len(self.paths)}.parquet")
+        pq.write_table(table, path, compression=PARQUET_COMPRESSION)
+        self.paths.append(path)
+        self.schemas.append(table.schema)
+
+    def finish(self) -> Optional[StoredBlob]:
+        if not self.paths:
+            return None
+        names = self.schemas[0].names
+        schema = pa.schema([
+            (name, _unify_types([s.field(name).type for s in self.schemas if name in s.names]))
+            for name in names
+        ])
+        with get_blob_store().writer() as blob_writer:
+            with pq.ParquetWriter(blob_writer, schema, compression=PARQUET_COMPRESSION, write_statistics=True) as writer:
+                for path in self.paths:
+                    table = pq.read_table(path)
+                    columns = [
+                        table.column(name).cast(schema.field(name).type) if name in table.column_names
+                        else pa.nulls(table.num_rows, schema.field(name).type)
+                        for name in names
+                    ]
+                    writer.write_table(pa.Table.from_arrays(columns, schema=schema), row_group_size=PARQUET_ROW_GROUP_ROWS)
+                    os.remove(path)
+            return blob_writer.commit()
+
+def _iter_excel_chunks(path: str, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """Yield the first sheet of a workbook in DataFrames of chunk_rows rows."""
+    if path.lower().endswith('.xlsx'):
+        from openpyxl import load_workbook
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.worksheets[0].iter_rows(values_only=True)
+            header = [str(value) for value in next(rows, ())]
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) == chunk_rows:
+                    yield pd.DataFrame(batch, columns=header).infer_objects()
+                    batch = []
+            if batch or not header:
+                yield pd.DataFrame(batch, columns=header).infer_objects()
+        finally:
+            workbook.close()
+    else:
+        # Legacy .xls workbooks cannot be read incrementally
+        yield pd.read_excel(path, sheet_name=0)
+
+def _hash_upload(upload: BinaryIO) -> Optional[StoredBlob]:
+    """Digest and size of a seekable upload, leaving its position unchanged."""
+    if not (hasattr(upload, 'seekable') and upload.seekable()):
+        return None
+    start = upload.tell()
+    sha = hashlib.sha256()
+    size = 0
+    for chunk in iter(lambda: upload.read(CHUNK_SIZE), b""):
+        sha.update(chunk)
+        size += len(chunk)
+    upload.seek(start)
+    return StoredBlob(sha.hexdigest(), size)
+
+def find_ingested(db: Session, upload: BinaryIO) -> Optional[IngestedTable]:
+    """The result of a previous ingestion of the same bytes, if its blobs are still referenced.
+
+    Referenced blobs are not garbage collected, so the caller can claim them.
+    """
+    file = _hash_upload(upload)
+    if file is None:
+        return None
+    previous = db.query(models.Dataset.parquet_digest, models.Dataset.dataset_metadata).filter(
+        models.Dataset.content_hash == file.digest,
+        models.Dataset.file_digest == file.digest,
+        models.Dataset.dataset_metadata.isnot(None)
+    ).first()
+    if previous is None:
+        previous = db.query(models.AIModels.training_parquet_digest, models.AIModels.training_data_set_metadata).filter(
+            models.AIModels.training_data_digest == file.digest,
+            models.AIModels.training_data_set_metadata.isnot(None)
+        ).first()
+    if previous is None:
+        return None
+    parquet_digest, metadata = previous
+    blobs = {blob.digest: blob for blob in db.query(models.Blob).filter(
+        models.Blob.digest.in_([file.digest, parquet_digest or file.digest]), models.Blob.ref_count > 0)}
+    if file.digest not in blobs or (parquet_digest is not None and parquet_digest not in blobs):
+        return None
+    parquet = StoredBlob(parquet_digest, blobs[parquet_digest].size) if parquet_digest is not None else None
+    # Models keep the upload's file name in their metadata
+    metadata = {key: value for key, value in metadata.items() if key != 'filename'}
+    return IngestedTable(file=file, parquet=parquet, metadata=metadata, reused=True)
+
+def ingest_table(
+    db: Session,
+    upload: BinaryIO,
+    file_name: str,
+    chunk_rows: int = INGEST_CHUNK_ROWS
+) -> IngestedTable:
+    """Store an uploaded CSV or Excel file, its Parquet copy and its metadata in one pass over the upload.
+
+    The stored blobs are not referenced yet: pass them to create_dataset or
+    create_ai_model (or they are garbage collected). Raises ValueError if the
+    file cannot be parsed.
+    """
+    previous = find_ingested(db, upload)
+    if previous is not None:
+        return previous
+
+    profile = TableProfile()
+    with tempfile.TemporaryDirectory(prefix="ingest-") as directory:
+        stager = _ParquetStager(directory)
+        with get_blob_store().writer() as file_writer:
+            tee = TeeReader(upload, file_writer)
+            try:
+                if file_name.lower().endswith('.csv'):
+                    chunks = pd.read_csv(tee, chunksize=chunk_rows)
+                else:
+                    # Workbooks need random access: spool the upload to disk on the way to the store
+                    spool_path = os.path.join(directory, "upload" + os.path.splitext(file_name)[1].lower())
+                    with open(spool_path, "wb") as spool:
+                        for chunk in iter(lambda: tee.read(CHUNK_SIZE), b""):
+                            spool.write(chunk)
+                    chunks = _iter_excel_chunks(spool_path, chunk_rows)
+                for chunk in chunks:
+                    profile.update(chunk)
+                    stager.add(chunk)
+            except Exception as e:
+                raise ValueError(f"Error reading file: {str(e)}") from e
+            tee.drain()
+            stored_file = file_writer.commit()
+        parquet = stager.finish()
+
+    register_blob(db, stored_file)
+    if parquet is not None:
+        register_blob(db, parquet)
+    db.commit()
+    return IngestedTable(file=stored_file, parquet=parquet, metadata=profile.metadata())
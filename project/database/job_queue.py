@@ -0,0 +1,242 @@
+"""Durable job queue on the jobs table.
+
+Jobs are enqueued by the pages and leased by worker processes
+(batch/job_worker.py). A lease expires unless the worker sends heartbeats, so
+jobs of crashed workers are picked up again. Failed jobs are retried with
+exponential backoff and moved to the dead-letter status "dead" after
+max_attempts.
+"""
+from sqlalchemy import update, or_, and_, func
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta, UTC
+from typing import Optional, List, Dict
+from . import models
+from .db_operations import apply_contamination_memo, contamination_is_stale
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+DEAD = 'dead'
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+DEFAULT_LEASE_SECONDS = 300
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 3600
+
+CONTAMINATION_JOB = 'contamination'
+
+def backoff_delay(attempts: int) -> timedelta:
+    """Delay before retrying a job that has failed `attempts` times."""
+    return timedelta(seconds=min(BACKOFF_BASE_SECONDS * 2 ** max(attempts - 1, 0), BACKOFF_MAX_SECONDS))
+
+def enqueue_job(
+    db: Session,
+    kind: str,
+    payload: dict,
+    dedupe_key: Optional[str] = None,
+    priority: int = 0,
+    max_attempts: int = 5
+) -> models.Job:
+    """Enqueue a job, or return the queued/running job with the same dedupe key."""
+    if dedupe_key is not None:
+        existing = get_active_job(db, dedupe_key)
+        if existing is not None:
+            return existing
+    job = models.Job(
+        kind=kind,
+        payload=payload,
+        dedupe_key=dedupe_key,
+        status=QUEUED,
+        priority=priority,
+        max_attempts=max_attempts,
+        run_after=datetime.now(UTC)
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+def lease_job(
+    db: Session,
+    worker_id: str,
+    kinds: Optional[List[str]] = None,
+    lease_seconds: int = DEFAULT_LEASE_SECONDS,
+    candidates: int = 10
+) -> Optional[models.Job]:
+    """Lease the next runnable job for a worker.
+
+    Runnable jobs are queued jobs whose backoff has elapsed and running jobs whose
+    lease has expired. The claim is a conditional UPDATE, so concurrent workers
+    cannot lease the same job.
+    """
+    now = datetime.now(UTC)
+    runnable = or_(
+        and_(models.Job.status == QUEUED, models.Job.run_after <= now),
+        and_(models.Job.status == RUNNING, models.Job.lease_expires_at < now)
+    )
+    query = db.query(models.Job.id, models.Job.status, models.Job.attempts, models.Job.max_attempts).filter(runnable)
+    if kinds:
+        query = query.filter(models.Job.kind.in_(kinds))
+    rows = query.order_by(models.Job.priority.desc(), models.Job.id).limit(candidates).all()
+
+    for job_id, status, attempts, max_attempts in rows:
+        if status == RUNNING and attempts >= max_attempts:
+            # The worker died on its last attempt
+            db.execute(
+                update(models.Job)
+                .execution_options(synchronize_session=False)
+                .where(models.Job.id == job_id, models.Job.status == RUNNING, models.Job.lease_expires_at < now)
+                .values(status=DEAD, last_error='Lease expired on the last attempt', finished_at=now)
+            )
+            db.commit()
+            continue
+
+        claim = (
+            update(models.Job)
+            .execution_options(synchronize_session=False)
+            .where(models.Job.id == job_id, runnable)
+            .values(
+                status=RUNNING,
+                lease_owner=worker_id,
+                lease_expires_at=now + timedelta(seconds=lease_seconds),
+                heartbeat_at=now,
+                attempts=models.Job.attempts + 1
+            )
+        )
+        if db.execute(claim).rowcount == 1:
+            db.commit()
+            return db.get(models.Job, job_id, populate_existing=True)
+        db.rollback()
+    return None
+
+def heartbeat_job(db: Session, job_id: int, worker_id: str, lease_seconds: int = DEFAULT_LEASE_SECONDS) -> bool:
+    """Extend the lease of a running job. Returns False if the worker no longer owns it."""
+    now = datetime.now(UTC)
+    renewed = db.execute(
+        update(models.Job)
+        .execution_options(synchronize_session=False)
+        .where(models.Job.id == job_id, models.Job.status == RUNNING, models.Job.lease_owner == worker_id)
+        .values(heartbeat_at=now, lease_expires_at=now + timedelta(seconds=lease_seconds))
+    ).rowcount == 1
+    db.commit()
+    return renewed
+
+def complete_job(db: Session, job_id: int, worker_id: str, result: Optional[dict] = None) -> bool:
+    """Mark a job as succeeded, committing any other changes pending in the session.
+
+    Returns False, and rolls everything back, if the lease was lost in the meantime.
+    """
+    return complete_jobs(db, worker_id, {job_id: result})
+
+def complete_jobs(db: Session, worker_id: str, results: Dict[int, Optional[dict]]) -> bool:
+    """Mark a batch of jobs as succeeded in one commit with the other changes pending in the session.
+
+    Returns False, and rolls everything back, if the lease of any of them was lost in the meantime.
+    """
+    now = datetime.now(UTC)
+    completed = 0
+    for job_id, result in results.items():
+        completed += db.execute(
+            update(models.Job)
+            .execution_options(synchronize_session=False)
+            .where(models.Job.id == job_id, models.Job.status == RUNNING, models.Job.lease_owner == worker_id)
+            .values(status=SUCCEEDED, result=result, last_error=None, lease_expires_at=None, finished_at=now)
+        ).rowcount
+    if completed == len(results):
+        db.commit()
+        return True
+    db.rollback()
+    return False
+
+def fail_job(db: Session, job_id: int, worker_id: str, error: str) -> Optional[str]:
+    """Record a failed attempt: requeue with backoff, or dead-letter after max_attempts.
+
+    Returns the new status, or None if the worker no longer owns the job.
+    """
+    db.rollback()  # Discard partial work of the failed attempt
+    job = db.get(models.Job, job_id, populate_existing=True)
+    if job is None or job.status != RUNNING or job.lease_owner != worker_id:
+        return None
+    now = datetime.now(UTC)
+    if job.attempts >= job.max_attempts:
+        job.status = DEAD
+        job.finished_at = now
+    else:
+        job.status = QUEUED
+        job.run_after = now + backoff_delay(job.attempts)
+    job.last_error = error
+    job.lease_owner = None
+    job.lease_expires_at = None
+    db.commit()
+    return job.status
+
+def requeue_dead_jobs(db: Session, kind: Optional[str] = None) -> int:
+    """Give dead-lettered jobs a fresh set of attempts."""
+    query = update(models.Job).execution_options(synchronize_session=False).where(models.Job.status == DEAD)
+    if kind is not None:
+        query = query.where(models.Job.kind == kind)
+    count = db.execute(
+        query.values(status=QUEUED, attempts=0, run_after=datetime.now(UTC), finished_at=None)
+    ).rowcount
+    db.commit()
+    return count
+
+def get_job(db: Session, job_id: int) -> Optional[models.Job]:
+    """Get a specific job by ID."""
+    return db.query(models.Job).filter(models.Job.id == job_id).first()
+
+def get_active_job(db: Session, dedupe_key: str) -> Optional[models.Job]:
+    """Get the queued or running job with a dedupe key, if any."""
+    return db.query(models.Job).filter(
+        models.Job.dedupe_key == dedupe_key,
+        models.Job.status.in_(ACTIVE_STATUSES)
+    ).first()
+
+def get_latest_job(db: Session, dedupe_key: str) -> Optional[models.Job]:
+    """Get the most recent job with a dedupe key."""
+    return db.query(models.Job).filter(
+        models.Job.dedupe_key == dedupe_key
+    ).order_by(models.Job.id.desc()).first()
+
+def get_job_counts(db: Session, kind: Optional[str] = None) -> Dict[str, int]:
+    """Count jobs per status."""
+    query = db.query(models.Job.status, func.count(models.Job.id))
+    if kind is not None:
+        query = query.filter(models.Job.kind == kind)
+    counts = {status: 0 for status in (QUEUED, RUNNING, SUCCEEDED, DEAD)}
+    counts.update(dict(query.group_by(models.Job.status).all()))
+    return counts
+
+def contamination_dedupe_key(dataset_id: int) -> str:
+    return f"{CONTAMINATION_JOB}:{dataset_id}"
+
+def enqueue_contamination(db: Session, dataset_id: int, priority: int = 0) -> models.Job:
+    """Enqueue the contamination calculation of one dataset."""
+    return enqueue_job(
+        db,
+        CONTAMINATION_JOB,
+        {"dataset_id": dataset_id},
+        dedupe_key=contamination_dedupe_key(dataset_id),
+        priority=priority
+    )
+
+def enqueue_pending_contamination(db: Session) -> int:
+    """Enqueue every dataset whose contamination is missing or stale, largest file first.
+
+    Stale datasets whose content was already computed are filled from the memo
+    without a job, and only one job is enqueued per distinct content; the others
+    are filled when it completes. Returns the number of datasets that are now
+    queued or already being processed.
+    """
+    apply_contamination_memo(db)
+    pending = db.query(models.Dataset.id, models.Dataset.file_size, models.Dataset.content_hash).filter(
+        contamination_is_stale()
+    ).all()
+    enqueued_hashes = set()
+    for dataset_id, file_size, dataset_hash in pending:
+        if dataset_hash is not None:
+            if dataset_hash in enqueued_hashes:
+                continue
+            enqueued_hashes.add(dataset_hash)
+        enqueue_contamination(db, dataset_id, priority=file_size or 0)
+    return len(pending)
@@ -0,0 +1,100 @@
+"""Versioned schema migrations.
+
+create_all only creates missing tables, with the indexes declared on the
+models. Changes to existing tables go through the numbered migrations below;
+the versions applied to a database are recorded in schema_migrations, and
+migrate() applies the missing ones in order, each in its own transaction.
+
+To change the schema, update the models and append a migration performing the
+same change on existing databases. Migrations must be idempotent: on a new
+database create_all has already built the final schema.
+"""
+from datetime import datetime, UTC
+from typing import Callable, List, NamedTuple
+from sqlalchemy import inspect, insert, select, text
+from sqlalchemy.engine import Connection, Engine
+from .database import Base, engine
+from . import models
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    apply: Callable[[Connection], None]
+
+def _add_missing_columns(connection: Connection):
+    """Add columns declared on the models but missing from existing tables."""
+    inspector = inspect(connection)
+    existing_tables = set(inspector.get_table_names())
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            column_type = column.type.compile(dialect=connection.dialect)
+            connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+            print(f"Added column {table.name}.{column.name}")
+            if column.index:
+                connection.execute(text(
+                    f'CREATE INDEX IF NOT EXISTS ix_{table.name}_{column.name} ON {table.name} ({column.name})'))
+
+def _create_indexes(*names: str) -> Callable[[Connection], None]:
+    """Migration creating indexes declared on the models, by name."""
+    def apply(connection: Connection):
+        indexes = {index.name: index for table in Base.metadata.sorted_tables for index in table.indexes}
+        for name in names:
+            indexes[name].create(connection, checkfirst=True)
+    return apply
+
+def _drop_indexes(*names: str) -> Callable[[Connection], None]:
+    """Migration dropping indexes removed from the models, by name."""
+    def apply(connection: Connection):
+        for name in names:
+            connection.execute(text(f'DROP INDEX IF EXISTS {name}'))
+    return apply
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "Add columns declared after their tables were created", _add_missing_columns),
+    Migration(2, "Index owner, model, user and pending contamination lookups", _create_indexes(
+        'ix_datasets_owner_id',
+        'ix_datasets_is_public',
+        'ix_datasets_pending_contamination',
+        'ix_ai_models_owner_id',
+        'ix_selected_datasets_model_id',
+        'ix_subscriptions_user_id',
+        'ix_subscriptions_ai_model_id',
+        'ix_blobs_unreferenced',
+    )),
+    Migration(3, "Index training data digests for upload deduplication", _create_indexes(
+        'ix_ai_models_training_data_digest',
+    )),
+    Migration(4, "Drop the index of the necessity scores, which are no longer written", _drop_indexes(
+        'ix_necessity_scores_model_owner',
+    )),
+]
+
+def applied_versions(bind: Engine = engine) -> List[int]:
+    """Versions of the migrations applied to the database."""
+    models.SchemaMigration.__table__.create(bind, checkfirst=True)
+    with bind.connect() as connection:
+        return [row[0] for row in connection.execute(
+            select(models.SchemaMigration.version).order_by(models.SchemaMigration.version))]
+
+def migrate(bind: Engine = engine) -> List[int]:
+    """Apply the pending migrations in order. Returns the versions applied."""
+    done = set(applied_versions(bind))
+    applied = []
+    for migration in MIGRATIONS:
+        if migration.version in done:
+            continue
+        with bind.begin() as connection:
+            migration.apply(connection)
+            connection.execute(insert(models.SchemaMigration).values(
+                version=migration.version,
+                description=migration.description,
+                applied_at=datetime.now(UTC)
+            ))
+        print(f"Applied migration {migration.version}: {migration.description}")
+        applied.append(migration.version)
+    return applied
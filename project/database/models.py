@@ -1,8 +1,11 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, LargeBinary, ForeignKey, JSON, Float
+from sqlalchemy import text, Column, Integer, BigInteger, String, DateTime, Text, Boolean, LargeBinary, ForeignKey, JSON, Float, Index, UniqueConstraint
+from sqlalchemy.orm import deferred
 from sqlalchemy.ext.hybrid import hybrid_property
 from datetime import datetime, UTC
 from .database import Base
 
+PENDING_CONTAMINATION = 'contamination IS NULL OR contamination_hash IS NULL OR contamination_hash != content_hash'
+
 class User(Base):
     __tablename__ = 'users'
     
@@ -23,6 +26,10 @@ class User(Base):
 
 class AIModels(Base):
     __tablename__ = 'ai_models'
+    __table_args__ = (
+        Index('ix_ai_models_owner_id', 'owner_id'),
+        Index('ix_ai_models_training_data_digest', 'training_data_digest'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String(255), nullable=False)
@@ -31,11 +38,17 @@ class AIModels(Base):
     description = Column(Text)
     upload_date = Column(DateTime, default=lambda: datetime.now(UTC))
     is_public = Column(Boolean, default=False)
-    model_data = Column(LargeBinary, nullable=False)  # Store the actual file content
+    # Legacy inline copies, empty once the content lives in the blob store; deferred so
+    # that loading a row never pulls them
+    model_data = deferred(Column(LargeBinary, nullable=False))
+    model_digest = Column(String(64))  # Blob store digest of the model file
     model_name = Column(String(255), nullable=False)  # Original filename
     model_size = Column(Integer)  # Size in bytes
     model_metadata = Column(JSON)  # Store additional model metadata as JSON
-    training_data_set = Column(LargeBinary, nullable=False)
+    training_data_set = deferred(Column(LargeBinary, nullable=False))
+    training_data_digest = Column(String(64))  # Blob store digest of the training data
+    training_data_size = Column(BigInteger)
+    training_parquet_digest = Column(String(64))  # Blob store digest of the training data's Parquet copy
     training_data_set_metadata = Column(JSON)  # Store additional training data set metadata as JSON
     target_field = Column(String(255), nullable=False)
     created_at = Column(DateTime, default=lambda: datetime.now(UTC))
@@ -46,6 +59,17 @@ class AIModels(Base):
 
 class Dataset(Base):
     __tablename__ = 'datasets'
+    __table_args__ = (
+        Index('ix_datasets_owner_id', 'owner_id'),
+        Index('ix_datasets_is_public', 'is_public'),
+        # Only the datasets whose contamination is missing or stale, largest first. The
+        # predicate must stay identical to the first term of contamination_is_stale()
+        Index(
+            'ix_datasets_pending_contamination', 'file_size',
+            sqlite_where=text(PENDING_CONTAMINATION),
+            postgresql_where=text(PENDING_CONTAMINATION)
+        ),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)  # Maps to "Dataset Id"
     name = Column(String(255), nullable=False)  # Maps to "Dataset name"
@@ -54,12 +78,17 @@ class Dataset(Base):
     version = Column(String(50), nullable=False)  # Maps to "Version"
     upload_date = Column(DateTime, nullable=False)  # Maps to "Upload Date"
     is_public = Column(Boolean, default=False)  # Maps to "visibility" (private/public)
-    file_data = Column(LargeBinary, nullable=False)  # Store the actual file content
+    # Legacy inline copy, empty once the content lives in the blob store
+    file_data = deferred(Column(LargeBinary, nullable=False))
+    file_digest = Column(String(64))  # Blob store digest of the file
+    parquet_digest = Column(String(64))  # Blob store digest of the Parquet copy used by analytics
     file_name = Column(String(255), nullable=False)  # Original filename
     file_type = Column(String(50))  # File type/extension
     file_size = Column(Integer)  # Size in bytes
     dataset_metadata = Column(JSON)  # Store additional dataset metadata as JSON
     contamination = Column(Float, nullable=True)  # Store the contamination value
+    content_hash = Column(String(64), index=True)  # sha256 of file_data
+    contamination_hash = Column(String(64))  # content_hash the contamination was computed from
     created_at = Column(DateTime, default=lambda: datetime.now(UTC))
     updated_at = Column(DateTime, default=lambda: datetime.now(UTC), onupdate=lambda: datetime.now(UTC))
 
@@ -73,8 +102,29 @@ class Dataset(Base):
     def __repr__(self):
         return f"<Dataset(name='{self.name}', version='{self.version}')>"
 
+class DatasetColumn(Base):
+    """Inverted index of dataset column names so search never has to parse file_data."""
+    __tablename__ = 'dataset_columns'
+    __table_args__ = (
+        UniqueConstraint('dataset_id', 'feature_name', name='uq_dataset_columns_dataset_feature'),
+        Index('ix_dataset_columns_feature_dataset', 'feature_name', 'dataset_id'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    dataset_id = Column(Integer, ForeignKey('datasets.id'), nullable=False)
+    feature_name = Column(String(255), nullable=False)
+    dtype = Column(String(50))  # pandas dtype inferred at upload time
+    created_at = Column(DateTime, default=lambda: datetime.now(UTC))
+
+    def __repr__(self):
+        return f"<DatasetColumn(dataset_id={self.dataset_id}, feature='{self.feature_name}', dtype='{self.dtype}')>"
+
 class Subscription(Base):
     __tablename__ = 'subscriptions'
+    __table_args__ = (
+        Index('ix_subscriptions_user_id', 'user_id'),
+        Index('ix_subscriptions_ai_model_id', 'ai_model_id'),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
@@ -89,6 +139,7 @@ class Subscription(Base):
         return f"<Subscription(user_id={self.user_id}, ai_model_id={self.ai_model_id}, dataset_id={self.dataset_id})>"
 
 class NecessityScore(Base):
+    """No longer written: contributions are cached in ContributionCache."""
     __tablename__ = 'necessity_scores'
     
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -104,6 +155,9 @@ class NecessityScore(Base):
 
 class SelectedDataset(Base):
     __tablename__ = 'selected_datasets'
+    __table_args__ = (
+        Index('ix_selected_datasets_model_id', 'model_id'),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     model_id = Column(Integer, ForeignKey('ai_models.id'), nullable=False)
@@ -114,4 +168,95 @@ class SelectedDataset(Base):
     updated_at = Column(DateTime, default=lambda: datetime.now(UTC), onupdate=lambda: datetime.now(UTC))
 
     def __repr__(self):
-        return f"<SelectedDataset(model='{self.model_name}', dataset='{self.dataset_name}')>"
\ No newline at end of file
+        return f"<SelectedDataset(model='{self.model_name}', dataset='{self.dataset_name}')>"
+
+class ContributionCache(Base):
+    """Feature contributions keyed by content, shared by every model trained on the same data."""
+    __tablename__ = 'contribution_cache'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    cache_key = Column(String(64), unique=True, nullable=False)  # surrogate_key + SHAP budget
+    surrogate_key = Column(String(64), nullable=False, index=True)  # training data hash + target + hyperparameters
+    training_data_hash = Column(String(64), nullable=False)
+    target_field = Column(String(255), nullable=False)
+    surrogate_params = Column(JSON)
+    contributions = Column(JSON, nullable=False)  # feature name -> relative contribution
+    contribution_errors = Column(JSON)  # feature name -> bootstrap standard error
+    surrogate_booster = Column(LargeBinary)  # Fitted XGBoost booster in UBJSON format
+    created_at = Column(DateTime, default=lambda: datetime.now(UTC))
+
+    def __repr__(self):
+        return f"<ContributionCache(key='{self.cache_key[:12]}', target='{self.target_field}')>"
+
+class ContaminationResult(Base):
+    """Contamination computed for a file content, reused by every dataset with the same bytes."""
+    __tablename__ = 'contamination_results'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    content_hash = Column(String(64), unique=True, nullable=False)
+    contamination = Column(Float, nullable=False)
+    silhouette_estimator = Column(String(50))
+    created_at = Column(DateTime, default=lambda: datetime.now(UTC))
+
+    def __repr__(self):
+        return f"<ContaminationResult(hash='{self.content_hash[:12]}', contamination={self.contamination})>"
+
+class Blob(Base):
+    """Reference count of a file in the blob store."""
+    __tablename__ = 'blobs'
+    __table_args__ = (
+        # Garbage collection candidates
+        Index(
+            'ix_blobs_unreferenced', 'released_at',
+            sqlite_where=text('ref_count = 0'),
+            postgresql_where=text('ref_count = 0')
+        ),
+    )
+
+    digest = Column(String(64), primary_key=True)  # sha256 of the content
+    size = Column(BigInteger, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)
+    released_at = Column(DateTime)  # When the last reference was dropped
+    created_at = Column(DateTime, default=lambda: datetime.now(UTC))
+
+    def __repr__(self):
+        return f"<Blob(digest='{self.digest[:12]}', size={self.size}, refs={self.ref_count})>"
+
+class Job(Base):
+    """Durable background job consumed by batch workers (see database/job_queue.py)."""
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        Index('ix_jobs_status_priority', 'status', 'priority', 'id'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    kind = Column(String(50), nullable=False)  # e.g. "contamination"
+    payload = Column(JSON)
+    dedupe_key = Column(String(255), index=True)  # At most one queued/running job per key
+    status = Column(String(20), nullable=False, default='queued')  # queued, running, succeeded, dead
+    priority = Column(Integer, default=0)  # Higher runs first
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=5)
+    run_after = Column(DateTime, default=lambda: datetime.now(UTC))  # Backoff: not leased before this time
+    lease_owner = Column(String(255))
+    lease_expires_at = Column(DateTime)
+    heartbeat_at = Column(DateTime)
+    last_error = Column(Text)
+    result = Column(JSON)
+    finished_at = Column(DateTime)
+    created_at = Column(DateTime, default=lambda: datetime.now(UTC))
+    updated_at = Column(DateTime, default=lambda: datetime.now(UTC), onupdate=lambda: datetime.now(UTC))
+
+    def __repr__(self):
+        return f"<Job(id={self.id}, kind='{self.kind}', status='{self.status}', attempts={self.attempts})>"
+
+class SchemaMigration(Base):
+    """Schema migration applied to this database (see database/migrations.py)."""
+    __tablename__ = 'schema_migrations'
+
+    version = Column(Integer, primary_key=True)
+    description = Column(String(255), nullable=False)
+    applied_at = Column(DateTime, default=lambda: datetime.now(UTC))
+
+    def __repr__(self):
+        return f"<SchemaMigration(version={self.version}, description='{self.description}')>"
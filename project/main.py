@@ -5,30 +5,21 @@ from pages.your_datasets_page import your_datasets
 from pages.selected_datasets_page import selected_datasets
 from pages.search_dataset_page import search_datasets
 from pages.your_model_page import your_model
-from database.database import get_db
-from database.db_operations import create_user, get_user_by_email
+from database.database import get_db, request_scope
+from pages.session_user import login_user
+import logging
 import time
 
+logger = logging.getLogger(__name__)
+
 
 def handle_user_login():
-    """Handle user login and database creation if needed."""
+    """Create or update the user's database entry, once per session."""
     try:
         # Get database session
         db = next(get_db())
         
-        # Check if user exists in database
-        user = get_user_by_email(db, st.user.email)
-        
-        if not user:
-            # Create new user if they don't exist
-            user = create_user(
-                db=db,
-                username=st.user.email.split('@')[0],  # Use email prefix as username
-                email=st.user.email,
-                password_hash="oauth_user",  # OAuth users don't need password
-                first_name=st.user.first_name if hasattr(st.user, 'first_name') else None,
-                last_name=st.user.last_name if hasattr(st.user, 'last_name') else None
-            )
+        login_user(db)
             
     except Exception as e:
         st.error(f"Error handling user login: {str(e)}")
@@ -67,18 +58,26 @@ pages_unsigned_user = {
     ],
 }
 
-# if st.user: 
-if st.user.is_logged_in:
-    # Handle user database entry after successful login
-        handle_user_login()
-        pg = st.navigation(pages_signed_user)
-    # else :
-    #     pg = st.navigation(pages_unsigned_user)
-else:
-    pg = st.navigation(pages_unsigned_user)
-    
+# The database sessions of this run are shared per engine and closed when the run ends
+with request_scope() as request:
+    # if st.user: 
+    if st.user.is_logged_in:
+        # Handle user database entry after successful login
+            handle_user_login()
+            pg = st.navigation(pages_signed_user)
+        # else :
+        #     pg = st.navigation(pages_unsigned_user)
+    else:
+        pg = st.navigation(pages_unsigned_user)
+        
+
+    pg.run()
 
-pg.run()
+connections = request.metrics
+logger.debug(f"Render made {connections.checkouts} connection checkouts, at most {connections.peak} at a time")
+# One connection per shared session at most; more means a session was opened outside the scope
+if connections.peak > max(len(request.sessions), 1):
+    logger.warning(f"Render held {connections.peak} database connections at once")
 
 with st.sidebar:
         if st.user.is_logged_in:
@@ -0,0 +1,31 @@
+import streamlit as st
+from typing import Callable, List, Optional, Tuple
+
+PAGE_SIZE = 50
+
+def keyset_pager(key: str, fetch: Callable[[Optional[int], int], List], page_size: int = PAGE_SIZE) -> Tuple[List, int]:
+    """Fetch the current page of a table and render Previous/Next buttons.
+
+    fetch(after_id, limit) returns rows ordered by id, as the keyset-paginated
+    listing functions do. The cursors of the pages visited so far are kept in
+    st.session_state[key]. Returns the rows and the position of the first one.
+    """
+    cursors = st.session_state.setdefault(key, [None])
+    rows = fetch(cursors[-1], page_size + 1)  # One more row tells whether there is a next page
+    if not rows and len(cursors) > 1:
+        # The rows of this page were deleted
+        cursors.pop()
+        rows = fetch(cursors[-1], page_size + 1)
+    has_next = len(rows) > page_size
+    rows = rows[:page_size]
+
+    if has_next or len(cursors) > 1:
+        col_previous, col_page, col_next = st.columns([1, 2, 1])
+        with col_previous:
+            st.button("Previous", key=f"{key}_previous", disabled=len(cursors) == 1, on_click=cursors.pop)
+        with col_page:
+            st.caption(f"Page {len(cursors)}")
+        with col_next:
+            st.button("Next", key=f"{key}_next", disabled=not has_next,
+                      on_click=cursors.append, args=(rows[-1].id if rows else None,))
+    return rows, (len(cursors) - 1) * page_size
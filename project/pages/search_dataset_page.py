@@ -1,17 +1,16 @@
 import streamlit as st
 import numpy as np
 import pandas as pd
-from database.database import get_db
+from database.database import get_db, get_read_db
 from database.db_operations import (
-    get_all_ai_models,
-    get_user_by_email,
-    get_necessity_scores,
-    get_ai_model_by_id,
-    get_dataset_by_id,
+    get_ai_model_summaries,
+    get_datasets_by_ids,
+    get_models_by_ids,
     create_selected_dataset
 )
 from database.models import SelectedDataset
 from Datasetfilter.necessity_score_calc import NecessityScoreCalculator
+from pages.session_user import get_current_user
 import re
 import time
 
@@ -46,8 +45,8 @@ def choose_datasets(model_id: int):
                 dataset_id_int = int(dataset_id)
             #     
                 # Get the dataset and model objects
-                dataset = get_dataset_by_id(db, dataset_id_int)
-                model = get_ai_model_by_id(db, model_id)
+                dataset = get_datasets_by_ids(db, [dataset_id_int]).get(dataset_id_int)
+                model = get_models_by_ids(db, [model_id]).get(model_id)
             #     
                 if not dataset or not model:
                     st.error("Dataset or model not found!")
@@ -84,7 +83,7 @@ def search_datasets():
     with st.form(key="search_dataset_form"):
         st.title("Search datasets")
 
-        db = next(get_db())
+        db = next(get_read_db())
                 
         # Check if user is logged in
         if not st.user.is_logged_in:
@@ -92,9 +91,9 @@ def search_datasets():
             return
             
         # Get current user's ID
-        current_user = get_user_by_email(db, st.user.email)
+        current_user = get_current_user(db)
 
-        models = get_all_ai_models(db, owner_id=current_user.id)
+        models = get_ai_model_summaries(db, owner_id=current_user.id)
         models_names = [f"{model.name} (version {model.version}) (id: {model.id})" for model in models]
         selected_model = st.selectbox("Select a model", 
                                     options=models_names, 
@@ -109,13 +108,16 @@ def search_datasets():
             score_lst = NS.get_necessity_scores()
             
             score_lst.sort(key=lambda x: x[0], reverse=True)
+            # One query for every result; datasets deleted since scoring are dropped
+            datasets = get_datasets_by_ids(db, [score[1] for score in score_lst])
+            score_lst = [score for score in score_lst if score[1] in datasets]
             scores = [score[0]*100 for score in score_lst]
             dataset_ids = [score[1] for score in score_lst]
-            dataset_names = [get_dataset_by_id(db, dataset_id).name for dataset_id in dataset_ids]
-            dataset_accuracies = [get_dataset_by_id(db, dataset_id).accuracy for dataset_id in dataset_ids]
-            dataset_upload_dates = [get_dataset_by_id(db, dataset_id).upload_date for dataset_id in dataset_ids]
-            dataset_versions = [get_dataset_by_id(db, dataset_id).version for dataset_id in dataset_ids]
-            dataset_descriptions = [get_dataset_by_id(db, dataset_id).description for dataset_id in dataset_ids]
+            dataset_names = [datasets[dataset_id].name for dataset_id in dataset_ids]
+            dataset_accuracies = [datasets[dataset_id].accuracy for dataset_id in dataset_ids]
+            dataset_upload_dates = [datasets[dataset_id].upload_date for dataset_id in dataset_ids]
+            dataset_versions = [datasets[dataset_id].version for dataset_id in dataset_ids]
+            dataset_descriptions = [datasets[dataset_id].description for dataset_id in dataset_ids]
             
             st.success("Search completed!")
 
@@ -1,14 +1,17 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-from database.database import get_db
+from database.database import get_db, get_read_db
 from database.db_operations import (
     get_selected_datasets,
     delete_selected_dataset,
     update_selected_dataset,
-    get_dataset_by_id
+    get_datasets_by_ids,
+    DATASET_FILE_COLUMNS
 )
+from database.downloads import dataset_download_url, download_links_enabled, read_dataset_download
 import io
+from pages.pagination import keyset_pager
 
 def delete_model_dataset(selected_id: int):
     try:
@@ -55,17 +58,27 @@ def modify_model_dataset(row_data):
         if 'db' in locals():
             db.close()
 
-def download_dataset_file(dataset_name: str, dataset_id: int):
+def download_dataset_file(dataset_name: str, dataset_id: int, dataset=None):
     try:
-        db = next(get_db())
-        dataset = get_dataset_by_id(db, dataset_id)
-        if dataset and dataset.file_data:
-            # Create download button
+        if dataset is None:
+            db = next(get_read_db())
+            dataset = get_datasets_by_ids(db, [dataset_id], DATASET_FILE_COLUMNS).get(int(dataset_id))
+        if dataset and download_links_enabled():
+            # Signed links to the download server: the file is only read, in chunks, when clicked
+            col_raw, col_gzip = st.columns(2)
+            with col_raw:
+                st.link_button("Download Dataset", dataset_download_url(dataset.id))
+            with col_gzip:
+                st.link_button("Download compressed (.gz)", dataset_download_url(dataset.id, compressed=True))
+        elif dataset:
+            # No public download server: the file is read when the button is clicked
+            dataset_id = dataset.id
             st.download_button(
                 label="Download Dataset",
-                data=dataset.file_data,
+                data=lambda: read_dataset_download(dataset_id),
                 file_name=dataset.file_name,
-                mime="application/octet-stream"
+                mime="application/octet-stream",
+                key=f"download_dataset_{dataset_id}"
             )
         else:
             st.error("Dataset file not found")
@@ -82,18 +95,25 @@ def selected_datasets():
 
     try:
         # Get database session
-        db = next(get_db())
+        db = next(get_read_db())
         
-        # Get all selected datasets
-        selected_datasets_list = get_selected_datasets(db)
+        # Get one page of the selected datasets
+        selected_datasets_list, first_row = keyset_pager(
+            "selected_page_cursors",
+            lambda after_id, limit: get_selected_datasets(db, after_id=after_id, limit=limit)
+        )
         
         if not selected_datasets_list:
             st.info("No datasets have been selected yet.")
             return
 
+        # File locations of every selected dataset, in one query
+        datasets = get_datasets_by_ids(
+            db, [selected.dataset_id for selected in selected_datasets_list], DATASET_FILE_COLUMNS)
+
         # Convert to DataFrame
         df = pd.DataFrame([{
-            "Sr. No.": idx + 1,
+            "Sr. No.": first_row + idx + 1,
             "id": dataset.id,
             "model Id": dataset.model_id,
             "model Name": dataset.model_name,
@@ -132,7 +152,7 @@ def selected_datasets():
                     elif action == "modify":
                         modify_model_dataset(row)
                     elif action == "download dataset":
-                        download_dataset_file(row["dataset Name"], row["dataset Id"])
+                        download_dataset_file(row["dataset Name"], row["dataset Id"], datasets.get(int(row["dataset Id"])))
 
     except Exception as e:
         st.error(f"Error loading selected datasets: {str(e)}")
@@ -0,0 +1,55 @@
+import time
+import streamlit as st
+from sqlalchemy.orm import Session
+from typing import NamedTuple, Optional
+from database.db_operations import (
+    CachedUser,
+    USER_CACHE_TTL,
+    get_cached_user_by_email,
+    upsert_user,
+    user_cache_generation
+)
+
+SESSION_KEY = "current_user"
+
+class _SessionUser(NamedTuple):
+    user: CachedUser
+    generation: int
+    expires_at: float
+
+def _remember(user: CachedUser) -> CachedUser:
+    st.session_state[SESSION_KEY] = _SessionUser(user, user_cache_generation(), time.monotonic() + USER_CACHE_TTL)
+    return user
+
+def _remembered_user() -> Optional[CachedUser]:
+    entry = st.session_state.get(SESSION_KEY)
+    if (entry is None or entry.user.email != st.user.email
+            or entry.generation != user_cache_generation() or entry.expires_at < time.monotonic()):
+        return None
+    return entry.user
+
+def login_user(db: Session) -> Optional[CachedUser]:
+    """Create or update the signed-in user, once per browser session."""
+    user = _remembered_user()
+    if user is not None:
+        return user
+    if st.session_state.get(f"{SESSION_KEY}_login") == st.user.email:
+        return get_current_user(db)
+    user = upsert_user(
+        db=db,
+        username=st.user.email.split('@')[0],  # Use email prefix as username
+        email=st.user.email,
+        password_hash="oauth_user",  # OAuth users don't need password
+        first_name=st.user.first_name if hasattr(st.user, 'first_name') else None,
+        last_name=st.user.last_name if hasattr(st.user, 'last_name') else None
+    )
+    st.session_state[f"{SESSION_KEY}_login"] = st.user.email
+    return _remember(user)
+
+def get_current_user(db: Session) -> Optional[CachedUser]:
+    """The signed-in user, from the session state, the process cache or the database."""
+    user = _remembered_user()
+    if user is not None:
+        return user
+    user = get_cached_user_by_email(db, str(st.user.email))
+    return _remember(user) if user is not None else None
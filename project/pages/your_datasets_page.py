@@ -1,23 +1,37 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-from database.database import get_db
+from database.database import get_db, get_read_db, get_write_db
 from database.db_operations import (
     create_dataset, 
-    save_file_data, 
     get_all_datasets, 
-    get_user_by_email, 
-    get_user_datasets, 
+    get_dataset_summaries, 
     update_dataset_visibility,
     delete_dataset,
     update_dataset,
-    get_dataset_by_id
+    get_dataset_by_id,
+    get_datasets_by_ids,
+    get_dataset_preview,
+    query_dataset_file_opener,
+    DATASET_DETAIL_COLUMNS
 )
-from io import StringIO, BytesIO
+from database.ingest import ingest_table
+from pages.pagination import keyset_pager
+from pages.session_user import get_current_user
 from datetime import datetime
 from database.models import Dataset
-import os
-import time
+from database.job_queue import (
+    ACTIVE_STATUSES,
+    CONTAMINATION_JOB,
+    DEAD,
+    QUEUED,
+    RUNNING,
+    contamination_dedupe_key,
+    enqueue_contamination,
+    enqueue_pending_contamination,
+    get_job_counts,
+    get_latest_job
+)
 
 
 def is_valid_dataset_file(file) -> bool:
@@ -62,9 +76,6 @@ def dataset_upload_handler():
                 return
 
             try:
-                # Get file data
-                file_data, file_size = save_file_data(dataset_file)
-                
                 # Get database session
                 db = next(get_db())
                 
@@ -74,27 +85,16 @@ def dataset_upload_handler():
                     return
                     
                 # Get current user's ID
-                current_user = get_user_by_email(db, st.user.email)
+                current_user = get_current_user(db)
                 if not current_user:
                     st.error("User not found in database. Please try logging out and back in.")
                     return
                 
-                # Try to read the file to validate its content
+                # Store the file and compute its metadata in a single pass, which also validates its content
                 try:
-                    if dataset_file.name.lower().endswith('.csv'):
-                        df = pd.read_csv(StringIO(dataset_file.getvalue().decode('utf-8')))
-                    else:  # Excel file
-                        df = pd.read_excel(BytesIO(dataset_file.getvalue()), sheet_name=0)
-                    
-                    # Get basic dataset statistics for metadata
-                    dataset_metadata = {
-                        "columns": df.columns.tolist(),
-                        "rows": len(df),
-                        "column_types": {col: str(dtype) for col, dtype in df.dtypes.items()},
-                        "missing_values": df.isnull().sum().to_dict()
-                    }
-                except Exception as e:
-                    st.error(f"Error reading file: {str(e)}. Please make sure the file is properly formatted.")
+                    ingested = ingest_table(db, dataset_file, dataset_file.name)
+                except ValueError as e:
+                    st.error(f"{str(e)}. Please make sure the file is properly formatted.")
                     return
                 
                 # Create dataset in database with current user's ID
@@ -104,12 +104,13 @@ def dataset_upload_handler():
                     owner_id=current_user.id,
                     version=version,
                     description=description,
-                    file_data=file_data,
+                    file_data=ingested.file,
                     file_name=dataset_file.name,
                     file_type=dataset_file.type,
-                    file_size=file_size,
-                    dataset_metadata=dataset_metadata,
-                    is_public=False  # Default to private
+                    file_size=ingested.file.size,
+                    dataset_metadata=ingested.metadata,
+                    is_public=False,  # Default to private
+                    parquet_data=ingested.parquet
                 )
                 
                 st.success(f"Dataset {dataset_name} (version {version}) uploaded successfully!")
@@ -126,7 +127,9 @@ def dataset_upload_handler():
                 if 'db' in locals():
                     db.close()
 
-def dataset_operations(loc):
+def dataset_operations(loc, datasets=None):
+    """Run the operation selected on a row; datasets holds details prefetched by id."""
+    datasets = datasets or {}
     try:
         operation = st.session_state["dataset_df"].loc[loc]["view"]
         dataset_id = int(st.session_state["dataset_df"].loc[loc]["Dataset Id"])
@@ -134,7 +137,7 @@ def dataset_operations(loc):
         def view_dataset(dataset_id: int):
             try:
                 db = next(get_db())
-                dataset = get_dataset_by_id(db, dataset_id)
+                dataset = datasets.get(dataset_id) or get_dataset_by_id(db, dataset_id)
                 
                 if dataset:
                     st.subheader(f"Dataset Details: {dataset.name}")
@@ -162,15 +165,37 @@ def dataset_operations(loc):
                                 st.write(f"- **Contamination:** {dataset.contamination:.2%}")
                                 st.write(f"- **Accuracy:** {dataset.accuracy:.2f}%")
                             else:
-                                if st.button("Calculate Contamination", key=f"calc_contamination_{dataset_id}"):
-                                    try:
-                                        # Run the calculation in the background
-                                        cmd = f"python calculate_contamination.py --dataset_id {dataset_id}"
-                                        st.info("Starting contamination calculation. This may take a few moments...")
-                                        os.system(cmd)
-                                        st.success("Contamination calculation started. Please refresh the page in a few moments to see the results.")
-                                    except Exception as e:
-                                        st.error(f"Error starting contamination calculation: {str(e)}")
+                                # The calculation runs in the batch workers; the page only enqueues and reads status
+                                job = get_latest_job(db, contamination_dedupe_key(dataset_id))
+                                if job is not None and job.status in ACTIVE_STATUSES:
+                                    st.info(f"Contamination calculation is {job.status} (attempt {job.attempts} of {job.max_attempts}).")
+                                else:
+                                    if job is not None and job.status == DEAD:
+                                        st.error(f"The last contamination calculation failed after {job.attempts} attempts.")
+                                    if st.button("Calculate Contamination", key=f"calc_contamination_{dataset_id}"):
+                                        try:
+                                            enqueue_contamination(db, dataset_id)
+                                            st.success("Contamination calculation queued. Please refresh the page in a few moments to see the results.")
+                                        except Exception as e:
+                                            st.error(f"Error queuing contamination calculation: {str(e)}")
+
+                    try:
+                        # Files still stored in the row are read with a query of their own, on a cache miss only
+                        open_file = None if dataset.parquet_digest else query_dataset_file_opener(db, dataset)
+                        preview = get_dataset_preview(dataset, open_file=open_file)
+                        st.write("**Preview**")
+                        tab_head, tab_sample = st.tabs(["First rows", "Random sample"])
+                        with tab_head:
+                            st.dataframe(preview.head, hide_index=True)
+                        with tab_sample:
+                            if preview.sample is not None:
+                                st.dataframe(preview.sample, hide_index=True)
+                                if preview.total_rows is not None:
+                                    st.caption(f"{len(preview.sample)} of {preview.total_rows} rows")
+                            else:
+                                st.info("A random sample is available once the Parquet copy of this dataset is made.")
+                    except Exception as e:
+                        st.error(f"Error loading dataset preview: {str(e)}")
                 else:
                     st.error("Dataset not found!")
             except Exception as e:
@@ -197,7 +222,7 @@ def dataset_operations(loc):
         def reupload_dataset(dataset_id: int):
             try:
                 db = next(get_db())
-                dataset = get_dataset_by_id(db, dataset_id)
+                dataset = datasets.get(dataset_id) or get_dataset_by_id(db, dataset_id)
                 
                 if not dataset:
                     st.error("Dataset not found!")
@@ -225,36 +250,23 @@ def dataset_operations(loc):
                             return
                             
                         try:
-                            # Get file data
-                            file_data, file_size = save_file_data(dataset_file)
-                            
-                            # Try to read the file to validate its content
+                            # Store the file and compute its metadata in a single pass, which also validates its content
                             try:
-                                if dataset_file.name.lower().endswith('.csv'):
-                                    df = pd.read_csv(StringIO(dataset_file.getvalue().decode('utf-8')))
-                                else:  # Excel file
-                                    df = pd.read_excel(BytesIO(dataset_file.getvalue()))
-                                
-                                # Get basic dataset statistics for metadata
-                                dataset_metadata = {
-                                    "columns": df.columns.tolist(),
-                                    "rows": len(df),
-                                    "column_types": {col: str(dtype) for col, dtype in df.dtypes.items()},
-                                    "missing_values": df.isnull().sum().to_dict()
-                                }
-                            except Exception as e:
-                                st.error(f"Error reading file: {str(e)}. Please make sure the file is properly formatted.")
+                                ingested = ingest_table(db, dataset_file, dataset_file.name)
+                            except ValueError as e:
+                                st.error(f"{str(e)}. Please make sure the file is properly formatted.")
                                 return
                             
                             # Update the dataset in the database
                             updated_dataset = update_dataset(
                                 db=db,
                                 dataset_id=dataset_id,
-                                file_data=file_data,
+                                file_data=ingested.file,
                                 file_name=dataset_file.name,
                                 file_type=dataset_file.type,
-                                file_size=file_size,
-                                dataset_metadata=dataset_metadata
+                                file_size=ingested.file.size,
+                                dataset_metadata=ingested.metadata,
+                                parquet_data=ingested.parquet
                             )
                             
                             if updated_dataset:
@@ -301,9 +313,6 @@ def dataset_visibility_change(loc):
         # Get database session
         db = next(get_db())
         
-        # Start a new transaction
-        db.begin()
-        
         try:
             # Update visibility in database
             is_public = visibility == "public"
@@ -338,7 +347,7 @@ def your_datasets():
 
     try:
         # Get database session
-        db = next(get_db())
+        db = next(get_read_db())
         
         # Check if user is logged in
         if not st.user.is_logged_in:
@@ -346,20 +355,23 @@ def your_datasets():
             return
             
         # Get current user's ID
-        current_user = get_user_by_email(db, st.user.email)
+        current_user = get_current_user(db)
         if not current_user:
             st.error("User not found in database. Please try logging out and back in.")
             return
 
-        # Get user's datasets
-        datasets = get_user_datasets(db, current_user.id)
+        # Get one page of the user's datasets without their files
+        datasets, first_row = keyset_pager(
+            "dataset_page_cursors",
+            lambda after_id, limit: get_dataset_summaries(db, owner_id=current_user.id, after_id=after_id, limit=limit)
+        )
         
         if not datasets:
             st.info("You haven't uploaded any datasets yet.")
         else:
             # Convert datasets to DataFrame
             df = pd.DataFrame([{
-                "Sr. No.": idx + 1,
+                "Sr. No.": first_row + idx + 1,
                 "Dataset Id": dataset.id,
                 "Dataset name": dataset.name,
                 "Description": dataset.description,
@@ -399,7 +411,7 @@ def your_datasets():
                     )
                 },
                 hide_index=True,
-                key="dataset_editor"
+                key=f"dataset_editor_{first_row}"  # Edits must not carry over to another page
             )
 
             # Store only necessary columns in session state
@@ -407,6 +419,9 @@ def your_datasets():
 
             # Process any changes
             if edited_df is not None:
+                # Details of every dataset with an operation selected, in one query
+                details = get_datasets_by_ids(
+                    db, edited_df.loc[edited_df["view"].notna(), "Dataset Id"], DATASET_DETAIL_COLUMNS)
                 for i in range(len(edited_df)):
                     current_visibility = edited_df.loc[i, "visibility"]
                     dataset_id = edited_df.loc[i, "Dataset Id"]
@@ -415,11 +430,12 @@ def your_datasets():
                     if (
                         "previous_dataset_df" in st.session_state 
                         and i < len(st.session_state["previous_dataset_df"])
+                        and st.session_state["previous_dataset_df"].loc[i, "Dataset Id"] == dataset_id
                         and st.session_state["previous_dataset_df"].loc[i, "visibility"] != current_visibility
                     ):
                         dataset_visibility_change(i)
                     
-                    dataset_operations(i)
+                    dataset_operations(i, details)
 
             # Store current state for next comparison
             st.session_state["previous_dataset_df"] = edited_df.copy()
@@ -437,26 +453,22 @@ def your_datasets():
     with col1:
         if st.button("Calculate accuracy", key="calc_all_contamination"):
             try:
-                import subprocess
-                st.info("Starting contamination calculation for all datasets. This may take a few moments...")
-
-                project_path = os.getcwd()
-                batch_prg = os.path.join(project_path, "batch", "calculate_contamination.py")
-                venv_path = os.path.join(project_path, "..", ".venv", "Scripts", "python.exe")
-                subprocess.run([venv_path, batch_prg])
-
-                st.toast("Batch contamination calculation has ended. Please refresh the page in a few moments to see the results.")
-                time.sleep(1)
-                st.rerun()
+                db = next(get_write_db())
+                pending = enqueue_pending_contamination(db)
+                st.toast(f"{pending} datasets queued for contamination calculation.")
             except Exception as e:
-                st.error(f"Error starting batch contamination calculation: {str(e)}")
-
-def test():
-    import os
-    import subprocess
-    project_path = os.getcwd()
-    batch_prg = os.path.join(project_path, "batch", "calculate_contamination.py")
-    venv_path = os.path.join(project_path, "..", ".venv", "Scripts", "python.exe")
-    # print(venv_path)
-    # print(batch_prg)
-    subprocess.run([venv_path, batch_prg])
+                st.error(f"Error queuing batch contamination calculation: {str(e)}")
+            finally:
+                if 'db' in locals():
+                    db.close()
+    with col2:
+        try:
+            db = next(get_read_db())
+            counts = get_job_counts(db, CONTAMINATION_JOB)
+            if counts[QUEUED] or counts[RUNNING]:
+                st.caption(f"Contamination jobs: {counts[QUEUED]} queued, {counts[RUNNING]} running, {counts[DEAD]} failed")
+        except Exception as e:
+            st.error(f"Error reading contamination job status: {str(e)}")
+        finally:
+            if 'db' in locals():
+                db.close()
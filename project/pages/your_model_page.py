@@ -5,16 +5,18 @@ from enum import Enum
 import time
 import os
 from forms import model_upload_form
-from database.database import get_db
+from database.database import get_db, get_read_db
 from database.db_operations import (
     create_ai_model, 
     save_file_data, 
     get_ai_model_by_id, 
-    get_all_ai_models, 
-    get_user_by_email,
+    get_ai_model_summaries, 
     delete_ai_model,
     update_ai_model
 )
+from database.ingest import ingest_table
+from pages.pagination import keyset_pager
+from pages.session_user import get_current_user
 
 
 @st.dialog("upload model")
@@ -59,37 +61,6 @@ def model_upload_handler():
                     # Get model file data
                     model_data, model_size = save_file_data(model_file)
                     
-                    # Process training dataset if provided
-                    training_data_metadata = None
-                    training_data = None
-                    if training_data_set is not None:
-                        try:
-                            # Read the training data to extract metadata
-                            if training_data_set.name.endswith('.csv'):
-                                df = pd.read_csv(training_data_set)
-                            else:  # Excel file
-                                df = pd.read_excel(training_data_set)
-                            
-                            # Create metadata about the training data
-                            training_data_metadata = {
-                                'filename': training_data_set.name,
-                                'columns': df.columns.tolist(),
-                                'rows': len(df),
-                                'column_types': {col: str(dtype) for col, dtype in df.dtypes.items()},
-                                'missing_values': df.isnull().sum().to_dict()
-                            }
-
-                            if target_field not in df.columns:
-                                st.error(f"Target field '{target_field}' not found in training data.")
-                                return
-                            
-                            # Reset file pointer for saving
-                            training_data_set.seek(0)
-                            training_data, training_size = save_file_data(training_data_set)
-                        except Exception as e:
-                            st.error(f"Error processing training data: {str(e)}")
-                            return
-                    
                     # Get database session
                     db = next(get_db())
 
@@ -98,11 +69,31 @@ def model_upload_handler():
                         st.error("You must be logged in to upload models.")
                         return
                         
-                    current_user = get_user_by_email(db, st.user.email)
+                    current_user = get_current_user(db)
                     if not current_user:
                         st.error("User not found in database. Please try logging out and back in.")
                         return
                     
+                    # Process training dataset if provided
+                    training_data_metadata = None
+                    training_data = None
+                    training_parquet = None
+                    if training_data_set is not None:
+                        try:
+                            # Store the training data and extract its metadata in a single pass
+                            ingested = ingest_table(db, training_data_set, training_data_set.name)
+                        except ValueError as e:
+                            st.error(f"Error processing training data: {str(e)}")
+                            return
+
+                        if target_field not in ingested.metadata['columns']:
+                            st.error(f"Target field '{target_field}' not found in training data.")
+                            return
+
+                        training_data_metadata = {'filename': training_data_set.name, **ingested.metadata}
+                        training_data = ingested.file
+                        training_parquet = ingested.parquet
+                    
                     # Create AI model in database with current user's ID
                     model = create_ai_model(
                         db=db,
@@ -116,7 +107,8 @@ def model_upload_handler():
                         is_public=False,  # Default to private
                         training_data_set=training_data,
                         training_data_set_metadata=training_data_metadata,
-                        target_field=target_field
+                        target_field=target_field,
+                        training_parquet=training_parquet
                     )
                     
                     st.success(f"Model {model_name} (version {version}) uploaded successfully!")
@@ -238,29 +230,17 @@ def model_operation(loc: int):
                             # Process training dataset if provided
                             training_data = None
                             training_data_metadata = None
+                            training_parquet = None
                             if training_data_set is not None:
                                 try:
-                                    # Read the training data to extract metadata
-                                    if training_data_set.name.endswith('.csv'):
-                                        df = pd.read_csv(training_data_set)
-                                    else:  # Excel file
-                                        df = pd.read_excel(training_data_set)
-                                    
-                                    # Create metadata about the training data
-                                    training_data_metadata = {
-                                        'filename': training_data_set.name,
-                                        'columns': df.columns.tolist(),
-                                        'rows': len(df),
-                                        'column_types': {col: str(dtype) for col, dtype in df.dtypes.items()},
-                                        'missing_values': df.isnull().sum().to_dict()
-                                    }
-                                    
-                                    # Reset file pointer for saving
-                                    training_data_set.seek(0)
-                                    training_data, _ = save_file_data(training_data_set)
-                                except Exception as e:
+                                    # Store the training data and extract its metadata in a single pass
+                                    ingested = ingest_table(db, training_data_set, training_data_set.name)
+                                except ValueError as e:
                                     st.error(f"Error processing training data: {str(e)}")
                                     return
+                                training_data_metadata = {'filename': training_data_set.name, **ingested.metadata}
+                                training_data = ingested.file
+                                training_parquet = ingested.parquet
                             
                             # Update the model in the database
                             updated_model = update_ai_model(
@@ -271,7 +251,8 @@ def model_operation(loc: int):
                                 model_size=model_size,
                                 training_data_set=training_data,
                                 training_data_set_metadata=training_data_metadata,
-                                target_field=model.target_field
+                                target_field=model.target_field,
+                                training_parquet=training_parquet
                             )
                             
                             if updated_model:
@@ -308,20 +289,22 @@ def your_model():
 
     # Get current user and their models
     try:
-        db = next(get_db())
+        db = next(get_read_db())
         
         if not st.user.is_logged_in:
             st.error("You must be logged in to view your models.")
             return
             
-        current_user = get_user_by_email(db, st.user.email)
+        current_user = get_current_user(db)
         if not current_user:
             st.error("User not found in database. Please try logging out and back in.")
             return
         
-        # Get all models for the current user
-        models = get_all_ai_models(db)
-        user_models = [model for model in models if model.owner_id == current_user.id]
+        # Get one page of the current user's models without their files
+        user_models, first_row = keyset_pager(
+            "model_page_cursors",
+            lambda after_id, limit: get_ai_model_summaries(db, owner_id=current_user.id, after_id=after_id, limit=limit)
+        )
         
         if not user_models:
             st.info("You haven't uploaded any models yet.")
@@ -329,7 +312,7 @@ def your_model():
             # Convert models to DataFrame
             df = pd.DataFrame(
                 {
-                    "Sr. No.": range(1, len(user_models) + 1),
+                    "Sr. No.": range(first_row + 1, first_row + len(user_models) + 1),
                     "Model Id": [model.id for model in user_models],
                     "Model Name": [model.name for model in user_models],
                     "Description": [model.description for model in user_models],
@@ -0,0 +1,42 @@
+import sys
+import os
+
+# Add project root to Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from database.database import get_db
+from database.db_operations import get_dataset_by_id, get_dataset_file, get_unhashed_dataset_ids, record_contamination
+from database.hashing import content_hash
+
+def backfill_content_hashes():
+    """Store the content hash of datasets uploaded before hashes were recorded.
+
+    Existing contamination values are taken as computed from the current bytes
+    and seed the memo, so identical datasets reuse them.
+    """
+    db = next(get_db())
+    try:
+        dataset_ids = get_unhashed_dataset_ids(db)
+        print(f"Found {len(dataset_ids)} datasets without a content hash")
+        for dataset_id in dataset_ids:
+            dataset = get_dataset_by_id(db, dataset_id)
+            try:
+                dataset.content_hash = dataset.file_digest or content_hash(get_dataset_file(dataset))
+                if dataset.contamination is not None:
+                    dataset.contamination_hash = dataset.content_hash
+                    db.flush()
+                    record_contamination(db, dataset.content_hash, dataset.contamination)
+                db.commit()
+                print(f"Dataset {dataset.id} ({dataset.name}): {dataset.content_hash[:12]}")
+            except Exception as e:
+                db.rollback()
+                print(f"Error hashing dataset {dataset_id}: {str(e)}")
+            finally:
+                db.expunge(dataset)  # Release the file blob before the next dataset
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    backfill_content_hashes()
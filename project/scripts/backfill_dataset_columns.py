@@ -0,0 +1,56 @@
+import pandas as pd
+from io import BytesIO
+from contextlib import closing
+import sys
+import os
+
+# Add project root to Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from database.database import Base, engine, get_db
+from database.db_operations import (
+    get_dataset_by_id,
+    open_dataset_file,
+    get_unindexed_dataset_ids,
+    index_dataset_columns,
+    column_types_from_metadata
+)
+
+def read_column_types(dataset) -> dict:
+    """Read column names and dtypes from the stored file when upload metadata is missing."""
+    with closing(open_dataset_file(dataset)) as f:
+        if dataset.file_name.lower().endswith('.csv'):
+            # A small sample is enough to infer dtypes without reading the whole file
+            df = pd.read_csv(f, nrows=1000)
+        else:  # Excel file
+            df = pd.read_excel(BytesIO(f.read()), sheet_name=0, nrows=1000)
+    return {str(col): str(dtype) for col, dtype in df.dtypes.items()}
+
+def backfill_dataset_columns():
+    """Fill the dataset_columns index for datasets uploaded before it existed."""
+    Base.metadata.create_all(bind=engine)
+    db = next(get_db())
+    try:
+        dataset_ids = get_unindexed_dataset_ids(db)
+        print(f"Found {len(dataset_ids)} datasets without a column index")
+        for dataset_id in dataset_ids:
+            dataset = get_dataset_by_id(db, dataset_id)
+            try:
+                column_types = column_types_from_metadata(dataset.dataset_metadata)
+                if not column_types:
+                    column_types = read_column_types(dataset)
+                index_dataset_columns(db, dataset.id, column_types)
+                db.commit()
+                print(f"Dataset {dataset.id} ({dataset.name}): indexed {len(column_types)} columns")
+            except Exception as e:
+                db.rollback()
+                print(f"Error indexing dataset {dataset.id}: {str(e)}")
+            finally:
+                db.expunge(dataset)  # Release the file blob before the next dataset
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    backfill_dataset_columns()
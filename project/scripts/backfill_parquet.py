@@ -0,0 +1,65 @@
+import sys
+import os
+
+# Add project root to Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from contextlib import closing
+from database.database import get_db
+from database.models import AIModels, Dataset
+from database.db_operations import open_dataset_file, open_training_data
+from database.blob_store import store_blob
+from database.columnar import dataframe_to_parquet, parse_table
+
+def backfill_dataset_parquet(db) -> int:
+    """Create the Parquet copy of datasets uploaded before copies were made."""
+    dataset_ids = [row[0] for row in db.query(Dataset.id).filter(Dataset.parquet_digest.is_(None)).all()]
+    print(f"Found {len(dataset_ids)} datasets without a Parquet copy")
+    converted = 0
+    for dataset_id in dataset_ids:
+        dataset = db.get(Dataset, dataset_id)
+        try:
+            with closing(open_dataset_file(dataset)) as f:
+                df = parse_table(dataset.file_name, f)
+            dataset.parquet_digest = store_blob(db, dataframe_to_parquet(df))[0]
+            db.commit()
+            converted += 1
+            print(f"Dataset {dataset.id} ({dataset.name}): {len(df)} rows")
+        except Exception as e:
+            db.rollback()
+            print(f"Error converting dataset {dataset_id}: {str(e)}")
+        finally:
+            db.expunge(dataset)
+    return converted
+
+def backfill_training_parquet(db) -> int:
+    """Create the Parquet copy of training data uploaded before copies were made."""
+    model_ids = [row[0] for row in db.query(AIModels.id).filter(AIModels.training_parquet_digest.is_(None)).all()]
+    print(f"Found {len(model_ids)} models without a Parquet copy of their training data")
+    converted = 0
+    for model_id in model_ids:
+        model = db.get(AIModels, model_id)
+        try:
+            file_name = (model.training_data_set_metadata or {}).get('filename', 'training.csv')
+            with closing(open_training_data(model)) as f:
+                df = parse_table(file_name, f)
+            model.training_parquet_digest = store_blob(db, dataframe_to_parquet(df))[0]
+            db.commit()
+            converted += 1
+            print(f"Model {model.id} ({model.name}): {len(df)} rows")
+        except Exception as e:
+            db.rollback()
+            print(f"Error converting model {model_id}: {str(e)}")
+        finally:
+            db.expunge(model)
+    return converted
+
+if __name__ == "__main__":
+    db = next(get_db())
+    try:
+        backfill_dataset_parquet(db)
+        backfill_training_parquet(db)
+    finally:
+        db.close()
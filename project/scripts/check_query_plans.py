@@ -0,0 +1,92 @@
+import sys
+import os
+
+# Add project root to Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+import argparse
+import json
+from datetime import datetime, UTC
+from typing import Dict, List
+from sqlalchemy import or_, select
+from sqlalchemy.sql import Select
+from database.database import Base, engine
+from database.db_operations import contamination_is_stale
+from database.models import AIModels, Blob, Dataset, DatasetColumn, SelectedDataset, Subscription, User
+
+# Hot lookup paths of the pages and batch jobs, with representative parameters
+KNOWN_QUERIES: Dict[str, Select] = {
+    "user by email": select(User.id).where(User.email == "user@example.com"),
+    "datasets by owner": select(Dataset.id, Dataset.name).where(Dataset.owner_id == 1),
+    "visible datasets": select(Dataset.id).where(or_(Dataset.is_public.is_(True), Dataset.owner_id == 1)),
+    "models by owner": select(AIModels.id, AIModels.name).where(AIModels.owner_id == 1),
+    "selected datasets by model": select(SelectedDataset.id).where(SelectedDataset.model_id == 1),
+    "subscriptions by user": select(Subscription.id).where(Subscription.user_id == 1),
+    "subscriptions by model": select(Subscription.id).where(Subscription.ai_model_id == 1),
+    "datasets by feature": select(DatasetColumn.dataset_id).where(DatasetColumn.feature_name == "age"),
+    "pending contamination": select(Dataset.id, Dataset.file_size).where(Dataset.contamination.is_(None)),
+    "stale contamination": select(Dataset.id, Dataset.file_size, Dataset.content_hash).where(contamination_is_stale()),
+    "datasets by content hash": select(Dataset.id).where(Dataset.content_hash == "0" * 64),
+    "models by training data digest": select(AIModels.id).where(AIModels.training_data_digest == "0" * 64),
+    "unreferenced blobs": select(Blob.digest).where(Blob.ref_count == 0, Blob.released_at <= datetime.now(UTC)),
+}
+
+def sqlite_full_scans(connection, statement: Select) -> List[str]:
+    compiled = statement.compile(dialect=connection.dialect)
+    rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", tuple(
+        compiled.params[name] for name in compiled.positiontup)).all()
+    for row in rows:
+        print(f"    {row[-1]}")
+    # "SCAN table" reads every row and "SCAN table USING INDEX" every index entry,
+    # unless the index is partial and only holds the rows the query is after
+    partial = {
+        index.name for table in Base.metadata.sorted_tables for index in table.indexes
+        if index.dialect_options["sqlite"]["where"] is not None
+    }
+    return [
+        detail for detail in (row[-1] for row in rows)
+        if detail.startswith("SCAN ") and detail.split(" INDEX ")[-1] not in partial
+    ]
+
+def postgresql_full_scans(connection, statement: Select) -> List[str]:
+    compiled = statement.compile(dialect=connection.dialect)
+    # Small test tables are cheaper to scan; make the planner use an index whenever it can
+    connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+    plan = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params).scalar()
+    plan = json.loads(plan) if isinstance(plan, str) else plan
+    scans = []
+    nodes = [plan[0]["Plan"]]
+    while nodes:
+        node = nodes.pop()
+        print(f"    {node['Node Type']} {node.get('Relation Name', '')} {node.get('Index Name', '')}".rstrip())
+        if node["Node Type"] == "Seq Scan":
+            scans.append(f"Seq Scan on {node['Relation Name']}")
+        nodes.extend(node.get("Plans", []))
+    return scans
+
+def check_query_plans() -> bool:
+    """Explain every known query and report those falling back to a full table scan."""
+    full_scans = sqlite_full_scans if engine.dialect.name == "sqlite" else postgresql_full_scans
+    failures = {}
+    with engine.connect() as connection:
+        for name, statement in KNOWN_QUERIES.items():
+            print(f"{name}:")
+            with connection.begin():
+                scans = full_scans(connection, statement)
+            if scans:
+                failures[name] = scans
+    if failures:
+        print(f"\n{len(failures)} queries fall back to a full scan:")
+        for name, scans in failures.items():
+            print(f"  {name}: {'; '.join(scans)}")
+        return False
+    print(f"\nAll {len(KNOWN_QUERIES)} queries use an index")
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Fail if a known query plan falls back to a full table scan. Run after create_tables.")
+    parser.parse_args()
+    sys.exit(0 if check_query_plans() else 1)
@@ -0,0 +1,31 @@
+import sys
+import os
+
+# Add project root to Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+import argparse
+from database.database import get_write_db
+from database.blob_store import GC_GRACE_SECONDS, collect_garbage, track_orphaned_blobs
+
+def collect_blobs(grace_seconds: int = GC_GRACE_SECONDS, orphans: bool = False):
+    """Delete unreferenced blobs, optionally tracking stored files without a row first."""
+    db = next(get_write_db())
+    try:
+        if orphans:
+            print(f"{track_orphaned_blobs(db, grace_seconds)} orphaned files registered for collection")
+        print(f"{collect_garbage(db, grace_seconds)} unreferenced blobs deleted")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Delete blobs that are no longer referenced.")
+    parser.add_argument("--grace-seconds", type=int, default=GC_GRACE_SECONDS,
+                        help="keep blobs unreferenced for less than this long")
+    parser.add_argument("--orphans", action="store_true",
+                        help="also register stored files without a row, e.g. from failed uploads; "
+                             "they are deleted by a later run once the grace period has passed")
+    args = parser.parse_args()
+    collect_blobs(args.grace_seconds, args.orphans)
@@ -0,0 +1,31 @@
+import sys
+import os
+
+# Add project root to Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+import argparse
+import logging
+from database.downloads import DOWNLOAD_HOST, DOWNLOAD_PORT, create_download_server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Serve signed dataset download links. Set the same NSQAS_DOWNLOAD_SECRET as the app, "
+                    "and on the app processes NSQAS_DOWNLOAD_BASE_URL to this server's public URL "
+                    "and NSQAS_DOWNLOAD_EMBEDDED=0.")
+    parser.add_argument("--host", default=DOWNLOAD_HOST, help="interface to listen on")
+    parser.add_argument("--port", type=int, default=DOWNLOAD_PORT, help="port to listen on")
+    args = parser.parse_args()
+    if not os.environ.get("NSQAS_DOWNLOAD_SECRET"):
+        parser.error("NSQAS_DOWNLOAD_SECRET must be set so that the app and this server sign links alike")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    server = create_download_server(args.host, args.port)
+    logging.info(f"Serving downloads on {args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
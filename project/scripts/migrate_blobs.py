@@ -0,0 +1,82 @@
+import sys
+import os
+
+# Add project root to Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+import argparse
+from sqlalchemy import text
+from database.database import engine, get_db
+from database.models import AIModels, Dataset
+from database.blob_store import store_blob
+
+def migrate_datasets(db) -> int:
+    """Move dataset files still stored in their rows to the blob store."""
+    dataset_ids = [row[0] for row in db.query(Dataset.id).filter(Dataset.file_digest.is_(None)).all()]
+    print(f"Found {len(dataset_ids)} datasets with inline files")
+    migrated = 0
+    for dataset_id in dataset_ids:
+        dataset = db.get(Dataset, dataset_id)
+        try:
+            dataset.file_digest, dataset.file_size = store_blob(db, dataset.file_data)
+            if dataset.content_hash is None:
+                dataset.content_hash = dataset.file_digest
+            dataset.file_data = b""
+            db.commit()
+            migrated += 1
+            print(f"Dataset {dataset.id} ({dataset.name}): {dataset.file_digest[:12]}, {dataset.file_size} bytes")
+        except Exception as e:
+            db.rollback()
+            print(f"Error migrating dataset {dataset_id}: {str(e)}")
+        finally:
+            db.expunge(dataset)  # Release the file blob before the next dataset
+    return migrated
+
+def migrate_models(db) -> int:
+    """Move model files and training data still stored in their rows to the blob store."""
+    model_ids = [row[0] for row in db.query(AIModels.id).filter(
+        (AIModels.model_digest.is_(None)) | (AIModels.training_data_digest.is_(None))
+    ).all()]
+    print(f"Found {len(model_ids)} models with inline files")
+    migrated = 0
+    for model_id in model_ids:
+        model = db.get(AIModels, model_id)
+        try:
+            if model.model_digest is None:
+                model.model_digest, model.model_size = store_blob(db, model.model_data)
+                model.model_data = b""
+            if model.training_data_digest is None and model.training_data_set:
+                model.training_data_digest, model.training_data_size = store_blob(db, model.training_data_set)
+                model.training_data_set = b""
+            db.commit()
+            migrated += 1
+            print(f"Model {model.id} ({model.name}): migrated")
+        except Exception as e:
+            db.rollback()
+            print(f"Error migrating model {model_id}: {str(e)}")
+        finally:
+            db.expunge(model)
+    return migrated
+
+def migrate_blobs(vacuum: bool = False):
+    """Move every inline file to the blob store, leaving only digests and sizes in the rows."""
+    db = next(get_db())
+    try:
+        datasets = migrate_datasets(db)
+        ai_models = migrate_models(db)
+        print(f"Migrated {datasets} datasets and {ai_models} models")
+    finally:
+        db.close()
+    if vacuum and engine.dialect.name == "sqlite":
+        # Emptied blob columns only free pages; VACUUM shrinks the file
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.execute(text("VACUUM"))
+        print("Database vacuumed")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move file contents from the database into the blob store.")
+    parser.add_argument("--vacuum", action="store_true", help="shrink the SQLite file afterwards")
+    args = parser.parse_args()
+    migrate_blobs(args.vacuum)
@@ -1,30 +1,39 @@
 import sqlite3
 import os
+import argparse
 
-def reset_contamination():
+def reset_contamination(purge_memo: bool = False):
     # Connect to the database
     db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'project.db')
     print(f"Looking for database at: {db_path}")
-    
+
     if not os.path.exists(db_path):
         print(f"Database file not found at {db_path}")
         return
-        
+
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
-    
-    # Reset contamination values to NULL
-    cursor.execute("UPDATE datasets SET contamination = NULL")
+
+    # Reset contamination values to NULL. The memo of results per content hash is
+    # kept, so the batch only recomputes datasets whose content changed.
+    cursor.execute("UPDATE datasets SET contamination = NULL, contamination_hash = NULL")
+    if purge_memo:
+        cursor.execute("DELETE FROM contamination_results")
+        print("Purged the contamination memo; every dataset will be recomputed")
     conn.commit()
-    
+
     # Verify the update
     cursor.execute("SELECT id, name, contamination FROM datasets")
     rows = cursor.fetchall()
     print(f"\nReset {len(rows)} datasets:")
     for row in rows:
         print(f"Dataset {row[0]} ({row[1]}): contamination = {row[2]}")
-    
+
     conn.close()
 
 if __name__ == "__main__":
-    reset_contamination() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Reset contamination values.")
+    parser.add_argument("--purge-memo", action="store_true",
+                        help="also forget memoized results so unchanged datasets are recomputed too")
+    args = parser.parse_args()
+    reset_contamination(args.purge_memo)
@@ -0,0 +1,51 @@
+import sys
+import os
+
+# Add project root to Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+import argparse
+from tabulate import tabulate
+from database.database import get_read_db
+from database.db_operations import get_storage_summary
+from database.models import AIModels, Blob, Dataset
+
+def _megabytes(size: int) -> str:
+    return f"{size / 1024 ** 2:.2f} MB"
+
+def storage_report(top: int = 10):
+    """Print the space saved by storing identical uploads once, and the most shared files."""
+    db = next(get_read_db())
+    try:
+        summary = get_storage_summary(db)
+        print(tabulate([
+            ["Stored blobs", summary.blobs],
+            ["Shared blobs", summary.shared_blobs],
+            ["Stored", _megabytes(summary.stored_bytes)],
+            ["Without deduplication", _megabytes(summary.referenced_bytes)],
+            ["Saved", _megabytes(summary.bytes_saved)],
+        ], tablefmt="grid"))
+
+        shared = db.query(Blob.digest, Blob.size, Blob.ref_count).filter(Blob.ref_count > 1).order_by(
+            (Blob.size * (Blob.ref_count - 1)).desc()).limit(top).all()
+        if not shared:
+            return
+        rows = []
+        for digest, size, ref_count in shared:
+            datasets = db.query(Dataset.id).filter(Dataset.file_digest == digest).count()
+            training_sets = db.query(AIModels.id).filter(AIModels.training_data_digest == digest).count()
+            rows.append([digest[:12], _megabytes(size), ref_count, datasets, training_sets,
+                         _megabytes(size * (ref_count - 1))])
+        print("\nMost shared files:")
+        print(tabulate(rows, headers=["Digest", "Size", "References", "Datasets", "Training sets", "Saved"],
+                       tablefmt="grid"))
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report the bytes saved by deduplicating identical uploads.")
+    parser.add_argument("--top", type=int, default=10, help="number of shared files to list")
+    args = parser.parse_args()
+    storage_report(args.top)
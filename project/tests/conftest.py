@@ -0,0 +1,22 @@
+import os
+import sys
+import tempfile
+
+# The engines are created on import, so point them at a scratch database first
+_scratch = tempfile.mkdtemp(prefix="nsqas-tests-")
+os.environ["NSQAS_DATABASE_URL"] = f"sqlite:///{os.path.join(_scratch, 'test.db')}"
+os.environ["NSQAS_BLOB_DIR"] = os.path.join(_scratch, "blobs")
+
+# Add project root to Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+import pytest
+from database.database import Base, engine
+from database.migrations import migrate
+
+@pytest.fixture(scope="session", autouse=True)
+def tables():
+    Base.metadata.create_all(bind=engine)
+    migrate(engine)
@@ -0,0 +1,35 @@
+import io
+import itertools
+import pandas as pd
+from database.blob_store import store_blob
+from database.database import get_write_db
+from database.db_operations import create_dataset, create_user, get_dataset_preview
+
+CSV = b"a,b\n1,2\n3,4\n5,6\n"
+_users = itertools.count()
+
+def test_preview_refreshed_once_the_parquet_copy_exists():
+    db = next(get_write_db())
+    try:
+        n = next(_users)
+        user = create_user(db, f"preview{n}", f"preview{n}@example.com", "hash")
+        dataset = create_dataset(db, "preview", user.id, "1.0", "preview", CSV, "preview.csv", "text/csv", len(CSV))
+        opened = []
+
+        def open_file():
+            opened.append(True)
+            return io.BytesIO(CSV)
+
+        assert get_dataset_preview(dataset, open_file=open_file).sample is None
+        assert get_dataset_preview(dataset, open_file=open_file).sample is None
+        assert len(opened) == 1  # The second preview came from the cache
+
+        parquet = io.BytesIO()
+        pd.read_csv(io.BytesIO(CSV)).to_parquet(parquet)
+        dataset.parquet_digest = store_blob(db, parquet.getvalue())[0]
+        db.commit()
+        preview = get_dataset_preview(dataset)
+        assert preview.sample is not None
+        assert preview.total_rows == 3
+    finally:
+        db.close()
@@ -0,0 +1,35 @@
+from batch.job_worker import JobHandler, run_worker
+from database.database import get_write_db
+from database.job_queue import DEAD, QUEUED, SUCCEEDED, enqueue_job, get_job
+from database.models import Job
+
+KIND = "test-batch"
+
+def _run(db, job):
+    if job.payload["fail"] == "run":
+        raise ValueError("run failed")
+    return {"value": job.payload["value"] * 2}
+
+def _apply(db, job, result):
+    if job.payload["fail"] == "apply":
+        raise ValueError("apply failed")
+    result["applied"] = True
+
+def test_batch_commits_results_and_fails_jobs_individually():
+    db = next(get_write_db())
+    try:
+        jobs = [enqueue_job(db, KIND, {"value": value, "fail": fail}, max_attempts=1)
+                for value, fail in ((1, None), (2, "apply"), (3, "run"), (4, None))]
+        run_worker({KIND: JobHandler(_run, _apply)}, worker_id="test", exit_when_idle=True, commit_every=10)
+
+        db.expire_all()
+        statuses = [(get_job(db, job.id).status, get_job(db, job.id).result) for job in jobs]
+        assert statuses == [
+            (SUCCEEDED, {"value": 2, "applied": True}),
+            (DEAD, None),
+            (DEAD, None),
+            (SUCCEEDED, {"value": 8, "applied": True}),
+        ]
+        assert db.query(Job).filter(Job.kind == KIND, Job.status == QUEUED).count() == 0
+    finally:
+        db.close()
@@ -0,0 +1,99 @@
+import itertools
+import pytest
+from sqlalchemy import update
+from sqlalchemy.exc import OperationalError
+from database.database import get_read_db, get_write_db, read_engine, request_scope, write_engine
+from database.db_operations import (
+    DATASET_DETAIL_COLUMNS,
+    create_dataset,
+    create_user,
+    get_dataset_by_id,
+    get_dataset_file,
+    get_dataset_preview,
+    get_datasets_by_ids,
+    query_dataset_file_opener,
+    update_dataset_visibility
+)
+from database.models import Dataset
+
+CSV = b"a,b\n1,2\n3,4\n"
+_users = itertools.count()
+
+@pytest.fixture
+def dataset_id():
+    db = next(get_write_db())
+    try:
+        n = next(_users)
+        user = create_user(db, f"scope{n}", f"scope{n}@example.com", "hash")
+        dataset = create_dataset(db, "scoped", user.id, "1.0", "request scope", CSV,
+                                 "scoped.csv", "text/csv", len(CSV))
+        return dataset.id
+    finally:
+        db.close()
+
+def test_commit_then_read_in_one_scope(dataset_id):
+    with request_scope() as scope:
+        db = next(get_write_db())
+        details = get_datasets_by_ids(db, [dataset_id], DATASET_DETAIL_COLUMNS)
+        db.close()
+
+        db = next(get_write_db())
+        update_dataset_visibility(db, dataset_id, True)
+        db.close()
+
+        dataset = details[dataset_id]
+        assert dataset.name == "scoped"
+        assert dataset.is_public
+        db = next(get_write_db())
+        assert get_dataset_by_id(db, dataset_id) is dataset
+        assert get_dataset_file(dataset) == CSV
+        db.close()
+    assert scope.metrics.peak == 1
+
+def test_sessions_stay_on_their_engines(dataset_id):
+    with request_scope() as scope:
+        read_db = next(get_read_db())
+        details = get_datasets_by_ids(read_db, [dataset_id], DATASET_DETAIL_COLUMNS)
+        read_db.close()
+
+        write_db = next(get_write_db())
+        update_dataset_visibility(write_db, dataset_id, True)
+        write_db.close()
+
+        assert read_db.get_bind() is read_engine
+        assert write_db.get_bind() is write_engine
+        assert next(get_read_db()) is read_db
+        # Loaded by the read session before the write, and still usable
+        assert details[dataset_id].name == "scoped"
+        with pytest.raises(OperationalError):
+            read_db.execute(update(Dataset).where(Dataset.id == dataset_id).values(name="written"))
+        read_db.rollback()
+    # Each close() handed its connection back
+    assert scope.metrics.peak == 1
+
+def test_close_discards_uncommitted_writes(dataset_id):
+    with request_scope():
+        db = next(get_write_db())
+        get_dataset_by_id(db, dataset_id).name = "renamed"
+        db.close()
+
+        db = next(get_write_db())
+        assert get_dataset_by_id(db, dataset_id).name == "scoped"
+        db.close()
+
+def test_preview_of_inline_file_after_prefetch(dataset_id):
+    db = next(get_write_db())
+    try:
+        # As stored before scripts/migrate_blobs.py
+        db.query(Dataset).filter(Dataset.id == dataset_id).update(
+            {"file_data": CSV, "file_digest": None, "parquet_digest": None, "content_hash": None})
+        db.commit()
+    finally:
+        db.close()
+    with request_scope():
+        db = next(get_read_db())
+        dataset = get_datasets_by_ids(db, [dataset_id], DATASET_DETAIL_COLUMNS)[dataset_id]
+        preview = get_dataset_preview(dataset, open_file=query_dataset_file_opener(db, dataset))
+        db.close()
+    assert list(preview.head.columns) == ["a", "b"]
+    assert len(preview.head) == 2
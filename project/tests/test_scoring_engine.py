@@ -0,0 +1,31 @@
+import itertools
+import pandas as pd
+from database.database import get_write_db
+from database.db_operations import create_dataset, create_user, update_dataset
+from Datasetfilter.scoring_engine import get_scoring_engine
+
+_users = itertools.count()
+
+def _upload(db, owner_id, columns):
+    data = (",".join(columns) + "\n" + ",".join("1" for _ in columns) + "\n").encode()
+    return create_dataset(db, "indexed", owner_id, "1.0", "column index", data, "indexed.csv", "text/csv",
+                          len(data), dataset_metadata={"columns": columns})
+
+def test_engine_rebuilt_when_reupload_keeps_the_column_count():
+    db = next(get_write_db())
+    try:
+        n = next(_users)
+        user = create_user(db, f"index{n}", f"index{n}@example.com", "hash")
+        _upload(db, user.id, ["a", "b"])
+        dataset = _upload(db, user.id, ["c", "d"])
+        engine = get_scoring_engine(db)
+
+        data = b"e,f\n1,1\n"
+        update_dataset(db, dataset.id, data, "indexed.csv", "text/csv", len(data),
+                       dataset_metadata={"columns": ["e", "f"]})
+
+        rebuilt = get_scoring_engine(db)
+        assert rebuilt is not engine
+        assert rebuilt.score(pd.Series({"e": 1.0, "f": 1.0})) == [(2.0, dataset.id)]
+    finally:
+        db.close()